@@ -1,8 +1,17 @@
+import math
 import os
 import boto3
 from flask import Flask, render_template, request, jsonify
-from collections import defaultdict
+import numpy as np
 from datetime import datetime, timedelta
+from clustering import cluster_samples
+from data_access import DATE_INDEX_NAME
+from http_cache import conditional
+from paging import KeysetPager, decode_cursor
+from response_formats import BINARY_MIMETYPE, columns_response, compress_response, encode_columns
+from result_cache import create_result_cache
+from rollups import ROLLUP_TABLE_NAME, read_data_version, read_rollups, rollup_summary
+from sample_cache import SampleCache, format_datetimes, parse_datetime, period_starts
 
 app = Flask(__name__)
 
@@ -29,9 +38,95 @@ dynamodb = boto3.resource(
     'dynamodb',
     region_name='ap-southeast-1',
     aws_access_key_id=os.getenv('aws_access_key_id'),
-    aws_secret_access_key=os.getenv('aws_secret_access_key')
+    aws_secret_access_key=os.getenv('aws_secret_access_key'),
+    endpoint_url=os.getenv('DYNAMODB_ENDPOINT_URL')  # e.g. http://localhost:8000 for DynamoDB Local
 )
 table = dynamodb.Table('MicroplasticData')
+rollup_table = dynamodb.Table(ROLLUP_TABLE_NAME)
+
+# Number of parallel scan segments (each read on its own thread)
+SCAN_SEGMENTS = int(os.getenv('SCAN_SEGMENTS', 4))
+
+# In-memory, column-oriented copy of the samples, refreshed incrementally in the background.
+# Requests never see data older than SAMPLE_CACHE_MAX_STALENESS seconds.
+sample_cache = SampleCache(
+    table,
+    segments=SCAN_SEGMENTS,
+    max_staleness=float(os.getenv('SAMPLE_CACHE_MAX_STALENESS', 120)),
+    # Set DATE_INDEX_NAME to an empty string to read new samples with a filtered scan instead
+    index_name=os.getenv('DATE_INDEX_NAME', DATE_INDEX_NAME),
+    # capture.py bumps this counter on every sample, invalidating version-keyed caches
+    read_write_count=lambda: read_data_version(rollup_table)
+)
+sample_cache.start(interval=float(os.getenv('SAMPLE_CACHE_REFRESH_INTERVAL', 30)))
+
+# Seconds browsers and proxies may reuse a data response before revalidating its ETag
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 30))
+cached_by_version = conditional(sample_cache.snapshot, max_age=HTTP_CACHE_MAX_AGE)
+
+# Serialized results of range queries, keyed on the dataset version and normalized parameters.
+# RESULT_CACHE_BACKEND=redis shares it between workers through RESULT_CACHE_REDIS_URL.
+result_cache = create_result_cache(
+    backend=os.getenv('RESULT_CACHE_BACKEND', 'memory'),
+    redis_url=os.getenv('RESULT_CACHE_REDIS_URL'),
+    ttl=int(os.getenv('RESULT_CACHE_TTL', 300)),
+    max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 256))
+)
+
+def cached_response(name, snapshot, params, compute, mimetype='application/json'):
+    """Response whose body comes from the result cache; compute() returns the body bytes on a miss."""
+    body = result_cache.get_or_compute(name, snapshot.version, params, compute)
+    return app.response_class(body, mimetype=mimetype)
+
+def cached_json(name, snapshot, params, compute):
+    """cached_response for a view that builds a JSON-serializable object."""
+    return cached_response(name, snapshot, params, lambda: app.json.dumps(compute()).encode('utf-8'))
+
+def normalize_range(snapshot, min_date, max_date):
+    """Canonical, dataset-clamped form of a date range, so equivalent slider windows share cache entries."""
+    in_range = snapshot.range_slice(min_date, max_date)
+    if in_range.start == in_range.stop:
+        return None
+    first, last = format_datetimes(snapshot['datetime'][[in_range.start, in_range.stop - 1]])
+    return [first, last]
+
+def date_range(data):
+    """min_date and max_date of a request as datetimes; ValueError if either is missing or malformed."""
+    return parse_datetime(data.get('min_date')), parse_datetime(data.get('max_date'))
+
+def viewport(data):
+    """(bbox, zoom) of a /dashboard request, or (None, None) unless it has both.
+
+    bbox is [south, west, north, east], as a list or a "south,west,north,east"
+    string. Raises ValueError (or TypeError) if either is malformed.
+    """
+    bbox, zoom = data.get('bbox'), data.get('zoom')
+    if bbox is not None:
+        if isinstance(bbox, str):
+            bbox = bbox.split(',')
+        bbox = [float(value) for value in bbox]
+        if len(bbox) != 4 or not all(map(math.isfinite, bbox)) or bbox[0] > bbox[2]:
+            raise ValueError(f"Invalid bbox {bbox!r}")
+    if zoom is not None:
+        zoom = float(zoom)
+        if not math.isfinite(zoom):
+            raise ValueError(f"Invalid zoom {zoom!r}")
+    if bbox is None or zoom is None:
+        return None, None
+    return bbox, zoom
+
+def request_params():
+    """Parameters of a data request: the JSON body of a POST, or the query string of a GET."""
+    if request.method == 'POST':
+        return request.get_json(silent=True) or {}
+    return request.args
+
+# Opt-in response formats of /filter_markers and /timeseries_data (see response_formats.py)
+COLUMNAR_FORMATS = ('columnar', 'binary')
+
+@app.after_request
+def compress(response):
+    return compress_response(response, request.headers.get('Accept-Encoding', ''))
 
 # Adding alias for reserved keyword
 ExpressionAttributeNames = {"#dt": "datetime"}
@@ -48,135 +143,224 @@ def about():
 def chart():
     return render_template("chart.html")
 
-@app.route("/filter_markers", methods=["POST"])
-def filter_markers():
-    data = request.get_json()
-    min_date = data['min_date']
-    max_date = data['max_date']
-
-    # Scan DynamoDB for markers within the date range
-    response = table.scan(
-        FilterExpression="#dt BETWEEN :min_date AND :max_date",
-        ExpressionAttributeNames={"#dt": "datetime"},
-        ExpressionAttributeValues={
-            ":min_date": min_date,
-            ":max_date": max_date
-        }
-    )
-    items = response['Items']
-
-    # Convert marker data to the required format
-    marker_data = [
+def marker_records(in_range):
+    """Marker dicts, as sent to the map, for a snapshot of samples."""
+    return [
         {
-            "lat": float(item['latitude']),
-            "lon": float(item['longitude']),
-            "density": float(item['density']),
-            "percentPS": item.get('percent_PS', 0),
-            "percentPP": item.get('percent_PP', 0),
-            "percentPE": item.get('percent_PE', 0),
-            "date": item['datetime'],
-            "image": item['imageURL'],
-            "annotatedimageurl": item['annotatedImageURL']
+            "lat": lat,
+            "lon": lon,
+            "density": density,
+            "percentPS": percent_ps,
+            "percentPP": percent_pp,
+            "percentPE": percent_pe,
+            "date": date,
+            "image": image,
+            "annotatedimageurl": annotated
         }
-        for item in items
+        for lat, lon, density, percent_ps, percent_pp, percent_pe, date, image, annotated in zip(
+            in_range['lat'].tolist(),
+            in_range['lon'].tolist(),
+            in_range['density'].tolist(),
+            in_range['percent_PS'].tolist(),
+            in_range['percent_PP'].tolist(),
+            in_range['percent_PE'].tolist(),
+            format_datetimes(in_range['datetime']),
+            in_range['image_url'].tolist(),
+            in_range['annotated_url'].tolist()
+        )
     ]
 
-    return jsonify(marker_data)
+def marker_columns(in_range):
+    """Marker fields as parallel arrays, for the columnar and binary formats."""
+    return {
+        "lat": in_range['lat'],
+        "lon": in_range['lon'],
+        "density": in_range['density'],
+        "percentPS": in_range['percent_PS'],
+        "percentPP": in_range['percent_PP'],
+        "percentPE": in_range['percent_PE'],
+        "date": in_range['datetime'],
+        "image": in_range['image_url'],
+        "annotatedimageurl": in_range['annotated_url']
+    }
+
+@app.route("/filter_markers", methods=["GET", "POST"])
+@cached_by_version
+def filter_markers():
+    try:
+        min_date, max_date = date_range(request_params())
+    except ValueError:
+        return jsonify({'error': 'Invalid date range. Use YYYY-MM-DD HH:MM:SS'}), 400
+    fmt = request.args.get('format', 'rows')  # rows, columnar or binary
+
+    # Select markers within the date range from the in-memory sample cache
+    snapshot = sample_cache.snapshot()
+    params = {"range": normalize_range(snapshot, min_date, max_date), "format": fmt}
+
+    def in_range():
+        return snapshot.take(snapshot.range_slice(min_date, max_date))
+
+    if fmt in COLUMNAR_FORMATS:
+        return cached_response(
+            'filter_markers', snapshot, params,
+            lambda: encode_columns(marker_columns(in_range()), fmt)[0],
+            mimetype=BINARY_MIMETYPE if fmt == 'binary' else 'application/json'
+        )
+    return cached_json('filter_markers', snapshot, params, lambda: marker_records(in_range()))
+
+@app.route("/dashboard", methods=["GET", "POST"])
+@cached_by_version
+def dashboard():
+    """Everything the map page needs for one date range, in one request.
+
+    Without min_date/max_date the whole dataset is used, which is what the
+    page shows on first load. With bbox ([south, west, north, east]) and
+    zoom, markers only covers the viewport: nearby samples are merged into
+    grid clusters and only the rest are sent as individual markers. GET
+    requests pass bbox as "south,west,north,east" and are HTTP-cacheable.
+    """
+    data = request_params()
+    try:
+        bbox, zoom = viewport(data)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid viewport. Use bbox=south,west,north,east and a numeric zoom'}), 400
+
+    snapshot = sample_cache.snapshot()
+    if not len(snapshot):
+        return jsonify({
+            "min_date": None,
+            "max_date": None,
+            "markers": [],
+            "clusters": [],
+            "total_samples": 0,
+            "average_density": 0,
+            "polymer_breakdown": {"PE": 0, "PP": 0, "PS": 0}
+        })
+
+    dataset_min, dataset_max = format_datetimes(snapshot['datetime'][[0, -1]])
+    try:
+        min_date = parse_datetime(data.get('min_date') or dataset_min)
+        max_date = parse_datetime(data.get('max_date') or dataset_max)
+    except ValueError:
+        return jsonify({'error': 'Invalid date range. Use YYYY-MM-DD HH:MM:SS'}), 400
+
+    params = {
+        "range": normalize_range(snapshot, min_date, max_date),
+        "bbox": [round(value, 5) for value in bbox] if zoom is not None else None,
+        "zoom": zoom
+    }
+
+    def compute():
+        in_range = snapshot.take(snapshot.range_slice(min_date, max_date))
+        count, sums = snapshot.range_stats(min_date, max_date)
+        if zoom is not None:
+            clusters, point_index = cluster_samples(in_range, bbox, zoom)
+            markers = marker_records(in_range.take(point_index))
+        else:
+            clusters, markers = [], marker_records(in_range)
+
+        return {
+            "min_date": dataset_min,
+            "max_date": dataset_max,
+            "markers": markers,
+            "clusters": clusters,
+            "total_samples": count,
+            "average_density": sums['density'] / count if count else 0,
+            "polymer_breakdown": {
+                polymer: sums[f'percent_{polymer}'] / count if count else 0
+                for polymer in ('PE', 'PP', 'PS')
+            }
+        }
+
+    return cached_json('dashboard', snapshot, params, compute)
+
+@app.route('/cache_stats')
+def cache_stats():
+    """Hit/miss counters of the range-query result cache, for tuning its size and TTL."""
+    return jsonify(result_cache.stats())
 
 @app.route('/date_range', methods=['GET'])
+@cached_by_version
 def get_date_range():
-    response = table.scan(
-        ProjectionExpression="#dt",
-        ExpressionAttributeNames={"#dt": "datetime"}
-    )
-    items = response.get('Items', [])
-    if not items:
+    # The cache is kept sorted by datetime, so the bounds are its first and last rows
+    snapshot = sample_cache.snapshot()
+    if not len(snapshot):
         return jsonify({"min_date": None, "max_date": None})
 
-    # Filter out items without datetime and convert to datetime objects
-    datetimes = []
-    for item in items:
-        if 'datetime' in item:
-            try:
-                dt = datetime.strptime(item['datetime'], '%Y-%m-%d %H:%M:%S')
-                datetimes.append(dt)
-            except (ValueError, TypeError):
-                continue
-    
-    if not datetimes:
-        return jsonify({"min_date": None, "max_date": None})
-        
-    min_date = min(datetimes).strftime('%Y-%m-%d %H:%M:%S')
-    max_date = max(datetimes).strftime('%Y-%m-%d %H:%M:%S')
-    
+    min_date, max_date = format_datetimes(snapshot['datetime'][[0, -1]])
+
     return jsonify({
         "min_date": min_date,
         "max_date": max_date
     })
 
 @app.route('/total_samples', methods=['POST'])
+@cached_by_version
 def get_total_samples():
-    data = request.get_json()
-    min_date = data['min_date']
-    max_date = data['max_date']
-
-    # Scan DynamoDB for items within the date range
-    response = table.scan(
-        FilterExpression="#dt BETWEEN :min_date AND :max_date",
-        ExpressionAttributeNames={"#dt": "datetime"},
-        ExpressionAttributeValues={
-            ":min_date": min_date,
-            ":max_date": max_date
-        }
-    )
-    items = response.get('Items', [])
-    total_samples = len(items)
-    return jsonify({"total_samples": total_samples})
+    try:
+        min_date, max_date = date_range(request.get_json(silent=True) or {})
+    except ValueError:
+        return jsonify({'error': 'Invalid date range. Use YYYY-MM-DD HH:MM:SS'}), 400
+
+    snapshot = sample_cache.snapshot()
+
+    def compute():
+        count, _ = snapshot.range_stats(min_date, max_date)
+        return {"total_samples": count}
+
+    return cached_json('total_samples', snapshot, normalize_range(snapshot, min_date, max_date), compute)
 
 @app.route('/average_density', methods=['POST'])
+@cached_by_version
 def get_average_density():
-    data = request.get_json()
-    min_date = data['min_date']
-    max_date = data['max_date']
-
-    response = table.scan(
-        FilterExpression="#dt BETWEEN :min_date AND :max_date",
-        ExpressionAttributeNames={"#dt": "datetime"},
-        ExpressionAttributeValues={
-            ":min_date": min_date,
-            ":max_date": max_date
-        }
-    )
-    items = response.get('Items', [])
-    if not items:
-        return jsonify({"average_density": 0})
-    # Use float for density to support decimal values
-    total_density = sum(float(item['density']) for item in items if 'density' in item)
-    average_density = total_density / len(items)
-    return jsonify({"average_density": average_density})
+    try:
+        min_date, max_date = date_range(request.get_json(silent=True) or {})
+    except ValueError:
+        return jsonify({'error': 'Invalid date range. Use YYYY-MM-DD HH:MM:SS'}), 400
+
+    snapshot = sample_cache.snapshot()
+
+    def compute():
+        # Two binary searches over the prefix sums, whatever the size of the range
+        count, sums = snapshot.range_stats(min_date, max_date)
+        if not count:
+            return {"average_density": 0}
+        return {"average_density": sums['density'] / count}
+
+    return cached_json('average_density', snapshot, normalize_range(snapshot, min_date, max_date), compute)
 
 @app.route('/timeseries_data')
+@cached_by_version
 def timeseries_data():
     mode = request.args.get('mode', 'daily')
-    response = table.scan()
-    items = response.get('Items', [])
-    data = defaultdict(list)
-
-    for item in items:
-        dt = item['datetime'][:10]  # 'YYYY-MM-DD'
-        density = float(item['density'])
-        if mode == 'weekly':
-            # Find the Monday of the week
-            date_obj = datetime.strptime(dt, "%Y-%m-%d")
-            monday = date_obj - timedelta(days=date_obj.weekday())
-            dt = monday.strftime("%Y-%m-%d")
-        data[dt].append(density)
+    fmt = request.args.get('format', 'rows')  # rows, columnar or binary
 
+    # Pre-aggregated rows maintained at ingest: a few hundred items at most
     result = []
-    for date, densities in sorted(data.items()):
-        avg = sum(densities) / len(densities)
-        result.append({'date': date, 'average_density': avg, 'sample_count': len(densities)})
+    try:
+        result = [rollup_summary(row) for row in read_rollups(rollup_table, mode)]
+        if not result:
+            app.logger.info("No rollup rows yet, aggregating cached samples instead")
+    except Exception as e:
+        app.logger.warning(f"Rollup read failed, aggregating cached samples instead: {e}")
+
+    if not result:
+        snapshot = sample_cache.snapshot()
+
+        # Group densities by day (or week) with one pass over the cached columns
+        periods, inverse = np.unique(period_starts(snapshot['datetime'], mode), return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(periods))
+        sums = np.bincount(inverse, weights=snapshot['density'], minlength=len(periods))
 
+        result = []
+        for date, total, count in zip(periods.astype(str).tolist(), sums.tolist(), counts.tolist()):
+            result.append({'date': date, 'average_density': total / count, 'sample_count': count})
+
+    if fmt in COLUMNAR_FORMATS:
+        columns = {key: np.array([row[key] for row in result]) for key in (result[0] if result else {})}
+        if result:
+            columns['date'] = columns['date'].astype('datetime64[D]')
+        return columns_response(columns, fmt)
     return jsonify(result)
 
 def format_date_display(start_date, end_date=None):
@@ -198,16 +382,8 @@ def format_date_display(start_date, end_date=None):
     end_str = f"{end_date.strftime('%B')} {end_day}, {end_date.year}"
     return f"{start_str} - {end_str}"
 
-def filter_items_by_date_range(items, start_date, end_date):
-    """Filter items that fall within the specified date range (inclusive)."""
-    filtered = []
-    for item in items:
-        item_date = datetime.strptime(item['datetime'][:10], "%Y-%m-%d")
-        if start_date <= item_date <= end_date:
-            filtered.append(item)
-    return filtered
-
 @app.route('/detailed_data')
+@cached_by_version
 def detailed_data():
     # Get and validate parameters
     date_str = request.args.get('date')
@@ -216,9 +392,18 @@ def detailed_data():
     per_page = 15  # Number of samples per page
     sort_by = request.args.get('sort_by', 'datetime')
     sort_order = request.args.get('sort_order', 'desc')
+    after = request.args.get('after')
+    before = request.args.get('before')
     
     if not date_str:
         return jsonify({'error': 'Date parameter is required'}), 400
+
+    try:
+        for cursor in (after, before):
+            if cursor:
+                decode_cursor(cursor)
+    except ValueError:
+        return jsonify({'error': 'Invalid page cursor'}), 400
     
     try:
         # Parse and validate date
@@ -234,48 +419,36 @@ def detailed_data():
         end_date = date_obj
         date_display = format_date_display(date_obj)
     
-    # Fetch and filter data
+    # Page through the cached samples of the day/week with keyset pagination
     try:
-        response = table.scan()
-        items = response.get('Items', [])
-        filtered_items = filter_items_by_date_range(items, date_obj, end_date)
-        
-        # Define sort key functions
-        def get_sort_key(item, field):
-            value = item.get(field, '')
-            try:
-                return float(value)
-            except (ValueError, TypeError):
-                return str(value).lower()
-        
-        # Sort items based on sort parameters
-        if sort_by and sort_by in ['datetime', 'density', 'latitude', 'longitude']:
-            reverse_sort = (sort_order == 'desc')
-            filtered_items.sort(
-                key=lambda x: get_sort_key(x, sort_by),
-                reverse=reverse_sort
-            )
-        
-        # Calculate statistics using all items
-        sample_count = len(filtered_items)
-        densities = [float(item['density']) for item in filtered_items]
-        avg_density = sum(densities) / len(densities) if densities else 0
-        
-        # Pagination
-        total_pages = (sample_count + per_page - 1) // per_page
-        page = max(1, min(page, total_pages))  # Ensure page is within valid range
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        paginated_items = filtered_items[start_idx:end_idx]
-        
+        snapshot = sample_cache.snapshot()
+        range_start = date_obj
+        range_end = end_date + timedelta(days=1, seconds=-1)
+        in_range = snapshot.range_slice(range_start, range_end)
+
+        # Calculate statistics using all items, from the prefix sums
+        sample_count, sums = snapshot.range_stats(range_start, range_end)
+        avg_density = sums['density'] / sample_count if sample_count else 0
+
+        pager = KeysetPager(snapshot, in_range, sort_by, sort_order, per_page)
+        rows, page, prev_cursor, next_cursor = pager.page(page, after=after, before=before)
+        total_pages = pager.total_pages
+        page_rows = snapshot.take(in_range).take(rows)
+
         # Prepare response data for the current page
         samples = [{
-            'datetime': item['datetime'],
-            'density': float(item['density']),
-            'latitude': float(item['latitude']),
-            'longitude': float(item['longitude']),
-            'annotated_image_url': item.get('annotatedImageURL', '')  # Get the URL or empty string if not available
-        } for item in paginated_items]
+            'datetime': date,
+            'density': density,
+            'latitude': lat,
+            'longitude': lon,
+            'annotated_image_url': annotated or ''  # Get the URL or empty string if not available
+        } for date, density, lat, lon, annotated in zip(
+            format_datetimes(page_rows['datetime']),
+            page_rows['density'].tolist(),
+            page_rows['lat'].tolist(),
+            page_rows['lon'].tolist(),
+            page_rows['annotated_url'].tolist()
+        )]
         
         return render_template('detailed_data.html', data={
             'date': date_display,
@@ -291,7 +464,11 @@ def detailed_data():
                 'has_prev': page > 1,
                 'has_next': page < total_pages,
                 'prev_num': page - 1 if page > 1 else None,
-                'next_num': page + 1 if page < total_pages else None
+                'next_num': page + 1 if page < total_pages else None,
+                'prev_cursor': prev_cursor,
+                'next_cursor': next_cursor,
+                'sort_by': sort_by,
+                'sort_order': sort_order
             }
         })
         
@@ -0,0 +1,63 @@
+"""Compare date-range reads through the DateBucketIndex GSI with filtered scans.
+
+Start DynamoDB Local first, e.g.:
+    docker run -p 8000:8000 amazon/dynamodb-local
+
+Then run from the repository root:
+    python benchmarks/bench_date_index.py --endpoint-url http://localhost:8000 --rows 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+from bench_scan import get_table, seed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_access import query_date_range, scan_date_range  # noqa: E402
+
+# Slider-style windows inside the year of synthetic data seeded by bench_scan.seed
+RANGES = {
+    '1 day': ('2025-06-15 00:00:00', '2025-06-15 23:59:59'),
+    '1 week': ('2025-06-09 00:00:00', '2025-06-15 23:59:59'),
+    '1 month': ('2025-06-01 00:00:00', '2025-06-30 23:59:59'),
+    '3 months': ('2025-05-01 00:00:00', '2025-07-31 23:59:59'),
+    'full year': ('2025-04-01 00:00:00', '2026-03-31 23:59:59'),
+}
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = sum(1 for _ in fn())
+        best = min(best, time.perf_counter() - start)
+    return count, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--endpoint-url', default=os.getenv('DYNAMODB_ENDPOINT_URL', 'http://localhost:8000'))
+    parser.add_argument('--table', default='MicroplasticDataBench')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--segments', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        table = get_table(args.endpoint_url, args.table, with_date_index=True)
+        print(f"Seeding {rows} rows...")
+        seed(table, rows)
+
+        for label, (min_date, max_date) in RANGES.items():
+            count, scan_time = timed(
+                lambda: scan_date_range(table, min_date, max_date, segments=args.segments), args.repeat)
+            _, query_time = timed(lambda: query_date_range(table, min_date, max_date), args.repeat)
+            print(f"rows={rows:>8} {label:<10} items={count:>8} "
+                  f"scan={scan_time:7.3f}s query={query_time:7.3f}s speedup={scan_time / query_time:6.1f}x")
+
+        table.delete()
+
+
+if __name__ == "__main__":
+    main()
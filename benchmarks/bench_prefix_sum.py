@@ -0,0 +1,68 @@
+"""Micro-benchmark of date-range count/average queries on the in-memory sample cache.
+
+Compares SampleSnapshot.range_stats (two binary searches over prefix sums)
+with summing the sliced density column, from 1k to 10M synthetic samples:
+
+    python benchmarks/bench_prefix_sum.py
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sample_cache import PREFIX_COLUMNS, SampleSnapshot, _empty_columns, prefix_sums  # noqa: E402
+
+START = np.datetime64('2025-04-01T00:00:00', 's')
+SPAN_SECONDS = 365 * 86400
+
+
+def synthetic_snapshot(rows, rng):
+    columns = _empty_columns()
+    columns['datetime'] = np.sort(START + rng.integers(0, SPAN_SECONDS, rows).astype('timedelta64[s]'))
+    columns['sample_id'] = np.arange(rows, dtype=np.int64)
+    for name in ('lat', 'lon', 'density', 'percent_PE', 'percent_PP', 'percent_PS'):
+        columns[name] = rng.random(rows)
+    for name in ('image_url', 'annotated_url'):
+        columns[name] = np.full(rows, '', dtype=object)
+    prefix = {name: prefix_sums(columns[name]) for name in PREFIX_COLUMNS}
+    return SampleSnapshot(columns, time.monotonic(), prefix=prefix)
+
+
+def random_ranges(count, rng):
+    starts = START + rng.integers(0, SPAN_SECONDS, count).astype('timedelta64[s]')
+    ends = starts + rng.integers(86400, 90 * 86400, count).astype('timedelta64[s]')
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def per_query_us(fn, ranges):
+    start = time.perf_counter()
+    for min_date, max_date in ranges:
+        fn(min_date, max_date)
+    return (time.perf_counter() - start) / len(ranges) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for rows in args.rows:
+        snapshot = synthetic_snapshot(rows, rng)
+        ranges = random_ranges(args.queries, rng)
+
+        def sliced_sum(min_date, max_date):
+            densities = snapshot['density'][snapshot.range_slice(min_date, max_date)]
+            return len(densities), densities.sum()
+
+        prefix_us = per_query_us(snapshot.range_stats, ranges)
+        slice_us = per_query_us(sliced_sum, ranges)
+        print(f"rows={rows:>9} prefix sums={prefix_us:8.1f} us/query  sliced sum={slice_us:10.1f} us/query")
+
+
+if __name__ == "__main__":
+    main()
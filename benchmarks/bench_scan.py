@@ -0,0 +1,117 @@
+"""Benchmark full-table reads against a local DynamoDB stand-in.
+
+Start DynamoDB Local first, e.g.:
+    docker run -p 8000:8000 amazon/dynamodb-local
+
+Then run from the repository root:
+    python benchmarks/bench_scan.py --endpoint-url http://localhost:8000 --rows 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import boto3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_access import DATE_BUCKET_ATTRIBUTE, DATE_INDEX_NAME, scan_items  # noqa: E402
+
+
+def get_table(endpoint_url, table_name, with_date_index=False):
+    dynamodb = boto3.resource(
+        'dynamodb',
+        region_name='ap-southeast-1',
+        endpoint_url=endpoint_url,
+        aws_access_key_id='local',
+        aws_secret_access_key='local'
+    )
+    existing = [t.name for t in dynamodb.tables.all()]
+    if table_name in existing:
+        dynamodb.Table(table_name).delete()
+        dynamodb.Table(table_name).wait_until_not_exists()
+    kwargs = {}
+    if with_date_index:
+        kwargs['GlobalSecondaryIndexes'] = [{
+            'IndexName': DATE_INDEX_NAME,
+            'KeySchema': [
+                {'AttributeName': DATE_BUCKET_ATTRIBUTE, 'KeyType': 'HASH'},
+                {'AttributeName': 'datetime', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }]
+    table = dynamodb.create_table(
+        TableName=table_name,
+        KeySchema=[{'AttributeName': 'sampleID', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[
+            {'AttributeName': 'sampleID', 'AttributeType': 'N'},
+            {'AttributeName': DATE_BUCKET_ATTRIBUTE, 'AttributeType': 'S'},
+            {'AttributeName': 'datetime', 'AttributeType': 'S'}
+        ] if with_date_index else [{'AttributeName': 'sampleID', 'AttributeType': 'N'}],
+        BillingMode='PAY_PER_REQUEST',
+        **kwargs
+    )
+    table.wait_until_exists()
+    return table
+
+
+def seed(table, rows, start=datetime(2025, 4, 1)):
+    """Fill the table with synthetic samples shaped like capture.py's items."""
+    rng = random.Random(0)
+    with table.batch_writer() as batch:
+        for i in range(1, rows + 1):
+            dt = start + timedelta(seconds=rng.randint(0, 365 * 86400))
+            timestamp = dt.strftime('%Y-%m-%d %H:%M:%S')
+            batch.put_item(Item={
+                "sampleID": i,
+                "imageURL": f"https://rpi-upload-bucket.s3.ap-southeast-1.amazonaws.com/Dataset/samples/stage_1/image_{i}.jpg",
+                "annotatedImageURL": f"https://rpi-upload-bucket.s3.ap-southeast-1.amazonaws.com/Dataset/output/stage_1/annotated_all/image_{i}_all_boxes.png",
+                "datetime": timestamp,
+                DATE_BUCKET_ATTRIBUTE: timestamp[:7],
+                "latitude": Decimal(str(round(rng.uniform(14.1, 14.6), 6))),
+                "longitude": Decimal(str(round(rng.uniform(121.0, 121.5), 6))),
+                "boxCount": rng.randint(0, 20),
+                "density": Decimal(str(round(rng.uniform(0, 0.3), 4))),
+                "percent_PE": Decimal("33.3"),
+                "percent_PP": Decimal("33.3"),
+                "percent_PS": Decimal("33.4"),
+            })
+
+
+def single_call_scan(table):
+    """The pre-pagination behaviour: one scan call, LastEvaluatedKey ignored."""
+    return table.scan().get('Items', [])
+
+
+def timed(fn):
+    start = time.perf_counter()
+    count = fn()
+    return count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--endpoint-url', default=os.getenv('DYNAMODB_ENDPOINT_URL', 'http://localhost:8000'))
+    parser.add_argument('--table', default='MicroplasticDataBench')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--segments', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        table = get_table(args.endpoint_url, args.table)
+        print(f"Seeding {rows} rows...")
+        seed(table, rows)
+
+        count, elapsed = timed(lambda: len(single_call_scan(table)))
+        print(f"rows={rows:>8} single scan call      items={count:>8} {elapsed:8.2f}s")
+        for segments in args.segments:
+            count, elapsed = timed(lambda: sum(1 for _ in scan_items(table, segments=segments)))
+            print(f"rows={rows:>8} paginated segments={segments:<3} items={count:>8} {elapsed:8.2f}s")
+
+        table.delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import numpy as np
+
+# Side of a clustering grid cell in screen pixels (Web Mercator, 256 px tiles)
+CELL_PX = 60
+
+# From this zoom level clusters small enough are expanded into individual samples
+POINT_ZOOM = 16
+MAX_CLUSTER_POINTS = 25
+
+# At the map's deepest zoom nothing is clustered, so stacked samples stay reachable
+MAX_ZOOM = 22
+
+POLYMERS = ('PE', 'PP', 'PS')
+
+
+def _pixel_cells(lat, lon, zoom, cell_px):
+    """Grid cell (x, y) of each coordinate at the given zoom."""
+    scale = 256 * 2 ** zoom / cell_px
+    x = (lon + 180.0) / 360.0 * scale
+    sin_lat = np.clip(np.sin(np.radians(lat)), -0.9999, 0.9999)
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * scale
+    return np.floor(x).astype(np.int64), np.floor(y).astype(np.int64)
+
+
+def cluster_samples(snapshot, bbox, zoom, cell_px=CELL_PX, point_zoom=POINT_ZOOM,
+                    max_cluster_points=MAX_CLUSTER_POINTS):
+    """Grid-cluster the samples of a snapshot that fall inside a viewport.
+
+    bbox is (south, west, north, east). Returns (clusters, point_index):
+    clusters is a list of dicts with count, centroid, bounds, mean density
+    and mean polymer mix; point_index holds snapshot row indices of the
+    samples to show individually (lone samples, and small clusters once
+    zoom >= point_zoom). The number of clusters is bounded by the number
+    of cells in the viewport, whatever the number of samples.
+    """
+    south, west, north, east = bbox
+    lat, lon = snapshot['lat'], snapshot['lon']
+    index = np.nonzero((lat >= south) & (lat <= north) & (lon >= west) & (lon <= east))[0]
+    if not len(index):
+        return [], index
+
+    x, y = _pixel_cells(lat[index], lon[index], int(zoom), cell_px)
+    _, inverse, counts = np.unique((x << 32) | y, return_inverse=True, return_counts=True)
+
+    expand = counts == 1
+    if zoom >= MAX_ZOOM:
+        expand[:] = True
+    elif zoom >= point_zoom:
+        expand |= counts <= max_cluster_points
+    point_index = index[expand[inverse]]
+
+    # Sort members by cell so per-cell reductions are contiguous
+    order = np.argsort(inverse, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    members = index[order]
+
+    def cell_mean(column):
+        return np.add.reduceat(column[members], starts) / counts
+
+    lat_sorted, lon_sorted = lat[members], lon[members]
+    means = {
+        'lat': cell_mean(lat),
+        'lon': cell_mean(lon),
+        'density': cell_mean(snapshot['density']),
+    }
+    for polymer in POLYMERS:
+        means[polymer] = cell_mean(snapshot[f'percent_{polymer}'])
+    bounds = (
+        np.minimum.reduceat(lat_sorted, starts), np.minimum.reduceat(lon_sorted, starts),
+        np.maximum.reduceat(lat_sorted, starts), np.maximum.reduceat(lon_sorted, starts),
+    )
+
+    clusters = []
+    for i in np.nonzero(~expand)[0].tolist():
+        clusters.append({
+            "lat": float(means['lat'][i]),
+            "lon": float(means['lon'][i]),
+            "count": int(counts[i]),
+            "density": float(means['density'][i]),
+            "percentPE": float(means['PE'][i]),
+            "percentPP": float(means['PP'][i]),
+            "percentPS": float(means['PS'][i]),
+            "bounds": [[float(bounds[0][i]), float(bounds[1][i])], [float(bounds[2][i]), float(bounds[3][i])]]
+        })
+    return clusters, np.sort(point_index)
@@ -0,0 +1,181 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Global secondary index for time-ordered reads: partition key is the month the
+# sample was taken in (YYYY-MM), sort key is the full datetime string
+DATE_INDEX_NAME = "DateBucketIndex"
+DATE_BUCKET_ATTRIBUTE = "dateBucket"
+
+# Sentinel pushed by each worker once its producer has no more pages
+_SEGMENT_DONE = object()
+
+
+def _scan_pages(table, segment=None, total_segments=None, **scan_kwargs):
+    """Yield the item pages of one scan, following LastEvaluatedKey to the end."""
+    # Go through the resource's client: unlike the Table resource it is
+    # thread-safe, and it still (de)serializes attribute values for us
+    client = table.meta.client
+    kwargs = dict(scan_kwargs, TableName=table.name)
+    if total_segments and total_segments > 1:
+        kwargs['Segment'] = segment
+        kwargs['TotalSegments'] = total_segments
+
+    while True:
+        response = client.scan(**kwargs)
+        yield response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+def _merge_streams(producers, max_workers, queue_size):
+    """Run page-producing callables on a thread pool and yield their items as pages arrive."""
+    pages = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(value):
+        # Block on a full queue, but give up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                pages.put(value, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def worker(producer):
+        try:
+            for items in producer():
+                if stop.is_set():
+                    break
+                put(items)
+        except Exception as e:
+            put(e)
+        finally:
+            put(_SEGMENT_DONE)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(producers))
+    try:
+        for producer in producers:
+            executor.submit(worker, producer)
+
+        remaining = len(producers)
+        while remaining:
+            page = pages.get()
+            if page is _SEGMENT_DONE:
+                remaining -= 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                yield from page
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+
+def scan_items(table, segments=1, max_workers=None, queue_size=16, **scan_kwargs):
+    """Stream every item of a DynamoDB scan as a generator.
+
+    Follows LastEvaluatedKey so results are complete past the 1 MB page
+    limit. With segments > 1 the table is split with a parallel scan
+    (Segment/TotalSegments) and pages are read over a thread pool; items
+    are yielded as pages arrive, so ordering across segments is arbitrary.
+    Extra keyword arguments (FilterExpression, ProjectionExpression, ...)
+    are passed to every scan call.
+    """
+    if segments <= 1:
+        for items in _scan_pages(table, **scan_kwargs):
+            yield from items
+        return
+
+    producers = [
+        lambda segment=segment: _scan_pages(table, segment, segments, **scan_kwargs)
+        for segment in range(segments)
+    ]
+    yield from _merge_streams(producers, max_workers, queue_size)
+
+
+def scan_date_range(table, min_date, max_date, segments=1, **scan_kwargs):
+    """Stream items whose datetime falls between min_date and max_date (inclusive)."""
+    return scan_items(
+        table,
+        segments=segments,
+        FilterExpression="#dt BETWEEN :min_date AND :max_date",
+        ExpressionAttributeNames={"#dt": "datetime"},
+        ExpressionAttributeValues={
+            ":min_date": min_date,
+            ":max_date": max_date
+        },
+        **scan_kwargs
+    )
+
+
+def date_bucket(value):
+    """Partition key of the date index for a datetime string or datetime."""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m')
+    return value[:7]
+
+
+def date_buckets(min_date, max_date):
+    """Every month bucket from min_date to max_date (inclusive), oldest first."""
+    year, month = map(int, date_bucket(min_date).split('-'))
+    last = date_bucket(max_date)
+    buckets = []
+    while True:
+        bucket = f"{year:04d}-{month:02d}"
+        if bucket > last:
+            break
+        buckets.append(bucket)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return buckets
+
+
+def _query_pages(table, **query_kwargs):
+    """Yield the item pages of one query, following LastEvaluatedKey to the end."""
+    client = table.meta.client
+    kwargs = dict(query_kwargs, TableName=table.name)
+    while True:
+        response = client.query(**kwargs)
+        yield response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+def query_date_range(table, min_date, max_date, index_name=DATE_INDEX_NAME,
+                     max_workers=4, queue_size=16, **query_kwargs):
+    """Stream items with min_date <= datetime <= max_date from the date index.
+
+    Issues one Query per month bucket in the range (in parallel when there
+    is more than one), so the work done is proportional to the number of
+    matching items rather than the size of the table. Items within a bucket
+    come back in datetime order; buckets may interleave.
+    """
+    min_date, max_date = str(min_date), str(max_date)
+
+    def bucket_query(bucket):
+        return _query_pages(
+            table,
+            IndexName=index_name,
+            KeyConditionExpression="#bucket = :bucket AND #dt BETWEEN :min_date AND :max_date",
+            ExpressionAttributeNames={"#bucket": DATE_BUCKET_ATTRIBUTE, "#dt": "datetime"},
+            ExpressionAttributeValues={
+                ":bucket": bucket,
+                ":min_date": min_date,
+                ":max_date": max_date
+            },
+            **query_kwargs
+        )
+
+    buckets = date_buckets(min_date, max_date)
+    if len(buckets) == 1:
+        for items in bucket_query(buckets[0]):
+            yield from items
+        return
+
+    producers = [lambda bucket=bucket: bucket_query(bucket) for bucket in buckets]
+    yield from _merge_streams(producers, min(max_workers, len(buckets)), queue_size)
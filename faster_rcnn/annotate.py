@@ -0,0 +1,59 @@
+from io import BytesIO
+
+from PIL import ImageDraw, ImageFont
+
+# Supported output encodings: PIL format name and file extension
+FORMATS = {
+    'jpeg': ('JPEG', 'jpg'),
+    'webp': ('WEBP', 'webp'),
+    'png': ('PNG', 'png'),
+}
+
+BOX_COLOR = (255, 0, 0)
+LABEL_COLOR = (255, 0, 0)
+LABEL_BACKGROUND = (255, 255, 255)
+
+
+def detections(prediction, threshold=0.5):
+    """(box, label, score) for every detection scoring at least threshold; box is [x_min, y_min, x_max, y_max]."""
+    return [
+        (box, label, score)
+        for box, label, score in zip(prediction['boxes'].tolist(), prediction['labels'].tolist(),
+                                     prediction['scores'].tolist())
+        if score >= threshold
+    ]
+
+
+def label_font(image):
+    # Scale labels with the image so they stay legible on full-resolution captures
+    return ImageFont.load_default(size=max(12, image.height // 60))
+
+
+def annotate(image, boxes, class_name, line_width=2, font=None):
+    """Copy of a PIL image with every (box, label, score) drawn on it at its original resolution.
+
+    Each box gets an outline and a "<class> (<score>)" label sitting on its
+    top edge, drawn with ImageDraw in a single pass over the detections.
+    """
+    annotated = image.copy()
+    draw = ImageDraw.Draw(annotated)
+    font = font or label_font(image)
+    for box, label, score in boxes:
+        draw.rectangle(box, outline=BOX_COLOR, width=line_width)
+        text = f"{class_name(label)} ({score:.2f})"
+        position = (box[0], box[1])
+        draw.rectangle(draw.textbbox(position, text, font=font, anchor='ls'), fill=LABEL_BACKGROUND)
+        draw.text(position, text, fill=LABEL_COLOR, font=font, anchor='ls')
+    return annotated
+
+
+def encode(image, fmt='png', quality=90):
+    """(buffer, file extension) of the image encoded as JPEG, WebP or PNG; quality is ignored for PNG."""
+    pil_format, extension = FORMATS[fmt.lower()]
+    buffer = BytesIO()
+    if pil_format == 'PNG':
+        image.save(buffer, format=pil_format)
+    else:
+        image.save(buffer, format=pil_format, quality=quality)
+    buffer.seek(0)
+    return buffer, extension
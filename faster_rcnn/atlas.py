@@ -0,0 +1,73 @@
+from PIL import Image
+
+from annotate import annotate
+
+ATLAS_WIDTH = 2048
+ATLAS_PADDING = 2
+
+
+def pack(sizes, max_width=ATLAS_WIDTH, padding=ATLAS_PADDING):
+    """Shelf-pack (width, height) rectangles; returns ([(x, y)] in input order, atlas width, atlas height).
+
+    Rectangles are placed tallest first, left to right, starting a new
+    shelf when a row is full, which keeps wasted space low for the
+    similarly sized crops a detector produces.
+    """
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i][1], reverse=True)
+    positions = [None] * len(sizes)
+    x = y = shelf_height = width = 0
+    for i in order:
+        w, h = sizes[i]
+        if x and x + w > max_width:
+            y += shelf_height + padding
+            x = shelf_height = 0
+        positions[i] = (x, y)
+        x += w + padding
+        shelf_height = max(shelf_height, h)
+        width = max(width, x - padding)
+    return positions, width, y + shelf_height
+
+
+def build(image, image_name, boxes, class_name, max_width=ATLAS_WIDTH):
+    """(crop atlas, JSON-ready index) for the (index, box, label, score) detections of one image.
+
+    The index lists every box with its coordinates, class and score, plus
+    the [x, y, width, height] of its crop inside the atlas. The atlas is
+    None when there are no boxes.
+    """
+    crop_boxes = [[int(v) for v in box] for _, box, _, _ in boxes]
+    sizes = [(max(1, x_max - x_min), max(1, y_max - y_min)) for x_min, y_min, x_max, y_max in crop_boxes]
+    positions, width, height = pack(sizes, max_width)
+
+    atlas = Image.new('RGB', (width, height)) if boxes else None
+    entries = []
+    for (i, box, label, score), crop_box, (x, y), (w, h) in zip(boxes, crop_boxes, positions, sizes):
+        atlas.paste(image.crop(crop_box), (x, y))
+        entries.append({
+            'index': i,
+            'box': [round(v, 2) for v in box],
+            'label': label,
+            'class': class_name(label),
+            'score': round(score, 4),
+            'atlas': [x, y, w, h],
+        })
+
+    index = {
+        'image': image_name,
+        'width': image.width,
+        'height': image.height,
+        'boxes': entries,
+    }
+    return atlas, index
+
+
+def crop(atlas, entry):
+    """The crop of one index entry, cut back out of its atlas."""
+    x, y, w, h = entry['atlas']
+    return atlas.crop((x, y, x + w, y + h))
+
+
+def box_view(image, entry, class_name=None):
+    """The per-box view of one index entry: the full image with only that box drawn."""
+    name = class_name or (lambda label: entry['class'])
+    return annotate(image, [(entry['box'], entry['label'], entry['score'])], name)
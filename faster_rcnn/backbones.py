@@ -0,0 +1,121 @@
+import os
+import re
+
+import torchvision
+from torch import nn
+from torchvision.models.detection import (
+    FasterRCNN_MobileNet_V3_Large_320_FPN_Weights,
+    FasterRCNN_MobileNet_V3_Large_FPN_Weights,
+    FasterRCNN_ResNet50_FPN_Weights,
+)
+from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
+from torchvision.ops import FrozenBatchNorm2d
+
+# Faster R-CNN builder and COCO weights of each supported backbone
+BACKBONES = {
+    'resnet50_fpn': (torchvision.models.detection.fasterrcnn_resnet50_fpn,
+                     FasterRCNN_ResNet50_FPN_Weights.DEFAULT),
+    # ~6x fewer FLOPs than ResNet-50, for CPU and Raspberry Pi inference
+    'mobilenet_v3_large_fpn': (torchvision.models.detection.fasterrcnn_mobilenet_v3_large_fpn,
+                               FasterRCNN_MobileNet_V3_Large_FPN_Weights.DEFAULT),
+    # Same network, images resized to 320 px: fastest, for small/coarse targets only
+    'mobilenet_v3_large_320_fpn': (torchvision.models.detection.fasterrcnn_mobilenet_v3_large_320_fpn,
+                                   FasterRCNN_MobileNet_V3_Large_320_FPN_Weights.DEFAULT),
+}
+DEFAULT_BACKBONE = 'resnet50_fpn'
+
+MODEL_DIR = "faster_rcnn/models"
+
+
+def freeze_backbone(model, trainable_layers):
+    """Give a randomly initialised model the layout the pretrained builders produce, in place.
+
+    Batch norm statistics are frozen (FrozenBatchNorm2d) and only the top
+    trainable_layers backbone stages keep requires_grad, chosen as
+    torchvision does for ResNet and MobileNetV3 backbones.
+    """
+    body = model.backbone.body
+    for name, module in list(body.named_modules()):
+        if isinstance(module, nn.BatchNorm2d):
+            frozen = FrozenBatchNorm2d(module.num_features, eps=module.eps)
+            for buffer in ('weight', 'bias', 'running_mean', 'running_var'):
+                getattr(frozen, buffer).copy_(getattr(module, buffer).detach())
+            parent_name, _, child_name = name.rpartition('.')
+            setattr(body.get_submodule(parent_name), child_name, frozen)
+
+    if hasattr(body, 'layer4'):
+        trainable = ['layer4', 'layer3', 'layer2', 'layer1', 'conv1'][:trainable_layers]
+        if trainable_layers == 5:
+            trainable.append('bn1')
+        for name, parameter in body.named_parameters():
+            parameter.requires_grad_(name.split('.')[0] in trainable)
+    else:
+        blocks = list(body.children())
+        stages = [0] + [i for i, block in enumerate(blocks) if getattr(block, '_is_cn', False)] + [len(blocks) - 1]
+        freeze_before = len(blocks) if trainable_layers == 0 else stages[len(stages) - trainable_layers]
+        for block in blocks[:freeze_before]:
+            block.requires_grad_(False)
+    return model
+
+
+def build_model(num_classes, backbone=DEFAULT_BACKBONE, pretrained=True, trainable_backbone_layers=None):
+    """Faster R-CNN on the given backbone with a num_classes box predictor.
+
+    pretrained starts from the COCO weights (for training), with the top
+    trainable_backbone_layers backbone stages fine-tuned (torchvision's
+    default of 3 when None); otherwise the architecture is built without
+    downloading anything, ready for a fine-tuned state dict. Given
+    trainable_backbone_layers, a model built without weights gets the
+    same frozen layout as a pretrained one (see freeze_backbone).
+    """
+    if backbone not in BACKBONES:
+        raise ValueError(f"Unknown backbone {backbone!r}, expected one of {', '.join(BACKBONES)}")
+    builder, weights = BACKBONES[backbone]
+    if pretrained:
+        model = builder(weights=weights, trainable_backbone_layers=trainable_backbone_layers)
+    else:
+        model = builder(weights=None, weights_backbone=None)
+        if trainable_backbone_layers is not None:
+            freeze_backbone(model, trainable_backbone_layers)
+    in_features = model.roi_heads.box_predictor.cls_score.in_features
+    model.roi_heads.box_predictor = FastRCNNPredictor(in_features, num_classes)
+    return model
+
+
+def checkpoint_path(stage, epoch, backbone=DEFAULT_BACKBONE, directory=MODEL_DIR):
+    """Checkpoint file written by the stage-1/stage-2 training scripts after an epoch.
+
+    ResNet-50 checkpoints keep their original names
+    (fasterrcnn_resnet50_epoch_2.pth, fasterrcnn_resnet50_epoch_2_stage2.pth).
+    """
+    name = "fasterrcnn_resnet50" if backbone == 'resnet50_fpn' else f"fasterrcnn_{backbone}"
+    suffix = "_stage2" if stage == 2 else ""
+    return f"{directory}/{name}_epoch_{epoch}{suffix}.pth"
+
+
+def best_checkpoint_path(stage, backbone=DEFAULT_BACKBONE, directory=MODEL_DIR):
+    """Weights of the best epoch by validation mAP so far (fasterrcnn_resnet50_best.pth, ..._best_stage2.pth).
+
+    Rewritten by training whenever an epoch improves on it; unlike the
+    per-epoch files it is never pruned.
+    """
+    return checkpoint_path(stage, 0, backbone, directory).replace("_epoch_0", "_best")
+
+
+def latest_checkpoint(stage, backbone=DEFAULT_BACKBONE, directory=MODEL_DIR):
+    """Checkpoint of the last epoch the training script has written for a stage and backbone.
+
+    Before any training run this is the epoch-1 path, so loading it fails
+    with a FileNotFoundError that names the file training would write.
+    """
+    name = re.escape(os.path.basename(checkpoint_path(stage, 0, backbone, directory))).replace("epoch_0", r"epoch_(\d+)")
+    epochs = []
+    if os.path.isdir(directory):
+        epochs = [int(match.group(1)) for match in map(re.compile(name).fullmatch, os.listdir(directory)) if match]
+    return checkpoint_path(stage, max(epochs, default=1), backbone, directory)
+
+
+def default_checkpoint(stage, backbone=DEFAULT_BACKBONE, directory=MODEL_DIR):
+    """The checkpoint detectors load unless told otherwise: the best epoch, or the last one for older runs."""
+    best = best_checkpoint_path(stage, backbone, directory)
+    return best if os.path.exists(best) else latest_checkpoint(stage, backbone, directory)
@@ -0,0 +1,65 @@
+import torch
+
+from backbones import DEFAULT_BACKBONE
+from model_factory import load_model
+
+try:
+    import onnxruntime
+except ImportError:  # optional: only needed for the onnx backend
+    onnxruntime = None
+
+BACKENDS = ('eager', 'torchscript', 'onnx')
+
+
+class ScriptedDetector:
+    """A TorchScript detector behind the eager call signature: list of image tensors -> list of dicts.
+
+    Scripted torchvision detectors return (losses, detections); only the
+    detections are kept.
+    """
+
+    def __init__(self, path, device):
+        self.module = torch.jit.load(path, map_location=device)
+        self.module.eval()
+
+    def __call__(self, images):
+        _, detections = self.module(images)
+        return detections
+
+
+class OnnxDetector:
+    """An ONNX Runtime session behind the eager call signature, run one image at a time.
+
+    The exported graph takes a single [3, H, W] float image named 'image'
+    and returns boxes, labels and scores.
+    """
+
+    def __init__(self, path, num_threads=None):
+        if onnxruntime is None:
+            raise RuntimeError("The onnx backend needs the 'onnxruntime' package")
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    def __call__(self, images):
+        outputs = []
+        for image in images:
+            boxes, labels, scores = self.session.run(None, {'image': image.cpu().numpy()})
+            outputs.append({
+                'boxes': torch.from_numpy(boxes),
+                'labels': torch.from_numpy(labels),
+                'scores': torch.from_numpy(scores),
+            })
+        return outputs
+
+
+def load_detector(backend, path, device, num_classes=None, num_threads=None, backbone=DEFAULT_BACKBONE):
+    """A callable detector for an inference backend: an eager checkpoint, a TorchScript file or an ONNX file."""
+    if backend == 'eager':
+        return load_model(num_classes, path, backbone, device)
+    if backend == 'torchscript':
+        return ScriptedDetector(path, device)
+    if backend == 'onnx':
+        return OnnxDetector(path, num_threads=num_threads)
+    raise ValueError(f"Unknown inference backend {backend!r}, expected one of {', '.join(BACKENDS)}")
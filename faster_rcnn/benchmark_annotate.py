@@ -0,0 +1,84 @@
+"""Per-image cost of rendering detections: the old matplotlib figure path versus the ImageDraw renderer.
+
+Uses a synthetic image and random boxes, so no model or S3 access is needed:
+    python faster_rcnn/benchmark_annotate.py --boxes 50 --repeat 5
+"""
+import argparse
+import time
+from io import BytesIO
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import torch
+from PIL import Image
+
+from annotate import annotate, detections, encode
+
+
+def synthetic_prediction(count, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    x_min = rng.uniform(0, width - 60, count)
+    y_min = rng.uniform(0, height - 60, count)
+    sizes = rng.uniform(10, 60, (count, 2))
+    boxes = np.stack([x_min, y_min, x_min + sizes[:, 0], y_min + sizes[:, 1]], axis=1)
+    return {
+        'boxes': torch.tensor(boxes, dtype=torch.float32),
+        'labels': torch.ones(count, dtype=torch.int64),
+        'scores': torch.tensor(rng.uniform(0.5, 1.0, count), dtype=torch.float32),
+    }
+
+
+def render_matplotlib(image, prediction, fig_size=(12, 10)):
+    # The renderer the detectors used before, kept here as the baseline
+    plt.figure(figsize=fig_size)
+    plt.imshow(image)
+    ax = plt.gca()
+    for box, label, score in detections(prediction):
+        x_min, y_min, x_max, y_max = box
+        ax.add_patch(plt.Rectangle((x_min, y_min), x_max - x_min, y_max - y_min,
+                                   linewidth=2, edgecolor='r', facecolor='none'))
+        ax.text(x_min, y_min, f"Microplastics ({score:.2f})", color='r', backgroundcolor='white')
+    ax.axis('off')
+    buffer = BytesIO()
+    plt.savefig(buffer, format='PNG', bbox_inches='tight')
+    plt.close()
+    return buffer
+
+
+def render_pil(image, prediction, fmt, quality):
+    return encode(annotate(image, detections(prediction), lambda label: "Microplastics"), fmt, quality)[0]
+
+
+def timed(render, repeat):
+    render()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        buffer = render()
+    return (time.perf_counter() - start) / repeat, buffer.getbuffer().nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--boxes', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--quality', type=int, default=90)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    image = Image.fromarray(rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8))
+    prediction = synthetic_prediction(args.boxes, args.width, args.height)
+
+    baseline, size = timed(lambda: render_matplotlib(image, prediction), args.repeat)
+    print(f"{args.boxes} boxes on {args.width}x{args.height}")
+    print(f"matplotlib png   {baseline * 1000:8.1f} ms/image {size / 1024:8.0f} KiB")
+    for fmt in ('png', 'jpeg', 'webp'):
+        elapsed, size = timed(lambda: render_pil(image, prediction, fmt, args.quality), args.repeat)
+        print(f"imagedraw {fmt:<6} {elapsed * 1000:8.1f} ms/image {size / 1024:8.0f} KiB  {baseline / elapsed:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Accuracy versus latency of exported detectors on the validation split.
+
+Each artifact is given as backend=path, e.g.
+    python faster_rcnn/benchmark_backends.py --stage 1 --num-classes 2 --limit 50 \\
+        eager=faster_rcnn/models/fasterrcnn_resnet50_epoch_2.pth \\
+        torchscript=faster_rcnn/models/fasterrcnn_resnet50_epoch_2.int8-dynamic.pt \\
+        onnx=faster_rcnn/models/fasterrcnn_resnet50_epoch_2.int8-static.onnx
+and reported with its mAP, mAP@50 and mean per-image latency on CPU.
+"""
+import argparse
+import importlib
+import time
+
+import torch
+from torchmetrics.detection.mean_ap import MeanAveragePrecision
+
+from backbones import BACKBONES, DEFAULT_BACKBONE
+from backends import BACKENDS, load_detector
+
+
+@torch.inference_mode()
+def evaluate(detector, samples):
+    metric = MeanAveragePrecision()
+    elapsed = 0.0
+    for image, target in samples:
+        start = time.perf_counter()
+        prediction = detector([image])[0]
+        elapsed += time.perf_counter() - start
+        metric.update([{k: v.cpu() for k, v in prediction.items()}],
+                      [{"boxes": target["boxes"], "labels": target["labels"]}])
+    results = metric.compute()
+    return results["map"].item(), results["map_50"].item(), elapsed / len(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('artifacts', nargs='+', help="backend=path, backend one of " + ", ".join(BACKENDS))
+    parser.add_argument('--stage', choices=['1', '2'], default='1')
+    parser.add_argument('--backbone', choices=list(BACKBONES), default=DEFAULT_BACKBONE)
+    parser.add_argument('--num-classes', type=int, default=2)
+    parser.add_argument('--limit', type=int, default=50, help="Validation images to use")
+    parser.add_argument('--threads', type=int, default=torch.get_num_threads())
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    training = importlib.import_module(f"model_training_stage{args.stage}")
+    dataset = training.S3CocoDataset(training.BUCKET_NAME, training.VALID_PREFIX, transforms=training.CocoTransform())
+    samples = [dataset[i] for i in range(min(args.limit, len(dataset)))]
+
+    print(f"{len(samples)} validation images, {args.threads} threads")
+    print(f"{'artifact':<60} {'mAP':>7} {'mAP@50':>7} {'ms/image':>9}")
+    for artifact in args.artifacts:
+        backend, path = artifact.split('=', 1)
+        detector = load_detector(backend, path, torch.device('cpu'), num_classes=args.num_classes,
+                                 num_threads=args.threads, backbone=args.backbone)
+        evaluate(detector, samples[:1])  # warm-up
+        mean_ap, map_50, latency = evaluate(detector, samples)
+        print(f"{artifact:<60} {mean_ap:7.4f} {map_50:7.4f} {latency * 1000:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Dataset startup cost of indexing COCO annotations: the old per-annotation image search versus CocoIndex.
+
+Generates a synthetic annotation file, so no S3 access is needed:
+    python faster_rcnn/benchmark_coco_index.py --images 50000 --boxes 1000000
+The old algorithm is quadratic, so it is timed on --baseline-images
+images (with the same boxes per image) and extrapolated.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from coco_index import CocoIndex
+
+
+def synthetic_coco(images, boxes, seed=0):
+    rng = np.random.default_rng(seed)
+    image_ids = rng.integers(0, images, boxes).tolist()
+    xywh = np.round(rng.uniform(1, 60, (boxes, 4)), 1).tolist()
+    return {
+        "images": [{"id": i, "file_name": f"image_{i:06d}.jpg", "width": 1920, "height": 1080} for i in range(images)],
+        "annotations": [
+            {"id": n, "image_id": image_id, "category_id": 1 + n % 3, "bbox": bbox}
+            for n, (image_id, bbox) in enumerate(zip(image_ids, xywh))
+        ],
+    }
+
+
+def index_by_search(coco_data):
+    # The lookup S3CocoDataset used before CocoIndex
+    annotations = {img['file_name']: [] for img in coco_data['images']}
+    for ann in coco_data['annotations']:
+        image_id = ann['image_id']
+        image_file_name = next(img['file_name'] for img in coco_data['images'] if img['id'] == image_id)
+        annotations[image_file_name].append(ann)
+    return annotations
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=50000)
+    parser.add_argument('--boxes', type=int, default=1000000)
+    parser.add_argument('--baseline-images', type=int, default=2000)
+    args = parser.parse_args()
+
+    coco_data = synthetic_coco(args.images, args.boxes)
+    raw = json.dumps(coco_data).encode()
+    print(f"{args.images} images, {args.boxes} boxes, {len(raw) / 2**20:.0f} MiB of JSON")
+
+    _, parse = timed(json.loads, raw)
+    print(f"json.loads                 {parse:8.2f} s")
+
+    scale = args.baseline_images / args.images
+    subset = synthetic_coco(args.baseline_images, int(args.boxes * scale))
+    _, search = timed(index_by_search, subset)
+    print(f"per-annotation search      {search:8.2f} s for {args.baseline_images} images, "
+          f"~{search / scale ** 2:.0f} s extrapolated")
+
+    index, build = timed(CocoIndex.from_coco, coco_data)
+    print(f"CocoIndex.from_coco        {build:8.2f} s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.npz")
+        _, save = timed(index.save, path)
+        loaded, load = timed(CocoIndex.load, path)
+        size = os.path.getsize(path)
+    print(f"CocoIndex.save             {save:8.2f} s ({size / 2**20:.0f} MiB)")
+    print(f"CocoIndex.load (cached)    {load:8.2f} s")
+
+    _, lookup = timed(lambda: [loaded.target(name) for name in loaded.file_names[:10000]])
+    print(f"target() per image         {lookup / 10000 * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
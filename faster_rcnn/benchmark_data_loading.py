@@ -0,0 +1,73 @@
+"""Time the training loop spends waiting for batches, versus DataLoader worker count.
+
+Uses an in-memory dataset of JPEGs that are decoded on every access, plus
+a simulated per-image download latency, and a simulated training step:
+    python faster_rcnn/benchmark_data_loading.py --workers 0 2 4 --latency-ms 20 --compute-ms 200
+A near-zero wait per batch means the model, not data loading, is the bottleneck.
+"""
+import argparse
+import time
+from io import BytesIO
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import Dataset
+from torchvision.transforms import functional as F
+
+from data_loading import create_data_loader
+
+
+class SyntheticJpegDataset(Dataset):
+    def __init__(self, count, width, height, latency, seed=0):
+        rng = np.random.default_rng(seed)
+        buffer = BytesIO()
+        Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8)).save(buffer, format='JPEG')
+        self.jpeg = buffer.getvalue()
+        self.count = count
+        self.latency = latency
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, idx):
+        time.sleep(self.latency)  # stands in for the S3 round trip
+        image = F.to_tensor(Image.open(BytesIO(self.jpeg)).convert("RGB"))
+        target = {"boxes": torch.tensor([[10.0, 10.0, 50.0, 50.0]]), "labels": torch.tensor([1])}
+        return image, target
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=64)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2, 4])
+    parser.add_argument('--prefetch-factor', type=int, default=2)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--compute-ms', type=float, default=200, help="Simulated training step per batch")
+    args = parser.parse_args()
+
+    dataset = SyntheticJpegDataset(args.images, args.width, args.height, args.latency_ms / 1000)
+    print(f"{args.images} images of {args.width}x{args.height}, batch size {args.batch_size}, "
+          f"{args.compute_ms:.0f} ms compute per batch")
+    for workers in args.workers:
+        loader = create_data_loader(dataset, args.batch_size, shuffle=False, num_workers=workers,
+                                    prefetch_factor=args.prefetch_factor, persistent_workers=False,
+                                    pin_memory=torch.cuda.is_available())
+        waits = []
+        start = fetch_start = time.perf_counter()
+        for _ in loader:
+            waits.append(time.perf_counter() - fetch_start)
+            time.sleep(args.compute_ms / 1000)
+            fetch_start = time.perf_counter()
+        total = time.perf_counter() - start
+        # The first batch also pays for starting the workers, so it is reported on its own
+        steady = sum(waits[1:]) / max(1, len(waits) - 1)
+        print(f"workers={workers:<3} first batch {waits[0] * 1000:7.1f} ms  "
+              f"wait {steady * 1000:7.1f} ms/batch  total {total:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""CPU throughput of the batched inference engine: images/sec versus batch size and thread count.
+
+Runs on synthetic images, so no S3 access is needed:
+    python faster_rcnn/benchmark_inference.py --images 16 --batch-sizes 1 2 4 8 --threads 1 4
+Pass --checkpoint to time a trained model instead of random weights.
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from backbones import BACKBONES, DEFAULT_BACKBONE
+from inference import InferenceEngine
+from model_factory import build_model
+
+
+def synthetic_images(count, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    return [Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8)) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=16)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--threads', type=int, nargs='+', default=[torch.get_num_threads()])
+    parser.add_argument('--backbone', choices=list(BACKBONES), default=DEFAULT_BACKBONE)
+    parser.add_argument('--num-classes', type=int, default=2)
+    parser.add_argument('--checkpoint')
+    args = parser.parse_args()
+
+    device = torch.device('cpu')
+    model = build_model(args.num_classes, args.checkpoint, args.backbone, pretrained=False)
+    images = synthetic_images(args.images, args.width, args.height)
+
+    # Warm-up so allocator and kernel selection are not timed
+    InferenceEngine(model, device, batch_size=1).predict(images[:1])
+
+    print(f"{args.images} images of {args.width}x{args.height}")
+    for threads in args.threads:
+        for batch_size in args.batch_sizes:
+            engine = InferenceEngine(model, device, batch_size=batch_size, num_threads=threads)
+            start = time.perf_counter()
+            engine.predict(images)
+            elapsed = time.perf_counter() - start
+            print(f"threads={threads:<3} batch_size={batch_size:<3} {args.images / elapsed:6.2f} images/sec")
+
+
+if __name__ == "__main__":
+    main()
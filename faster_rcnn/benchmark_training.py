@@ -0,0 +1,104 @@
+"""CPU training throughput: images/sec of each training setting on a fixed synthetic dataset.
+
+Runs a few optimizer steps per setting, no S3 access needed:
+    python faster_rcnn/benchmark_training.py --settings baseline bf16 trainable-0 --threads 8
+The model is the one training builds (backbones.build_model: frozen
+batch norm, top stages trainable) with random weights, so nothing is
+downloaded; throughput does not depend on weight values. Pass
+--coco-weights to start from the COCO weights instead.
+"""
+import argparse
+import time
+
+import torch
+
+from backbones import BACKBONES, DEFAULT_BACKBONE, build_model
+from training_options import autocast, compile_backbone, set_threads
+
+# Changes from the default training configuration (fp32, 3 trainable backbone layers, one batch per step)
+SETTINGS = {
+    'baseline': {},
+    'bf16': {'bf16': True},
+    'trainable-0': {'trainable_layers': 0},
+    'trainable-5': {'trainable_layers': 5},
+    'accumulate-4': {'accumulation': 4},
+    'compile': {'compile': True},
+    'bf16+trainable-0': {'bf16': True, 'trainable_layers': 0},
+}
+
+
+def synthetic_batches(count, batch_size, width, height, num_classes, boxes_per_image=8, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    batches = []
+    for _ in range(count):
+        images, targets = [], []
+        for _ in range(batch_size):
+            images.append(torch.rand(3, height, width, generator=generator))
+            xy = torch.rand(boxes_per_image, 2, generator=generator) * torch.tensor([width - 64, height - 64])
+            wh = 8 + torch.rand(boxes_per_image, 2, generator=generator) * 56
+            targets.append({
+                "boxes": torch.cat([xy, xy + wh], dim=1),
+                "labels": torch.randint(1, num_classes, (boxes_per_image,), generator=generator),
+            })
+        batches.append((images, targets))
+    return batches
+
+
+def train_steps(model, optimizer, batches, device, bf16, accumulation):
+    optimizer.zero_grad()
+    for batch_idx, (images, targets) in enumerate(batches):
+        with autocast(device, bf16):
+            loss_dict = model(images, targets)
+        losses = sum(loss for loss in loss_dict.values())
+        (losses / accumulation).backward()
+        if (batch_idx + 1) % accumulation == 0 or batch_idx + 1 == len(batches):
+            optimizer.step()
+            optimizer.zero_grad()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--settings', nargs='+', choices=list(SETTINGS), default=list(SETTINGS))
+    parser.add_argument('--batches', type=int, default=4, help="Timed batches per setting")
+    parser.add_argument('--warmup', type=int, default=1, help="Untimed batches first (compilation, allocator)")
+    parser.add_argument('--batch-size', type=int, default=2)
+    parser.add_argument('--width', type=int, default=1333)
+    parser.add_argument('--height', type=int, default=750)
+    parser.add_argument('--num-classes', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=0)
+    parser.add_argument('--interop-threads', type=int, default=0)
+    parser.add_argument('--coco-weights', action='store_true')
+    parser.add_argument('--backbone', choices=list(BACKBONES), default=DEFAULT_BACKBONE)
+    args = parser.parse_args()
+
+    set_threads(args.threads or None, args.interop_threads or None)
+    device = torch.device('cpu')
+    batches = synthetic_batches(args.warmup + args.batches, args.batch_size, args.width, args.height,
+                                args.num_classes)
+    print(f"{args.batches} batches of {args.batch_size} images of {args.width}x{args.height}, "
+          f"{torch.get_num_threads()} threads, {torch.get_num_interop_threads()} inter-op threads")
+
+    for name in args.settings:
+        setting = SETTINGS[name]
+        trainable_layers = setting.get('trainable_layers', 3)
+        torch.manual_seed(0)
+        model = build_model(args.num_classes, args.backbone, pretrained=args.coco_weights,
+                            trainable_backbone_layers=trainable_layers)
+        if setting.get('compile'):
+            compile_backbone(model)
+        model.train()
+        params = [p for p in model.parameters() if p.requires_grad]
+        optimizer = torch.optim.SGD(params, lr=0.005, momentum=0.9, weight_decay=0.0005)
+        bf16, accumulation = setting.get('bf16', False), setting.get('accumulation', 1)
+
+        train_steps(model, optimizer, batches[:args.warmup], device, bf16, accumulation)
+        start = time.perf_counter()
+        train_steps(model, optimizer, batches[args.warmup:], device, bf16, accumulation)
+        elapsed = time.perf_counter() - start
+        trainable = sum(p.numel() for p in params) / 1e6
+        print(f"{name:<18} {args.batches * args.batch_size / elapsed:6.2f} images/sec  "
+              f"({trainable:.1f}M trainable parameters, effective batch {args.batch_size * accumulation})")
+
+
+if __name__ == "__main__":
+    main()
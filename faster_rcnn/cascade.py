@@ -0,0 +1,143 @@
+import torch
+from PIL import Image
+from torchvision.transforms import functional as F
+
+from annotate import annotate, detections
+from inference import InferenceEngine
+
+# Stage-2 label of each polymer, as in detect_polymer_stage2.get_class_name
+POLYMER_LABELS = {1: 'PE', 2: 'PP', 3: 'PS'}
+
+# Stage-1 regions are letterboxed to this square so crops of any shape batch together
+CROP_SIZE = 256
+CROP_MARGIN = 0.1
+
+
+def letterbox(image, size=CROP_SIZE):
+    """The image scaled to fit a size x size square, centred on black padding."""
+    scale = size / max(image.width, image.height)
+    resized = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))))
+    square = Image.new('RGB', (size, size))
+    square.paste(resized, ((size - resized.width) // 2, (size - resized.height) // 2))
+    return square
+
+
+def expand_box(box, margin, width, height):
+    """Integer crop box grown by margin (a fraction of its size) on each side, clipped to the image."""
+    x_min, y_min, x_max, y_max = box
+    dx, dy = (x_max - x_min) * margin, (y_max - y_min) * margin
+    left, top = int(max(0, x_min - dx)), int(max(0, y_min - dy))
+    return left, top, max(left + 1, int(min(width, x_max + dx))), max(top + 1, int(min(height, y_max + dy)))
+
+
+def composition(polymers):
+    """percent_PE/PP/PS over the particles stage 2 could classify."""
+    classified = [p for p in polymers if p is not None]
+    return {
+        f"percent_{name}": round(100.0 * classified.count(name) / len(classified), 2) if classified else 0.0
+        for name in POLYMER_LABELS.values()
+    }
+
+
+def draw_result(image, result):
+    """The image with each particle of a Cascade result boxed and labelled with its polymer."""
+    boxes = [(box["box"], box["polymer"], box["score"]) for box in result["boxes"]]
+    return annotate(image, boxes, lambda polymer: polymer or "Microplastics")
+
+
+class Cascade:
+    """Stage-1 microplastic detection followed by stage-2 polymer classification of each detected particle.
+
+    The image is decoded once. Stage-1 boxes scoring at least
+    detect_threshold are cut out in memory (with a small margin),
+    letterboxed to crop_size and classified in batches by the stage-2
+    model; each particle takes the label of its best stage-2 detection
+    scoring at least classify_threshold, or stays unclassified.
+
+    With shared_backbone=True, stage 2 instead runs only its box head on
+    the stage-1 backbone features pooled at the stage-1 boxes, so the
+    backbone runs once per image. That is only meaningful for a stage-2
+    model whose heads were trained on top of the frozen stage-1 backbone.
+    """
+
+    def __init__(self, detector, classifier, device, batch_size=4, detect_threshold=0.5,
+                 classify_threshold=0.5, crop_size=CROP_SIZE, shared_backbone=False):
+        self.detector = detector
+        self.classifier = classifier
+        self.device = device
+        self.detect_threshold = detect_threshold
+        self.classify_threshold = classify_threshold
+        self.crop_size = crop_size
+        self.shared_backbone = shared_backbone
+        self.stage1 = InferenceEngine(detector, device, batch_size=batch_size)
+        self.stage2 = InferenceEngine(classifier, device, batch_size=batch_size)
+
+    def __call__(self, image):
+        """Result dict for one PIL image: box_count, percent_PE/PP/PS and per-particle boxes."""
+        return self.run([image])[0]
+
+    def run(self, images):
+        if self.shared_backbone:
+            per_image = self._run_shared(images)
+        else:
+            per_image = self._run_crops(images)
+
+        results = []
+        for boxes, polymers in per_image:
+            result = {
+                "box_count": len(boxes),
+                **composition(polymers),
+                "boxes": [
+                    {"box": [round(v, 2) for v in box], "score": round(score, 4), "polymer": polymer}
+                    for (box, _, score), polymer in zip(boxes, polymers)
+                ],
+            }
+            results.append(result)
+        return results
+
+    def _run_crops(self, images):
+        per_image = []
+        crops = []
+        for image, prediction in zip(images, self.stage1.predict(images)):
+            boxes = detections(prediction, self.detect_threshold)
+            per_image.append(boxes)
+            for box, _, _ in boxes:
+                region = image.crop(expand_box(box, CROP_MARGIN, image.width, image.height))
+                crops.append(letterbox(region, self.crop_size))
+
+        polymers = iter(self._polymer(p) for p in self.stage2.predict(crops))
+        return [(boxes, [next(polymers) for _ in boxes]) for boxes in per_image]
+
+    def _polymer(self, prediction):
+        # Stage-2 detections come back sorted by score, so the first is the best
+        for _, label, score in detections(prediction, self.classify_threshold):
+            return POLYMER_LABELS.get(label)
+        return None
+
+    @torch.inference_mode()
+    def _run_shared(self, images):
+        per_image = []
+        for image in images:
+            tensors = [F.to_tensor(image).to(self.device)]
+            original_sizes = [tuple(t.shape[-2:]) for t in tensors]
+            batch, _ = self.detector.transform(tensors)
+            features = self.detector.backbone(batch.tensors)
+            proposals, _ = self.detector.rpn(batch, features)
+            found, _ = self.detector.roi_heads(features, proposals, batch.image_sizes)
+            keep = found[0]['scores'] >= self.detect_threshold
+            boxes = found[0]['boxes'][keep]
+
+            polymers = []
+            if len(boxes):
+                heads = self.classifier.roi_heads
+                pooled = heads.box_roi_pool(features, [boxes], batch.image_sizes)
+                logits, _ = heads.box_predictor(heads.box_head(pooled))
+                probabilities = logits.softmax(-1)[:, 1:]
+                scores, labels = probabilities.max(-1)
+                polymers = [POLYMER_LABELS.get(label + 1) if score >= self.classify_threshold else None
+                            for label, score in zip(labels.tolist(), scores.tolist())]
+
+            found = {'boxes': boxes, 'labels': found[0]['labels'][keep], 'scores': found[0]['scores'][keep]}
+            found = self.detector.transform.postprocess([found], batch.image_sizes, original_sizes)[0]
+            per_image.append((detections({k: v.cpu() for k, v in found.items()}, threshold=0), polymers))
+        return per_image
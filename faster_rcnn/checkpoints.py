@@ -0,0 +1,155 @@
+"""Full training state checkpoints: resume an interrupted run, keep the best epochs, stop early.
+
+One file per training run holds everything needed to carry on (model,
+optimizer, LR scheduler, epoch and batch position, RNG state) and is
+rewritten every CHECKPOINT_EVERY batches and after every epoch. The
+weights-only per-epoch files (backbones.checkpoint_path) are still
+written, but only the KEEP_CHECKPOINTS best by validation mAP are kept;
+the best epoch's weights are also published under a name that never
+changes (backbones.best_checkpoint_path), which the detectors load.
+"""
+import os
+import random
+
+import numpy as np
+import torch
+
+from backbones import MODEL_DIR, best_checkpoint_path, checkpoint_path
+
+RESUME = os.getenv("RESUME", "1") == "1"  # Carry on from an unfinished run's training state file
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY", 50))  # Batches between mid-epoch saves, 0 = epoch ends only
+KEEP_CHECKPOINTS = int(os.getenv("KEEP_CHECKPOINTS", 3))  # Best epochs (by mAP) whose weights are kept
+EARLY_STOPPING_PATIENCE = int(os.getenv("EARLY_STOPPING_PATIENCE", 3))  # Epochs without improvement, 0 = off
+EARLY_STOPPING_MIN_DELTA = float(os.getenv("EARLY_STOPPING_MIN_DELTA", 0.0))  # mAP gain that counts as improvement
+
+
+def atomic_save(obj, path):
+    """torch.save through a temporary file and a rename, so a crash mid-write never leaves a truncated file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def rng_state():
+    state = {'python': random.getstate(), 'numpy': np.random.get_state(), 'torch': torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+class CheckpointManager:
+    """Saves and restores the training state of one stage/backbone run.
+
+    Positions are (epoch, batches done in that epoch): (2, 0) is the
+    start of the third epoch. Resuming mid-epoch relies on the training
+    loader's EpochSampler to replay the same order and skip the batches
+    already trained on.
+    """
+
+    def __init__(self, stage, backbone, model, optimizer, scheduler, keep=KEEP_CHECKPOINTS,
+                 patience=EARLY_STOPPING_PATIENCE, min_delta=EARLY_STOPPING_MIN_DELTA,
+                 every=CHECKPOINT_EVERY, directory=MODEL_DIR):
+        self.stage = stage
+        self.backbone = backbone
+        self.model = model
+        self.optimizer = optimizer
+        self.scheduler = scheduler
+        self.keep = keep
+        self.patience = patience
+        self.min_delta = min_delta
+        self.every = every
+        self.directory = directory
+        self.path = os.path.join(directory, "training", f"stage{stage}_{backbone}.pth")
+        self.scores = {}  # mAP of every epoch whose weights file is kept, by epoch number
+        self.best_epoch = None
+        self.best_score = None
+        self.stale_epochs = 0
+
+    def save(self, epoch, batch):
+        atomic_save({
+            'model': self.model.state_dict(),
+            'optimizer': self.optimizer.state_dict(),
+            'scheduler': self.scheduler.state_dict(),
+            'epoch': epoch,
+            'batch': batch,
+            'rng': rng_state(),
+            'scores': self.scores,
+            'best_epoch': self.best_epoch,
+            'best_score': self.best_score,
+            'stale_epochs': self.stale_epochs,
+        }, self.path)
+
+    def save_periodically(self, epoch, batch):
+        """Save after every `every` batches; call once per training batch."""
+        if self.every and batch % self.every == 0:
+            self.save(epoch, batch)
+
+    def resume(self, num_epochs):
+        """Restore the state of an unfinished run, if any; returns the (epoch, batch) to continue from.
+
+        The state file of a run that already finished (all num_epochs done,
+        or stopped early) is moved aside, and training starts over.
+        """
+        if not os.path.exists(self.path):
+            return 0, 0
+        # Our own file, and it holds Python/NumPy RNG state, so it is not loaded weights_only
+        state = torch.load(self.path, map_location='cpu', weights_only=False)
+        stopped_early = self.patience > 0 and state['stale_epochs'] >= self.patience
+        if state['epoch'] >= num_epochs or stopped_early:
+            finished_path = self.path.replace(".pth", ".finished.pth")
+            os.replace(self.path, finished_path)
+            print(f"Warning: {self.path} is from a finished run (epoch {state['epoch']}), "
+                  f"moved it to {finished_path} and starting a new run")
+            return 0, 0
+        self.model.load_state_dict(state['model'])
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.scheduler.load_state_dict(state['scheduler'])
+        set_rng_state(state['rng'])
+        self.scores = state['scores']
+        self.best_epoch = state['best_epoch']
+        self.best_score = state['best_score']
+        self.stale_epochs = state['stale_epochs']
+        print(f"Resumed from {self.path} at epoch {state['epoch'] + 1}, batch {state['batch']}")
+        return state['epoch'], state['batch']
+
+    def end_epoch(self, epoch, score):
+        """Record the validation mAP of a finished epoch (0-based), keep its weights if they rank in the top k."""
+        number = epoch + 1
+        if self.best_score is None or score > self.best_score + self.min_delta:
+            self.best_epoch, self.best_score = number, score
+            self.stale_epochs = 0
+            best_path = best_checkpoint_path(self.stage, self.backbone, self.directory)
+            atomic_save(self.model.state_dict(), best_path)
+            print(f"Best model saved: {best_path} (mAP {score:.4f})")
+        else:
+            self.stale_epochs += 1
+
+        self.scores[number] = score
+        ranked = sorted(self.scores, key=self.scores.get, reverse=True)
+        if number in ranked[:self.keep]:
+            model_path = checkpoint_path(self.stage, number, self.backbone, self.directory)
+            atomic_save(self.model.state_dict(), model_path)
+            print(f"Model saved: {model_path} (mAP {score:.4f})")
+        for dropped in ranked[self.keep:]:
+            del self.scores[dropped]
+            model_path = checkpoint_path(self.stage, dropped, self.backbone, self.directory)
+            if os.path.exists(model_path):
+                os.remove(model_path)
+                print(f"Removed {model_path}: not in the best {self.keep} epochs")
+        print(f"Best epoch so far: {self.best_epoch} (mAP {self.best_score:.4f})")
+        self.save(epoch + 1, 0)
+
+    def should_stop(self):
+        return self.patience > 0 and self.stale_epochs >= self.patience
@@ -0,0 +1,77 @@
+import numpy as np
+import torch
+
+
+class CocoIndex:
+    """Boxes and labels of a COCO annotation file, grouped by image once at load time.
+
+    All valid boxes (width and height > 0) live in one [N, 4] float32
+    xyxy array and one int64 label array, ordered by image; offsets[i] to
+    offsets[i + 1] are the rows of the i-th image. Building is O(images +
+    annotations), and the arrays round-trip through an uncompressed .npz
+    cache so later runs skip JSON parsing altogether.
+    """
+
+    def __init__(self, file_names, boxes, labels, offsets, etag=""):
+        self.file_names = list(file_names)
+        self.boxes = boxes
+        self.labels = labels
+        self.offsets = offsets
+        self.etag = etag
+        self._positions = {name: i for i, name in enumerate(self.file_names)}
+
+    @classmethod
+    def from_coco(cls, coco_data, single_class=False, etag=""):
+        """Index a parsed COCO dict; single_class labels every box 1 instead of its category_id."""
+        images = coco_data['images']
+        annotations = coco_data['annotations']
+        positions = {img['id']: i for i, img in enumerate(images)}
+
+        image_pos = np.fromiter((positions.get(ann['image_id'], -1) for ann in annotations),
+                                dtype=np.int64, count=len(annotations))
+        bbox = np.array([ann['bbox'] for ann in annotations], dtype=np.float32).reshape(-1, 4)
+        if single_class:
+            labels = np.ones(len(annotations), dtype=np.int64)
+        else:
+            labels = np.fromiter((ann['category_id'] for ann in annotations), dtype=np.int64,
+                                 count=len(annotations))
+
+        valid = (bbox[:, 2] > 0) & (bbox[:, 3] > 0) & (image_pos >= 0)
+        image_pos, bbox, labels = image_pos[valid], bbox[valid], labels[valid]
+        order = np.argsort(image_pos, kind='stable')
+        image_pos, bbox, labels = image_pos[order], bbox[order], labels[order]
+
+        # COCO [x, y, width, height] -> [x_min, y_min, x_max, y_max]
+        boxes = bbox.copy()
+        boxes[:, 2:] += boxes[:, :2]
+        offsets = np.zeros(len(images) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(image_pos, minlength=len(images)), out=offsets[1:])
+        return cls([img['file_name'] for img in images], boxes, labels, offsets, etag)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['file_names'].tolist(), data['boxes'], data['labels'], data['offsets'],
+                       str(data['etag']))
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez(f, file_names=np.array(self.file_names), boxes=self.boxes, labels=self.labels,
+                     offsets=self.offsets, etag=np.array(self.etag))
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def count(self, file_name):
+        """Number of valid boxes of an image (0 for images not in the file)."""
+        i = self._positions.get(file_name)
+        return 0 if i is None else int(self.offsets[i + 1] - self.offsets[i])
+
+    def target(self, file_name):
+        """Detection target ({'boxes', 'labels'} tensors) of an image."""
+        i = self._positions.get(file_name)
+        start, stop = (0, 0) if i is None else (self.offsets[i], self.offsets[i + 1])
+        return {
+            "boxes": torch.from_numpy(self.boxes[start:stop].copy()).reshape(-1, 4),
+            "labels": torch.from_numpy(self.labels[start:stop].copy()),
+        }
@@ -0,0 +1,56 @@
+import os
+
+import torch
+from torch.utils.data import DataLoader, Sampler
+
+# DataLoader settings shared by the training scripts
+NUM_WORKERS = int(os.getenv("NUM_WORKERS", min(4, os.cpu_count() or 1)))  # 0 loads on the training thread
+PREFETCH_FACTOR = int(os.getenv("PREFETCH_FACTOR", 2))  # Batches each worker keeps ready
+PERSISTENT_WORKERS = os.getenv("PERSISTENT_WORKERS", "1") == "1"  # Keep workers alive between epochs
+PIN_MEMORY = os.getenv("PIN_MEMORY", "1" if torch.cuda.is_available() else "0") == "1"
+SEED = int(os.getenv("SEED", 0))  # Shuffle seed; epoch e uses the order of SEED + e
+
+
+class EpochSampler(Sampler):
+    """Shuffled sample order that depends only on the seed and the epoch.
+
+    A training run resumed mid-epoch calls set_epoch with the number of
+    samples already trained on, and gets the rest of the same order.
+    """
+
+    def __init__(self, size, seed=SEED):
+        self.size = size
+        self.seed = seed
+        self.epoch = 0
+        self.start = 0
+
+    def set_epoch(self, epoch, start=0):
+        self.epoch = epoch
+        self.start = start
+
+    def __iter__(self):
+        generator = torch.Generator().manual_seed(self.seed + self.epoch)
+        return iter(torch.randperm(self.size, generator=generator)[self.start:].tolist())
+
+    def __len__(self):
+        return max(0, self.size - self.start)
+
+
+def collate_detections(batch):
+    """(images, targets) tuples of a detection batch; a module-level function so workers can unpickle it."""
+    return tuple(zip(*batch))
+
+
+def create_data_loader(dataset, batch_size, shuffle, num_workers=NUM_WORKERS, prefetch_factor=PREFETCH_FACTOR,
+                       persistent_workers=PERSISTENT_WORKERS, pin_memory=PIN_MEMORY):
+    """DataLoader over a detection dataset, loading batches in num_workers background processes.
+
+    Shuffled loaders draw their order from an EpochSampler (loader.sampler).
+    """
+    options = {}
+    if num_workers > 0:
+        options = {'prefetch_factor': prefetch_factor, 'persistent_workers': persistent_workers}
+    if shuffle:
+        options['sampler'] = EpochSampler(len(dataset))
+    return DataLoader(dataset, batch_size=batch_size, collate_fn=collate_detections,
+                      num_workers=num_workers, pin_memory=pin_memory, **options)
@@ -0,0 +1,106 @@
+import torch
+from PIL import Image
+import os
+import json
+import boto3
+from io import BytesIO
+from annotate import encode
+from backbones import DEFAULT_BACKBONE, default_checkpoint
+from cascade import Cascade, draw_result
+from model_factory import load_model
+from pipeline import Uploader, prefetch
+
+# AWS S3 settings
+BUCKET_NAME = "rpi-upload-bucket"
+INPUT_PREFIX = "Dataset/samples/stage_1"
+OUTPUT_PREFIX = "Dataset/output/cascade"
+SUPPORTED_EXTS = (".jpg", ".jpeg", ".png")
+
+# Models (default: the best epoch trained of each stage)
+BACKBONE = os.getenv("BACKBONE", DEFAULT_BACKBONE)
+STAGE1_CHECKPOINT = os.getenv("STAGE1_CHECKPOINT") or default_checkpoint(1, BACKBONE)
+STAGE2_CHECKPOINT = os.getenv("STAGE2_CHECKPOINT") or default_checkpoint(2, BACKBONE)
+SHARED_BACKBONE = os.getenv("SHARED_BACKBONE", "0") == "1"  # Stage-2 heads trained on the stage-1 backbone
+
+# Inference settings
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 4))  # Images per stage-1 forward pass
+DETECT_THRESHOLD = float(os.getenv("DETECT_THRESHOLD", 0.5))
+CLASSIFY_THRESHOLD = float(os.getenv("CLASSIFY_THRESHOLD", 0.5))
+
+# I/O pipeline settings
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", 4))
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", 16))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 4))
+MAX_PENDING_UPLOADS = int(os.getenv("MAX_PENDING_UPLOADS", 64))
+
+# Annotated image encoding
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "png")  # png, or jpeg/webp: smaller, faster
+OUTPUT_QUALITY = int(os.getenv("OUTPUT_QUALITY", 90))
+
+# Initialize S3 client
+s3 = boto3.client(
+    's3',
+    aws_access_key_id=os.getenv("aws_access_key_id"),
+    aws_secret_access_key=os.getenv("aws_secret_access_key"),
+    region_name='ap-southeast-1',
+    endpoint_url=os.getenv("S3_ENDPOINT_URL")
+)
+
+def load_image_from_s3(s3_key):
+    response = s3.get_object(Bucket=BUCKET_NAME, Key=s3_key)
+    image_bytes = response['Body'].read()
+    return Image.open(BytesIO(image_bytes)).convert("RGB")
+
+def save_result(image, s3_key, result, uploader):
+    base_name = os.path.splitext(os.path.basename(s3_key))[0]
+
+    buffer, extension = encode(draw_result(image, result), OUTPUT_FORMAT, OUTPUT_QUALITY)
+    s3_output_key = f"{OUTPUT_PREFIX}/annotated/{base_name}.{extension}"
+    uploader.submit(buffer, s3_output_key)
+    result["annotated_image_key"] = s3_output_key
+
+    s3_output_key = f"{OUTPUT_PREFIX}/results/{base_name}.json"
+    uploader.submit(BytesIO(json.dumps(result).encode()), s3_output_key)
+    print(f"{base_name}: {result['box_count']} boxes, PE {result['percent_PE']}% "
+          f"PP {result['percent_PP']}% PS {result['percent_PS']}%")
+
+def main():
+    device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
+    cascade = Cascade(
+        load_model(2, STAGE1_CHECKPOINT, BACKBONE, device),
+        load_model(4, STAGE2_CHECKPOINT, BACKBONE, device),
+        device,
+        batch_size=BATCH_SIZE,
+        detect_threshold=DETECT_THRESHOLD,
+        classify_threshold=CLASSIFY_THRESHOLD,
+        shared_backbone=SHARED_BACKBONE,
+    )
+
+    paginator = s3.get_paginator('list_objects_v2')
+    image_keys = [
+        obj['Key']
+        for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=INPUT_PREFIX)
+        for obj in page.get('Contents', [])
+        if obj['Key'].lower().endswith(SUPPORTED_EXTS)
+    ]
+    if not image_keys:
+        print("No images found in S3 bucket.")
+        return
+
+    def run(batch, uploader):
+        for (key, image), result in zip(batch, cascade.run([image for _, image in batch])):
+            save_result(image, key, result, uploader)
+
+    images = prefetch(image_keys, load_image_from_s3, workers=DOWNLOAD_WORKERS, depth=PREFETCH_DEPTH)
+    with Uploader(s3, BUCKET_NAME, workers=UPLOAD_WORKERS, max_pending=MAX_PENDING_UPLOADS) as uploader:
+        batch = []
+        for key, image in images:
+            batch.append((key, image))
+            if len(batch) == BATCH_SIZE:
+                run(batch, uploader)
+                batch = []
+        if batch:
+            run(batch, uploader)
+
+if __name__ == "__main__":
+    main()
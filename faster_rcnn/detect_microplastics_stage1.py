@@ -1,13 +1,16 @@
 import torch
-import torchvision
-from torchvision.models.detection import FasterRCNN_ResNet50_FPN_Weights
-from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
-from torchvision.transforms import functional as F
-import matplotlib.pyplot as plt
 from PIL import Image
 import os
+import json
 import boto3
 from io import BytesIO
+import atlas
+from annotate import annotate, detections, encode
+from backbones import DEFAULT_BACKBONE, checkpoint_path, default_checkpoint
+from backends import load_detector
+from inference import InferenceEngine, TiledInferenceEngine
+from model_factory import load_model
+from pipeline import Uploader, prefetch
 
 # AWS S3 settings
 BUCKET_NAME = "rpi-upload-bucket"
@@ -15,102 +18,89 @@ INPUT_PREFIX = "Dataset/samples/stage_1"
 OUTPUT_PREFIX = "Dataset/output/stage_1"
 SUPPORTED_EXTS = (".jpg", ".jpeg", ".png")
 
+# Inference settings
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 4))  # Images per forward pass
+NUM_THREADS = int(os.getenv("NUM_THREADS", 0)) or None  # Intra-op CPU threads (default: PyTorch's choice)
+
+# Detector backbone and the epoch of its stage-1 checkpoint to load (default: the best one trained)
+BACKBONE = os.getenv("BACKBONE", DEFAULT_BACKBONE)
+CHECKPOINT_EPOCH = os.getenv("CHECKPOINT_EPOCH")
+CHECKPOINT = os.getenv("CHECKPOINT") or (checkpoint_path(1, int(CHECKPOINT_EPOCH), BACKBONE) if CHECKPOINT_EPOCH
+                                         else default_checkpoint(1, BACKBONE))
+
+# Inference backend: eager (the .pth checkpoint), torchscript or onnx (artifacts from export_model.py)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager")
+MODEL_ARTIFACT = os.getenv("MODEL_ARTIFACT")  # .pt or .onnx file for the torchscript/onnx backends
+
+# Tiled inference at full resolution (TILE_SIZE=0 runs whole images at the model's default scale)
+TILE_SIZE = int(os.getenv("TILE_SIZE", 0))  # Side of a square tile in pixels, e.g. 640
+TILE_OVERLAP = int(os.getenv("TILE_OVERLAP", 128))  # Pixels shared by neighbouring tiles
+MAX_BATCH_MB = int(os.getenv("MAX_BATCH_MB", 2048))  # Memory budget per batch of tiles
+
+# I/O pipeline settings
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", 4))  # Parallel S3 downloads + decodes
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", 16))  # Images downloaded ahead of the model
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 4))  # Parallel S3 uploads of outputs
+MAX_PENDING_UPLOADS = int(os.getenv("MAX_PENDING_UPLOADS", 64))  # Outputs queued before the model waits
+
+# Annotated image encoding
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "png")  # png (original .png keys), or jpeg/webp: smaller, faster
+OUTPUT_QUALITY = int(os.getenv("OUTPUT_QUALITY", 90))  # JPEG/WebP quality
+
+# "files": one image per box and per crop (annotated_per_box/, cropped_boxes/);
+# "packed": one crop atlas + JSON box index per image instead
+OUTPUT_MODE = os.getenv("OUTPUT_MODE", "files")
+
 # Initialize S3 client
 s3 = boto3.client(
     's3',
     aws_access_key_id=os.getenv("aws_access_key_id"),
     aws_secret_access_key=os.getenv("aws_secret_access_key"),
-    region_name='ap-southeast-1'
+    region_name='ap-southeast-1',
+    endpoint_url=os.getenv("S3_ENDPOINT_URL")  # e.g. a local MinIO/moto server for testing
 )
 
-# Load Faster R-CNN with ResNet-50 backbone
-def get_model(num_classes):
-    weights = FasterRCNN_ResNet50_FPN_Weights.DEFAULT
-    model = torchvision.models.detection.fasterrcnn_resnet50_fpn(weights=weights)
-    in_features = model.roi_heads.box_predictor.cls_score.in_features
-    model.roi_heads.box_predictor = FastRCNNPredictor(in_features, num_classes)
-    return model
-
 def load_image_from_s3(s3_key):
     response = s3.get_object(Bucket=BUCKET_NAME, Key=s3_key)
     image_bytes = response['Body'].read()
     return Image.open(BytesIO(image_bytes)).convert("RGB")
 
-def prepare_image(image, device):
-    image_tensor = F.to_tensor(image).unsqueeze(0)
-    return image_tensor.to(device)
+def upload(buffer, s3_output_key, uploader=None):
+    if uploader is None:
+        s3.upload_fileobj(buffer, BUCKET_NAME, s3_output_key)
+    else:
+        uploader.submit(buffer, s3_output_key)
 
 def get_class_name(class_id):
     COCO_CLASSES = {0: "Background", 1: "Microplastics"}
     return COCO_CLASSES.get(class_id, "Unknown")
 
-def draw_boxes_and_save(image, s3_key, prediction, fig_size=(10, 10), threshold=0.5):
-    from io import BytesIO
+def draw_boxes_and_save(image, s3_key, prediction, threshold=0.5, uploader=None):
     image_name = os.path.basename(s3_key)
     base_name = os.path.splitext(image_name)[0]
 
-    plt.figure(figsize=fig_size)
-    plt.imshow(image)
-    ax = plt.gca()
+    annotated = annotate(image, detections(prediction[0], threshold), get_class_name)
+    buffer, extension = encode(annotated, OUTPUT_FORMAT, OUTPUT_QUALITY)
 
-    boxes = prediction[0]['boxes'].cpu().numpy()
-    labels = prediction[0]['labels'].cpu().numpy()
-    scores = prediction[0]['scores'].cpu().numpy()
-
-    for box, label, score in zip(boxes, labels, scores):
-        if score > threshold:
-            x_min, y_min, x_max, y_max = box
-            class_name = get_class_name(label)
-            ax.add_patch(plt.Rectangle((x_min, y_min), x_max - x_min, y_max - y_min,
-                                       linewidth=2, edgecolor='r', facecolor='none'))
-            ax.text(x_min, y_min, f"{class_name} ({score:.2f})", color='r', backgroundcolor='white')
-
-    ax.axis('off')
-
-    buffer = BytesIO()
-    plt.savefig(buffer, format='PNG', bbox_inches='tight')
-    buffer.seek(0)
-    plt.close()
-
-    s3_output_key = f"{OUTPUT_PREFIX}/annotated_all/{base_name}_all_boxes.png"
-    s3.upload_fileobj(buffer, BUCKET_NAME, s3_output_key)
+    s3_output_key = f"{OUTPUT_PREFIX}/annotated_all/{base_name}_all_boxes.{extension}"
+    upload(buffer, s3_output_key, uploader)
     print(f"Uploaded annotated image to S3: {s3_output_key}")
 
-def save_image_per_box(image, s3_key, prediction, threshold=0.5):
-    from io import BytesIO
+def save_image_per_box(image, s3_key, prediction, threshold=0.5, uploader=None):
     image_name = os.path.basename(s3_key)
     base_name = os.path.splitext(image_name)[0]
 
-    boxes = prediction[0]['boxes'].cpu()
-    labels = prediction[0]['labels'].cpu()
-    scores = prediction[0]['scores'].cpu()
-
-    for i, (box, label, score) in enumerate(zip(boxes, labels, scores)):
+    # Indices count every prediction, so box i matches crop i in save_cropped_boxes
+    for i, (box, label, score) in enumerate(detections(prediction[0], threshold=0)):
         if score >= threshold:
-            fig, ax = plt.subplots(figsize=(12, 10))
-            ax.imshow(image)
-
-            box = box.tolist()
-            x_min, y_min, x_max, y_max = box
-            class_name = get_class_name(label.item())
+            annotated = annotate(image, [(box, label, score)], get_class_name)
+            buffer, extension = encode(annotated, OUTPUT_FORMAT, OUTPUT_QUALITY)
 
-            ax.add_patch(plt.Rectangle((x_min, y_min), x_max - x_min, y_max - y_min,
-                                       linewidth=2, edgecolor='r', facecolor='none'))
-            ax.text(x_min, y_min, f"{class_name} ({score:.2f})", color='r', backgroundcolor='white')
-
-            ax.axis('off')
-
-            buffer = BytesIO()
-            plt.savefig(buffer, format='PNG', bbox_inches='tight')
-            buffer.seek(0)
-            plt.close()
-
-            s3_output_key = f"{OUTPUT_PREFIX}/annotated_per_box/{base_name}_box_{i}.png"
-            s3.upload_fileobj(buffer, BUCKET_NAME, s3_output_key)
+            s3_output_key = f"{OUTPUT_PREFIX}/annotated_per_box/{base_name}_box_{i}.{extension}"
+            upload(buffer, s3_output_key, uploader)
             print(f"Uploaded box {i} to S3: {s3_output_key}")
 
-def save_cropped_boxes(image, s3_key, prediction, threshold=0.5):
-    from io import BytesIO
+def save_cropped_boxes(image, s3_key, prediction, threshold=0.5, uploader=None):
     image_name = os.path.basename(s3_key)
     base_name = os.path.splitext(image_name)[0]
 
@@ -127,38 +117,65 @@ def save_cropped_boxes(image, s3_key, prediction, threshold=0.5):
             buffer.seek(0)
 
             s3_output_key = f"{OUTPUT_PREFIX}/cropped_boxes/{base_name}_crop_{i}.png"
-            s3.upload_fileobj(buffer, BUCKET_NAME, s3_output_key)
+            upload(buffer, s3_output_key, uploader)
             print(f"Uploaded cropped box {i} to S3: {s3_output_key}")
 
+def save_box_index(image, s3_key, prediction, threshold=0.5, uploader=None):
+    image_name = os.path.basename(s3_key)
+    base_name = os.path.splitext(image_name)[0]
+
+    boxes = [(i, box, label, score)
+             for i, (box, label, score) in enumerate(detections(prediction[0], threshold=0))
+             if score >= threshold]
+    crop_atlas, index = atlas.build(image, image_name, boxes, get_class_name)
+
+    if crop_atlas is not None:
+        buffer, extension = encode(crop_atlas, "png")
+        s3_output_key = f"{OUTPUT_PREFIX}/crop_atlas/{base_name}_crops.{extension}"
+        upload(buffer, s3_output_key, uploader)
+        index['atlas_key'] = s3_output_key
+        print(f"Uploaded crop atlas ({len(boxes)} boxes) to S3: {s3_output_key}")
+
+    s3_output_key = f"{OUTPUT_PREFIX}/box_index/{base_name}.json"
+    upload(BytesIO(json.dumps(index).encode()), s3_output_key, uploader)
+    print(f"Uploaded box index to S3: {s3_output_key}")
+
 def main():
     num_classes = 2
     device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
 
-    model = get_model(num_classes)
-    model.load_state_dict(torch.load("faster_rcnn/models/fasterrcnn_resnet50_epoch_2.pth"))
-    model.to(device)
-    model.eval()
-
-    response = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=INPUT_PREFIX)
-    if 'Contents' not in response:
+    if INFERENCE_BACKEND == "eager":
+        model = load_model(num_classes, CHECKPOINT, BACKBONE, device)
+    else:
+        model = load_detector(INFERENCE_BACKEND, MODEL_ARTIFACT, device, num_threads=NUM_THREADS)
+
+    paginator = s3.get_paginator('list_objects_v2')
+    image_keys = [
+        obj['Key']
+        for page in paginator.paginate(Bucket=BUCKET_NAME, Prefix=INPUT_PREFIX)
+        for obj in page.get('Contents', [])
+        if obj['Key'].lower().endswith(SUPPORTED_EXTS)
+    ]
+    if not image_keys:
         print("No images found in S3 bucket.")
         return
 
-    for obj in response['Contents']:
-        key = obj['Key']
-        if key.lower().endswith(SUPPORTED_EXTS):
-            image_name = os.path.basename(key)
-            print(f"Processing: {image_name}")
-
-            image = load_image_from_s3(key)
-            image_tensor = prepare_image(image, device)
-
-            with torch.no_grad():
-                prediction = model(image_tensor)
-
-                draw_boxes_and_save(image, key, prediction, fig_size=(12, 10), threshold=0.5)
-                save_image_per_box(image, key, prediction, threshold=0.5)
-                save_cropped_boxes(image, key, prediction, threshold=0.5)
+    # Downloads run ahead of the model and uploads drain behind it, each on its own pool
+    images = prefetch(image_keys, load_image_from_s3, workers=DOWNLOAD_WORKERS, depth=PREFETCH_DEPTH)
+    if TILE_SIZE:
+        engine = TiledInferenceEngine(model, device, tile_size=TILE_SIZE, overlap=TILE_OVERLAP,
+                                      max_batch_mb=MAX_BATCH_MB, num_threads=NUM_THREADS)
+    else:
+        engine = InferenceEngine(model, device, batch_size=BATCH_SIZE, num_threads=NUM_THREADS)
+    with Uploader(s3, BUCKET_NAME, workers=UPLOAD_WORKERS, max_pending=MAX_PENDING_UPLOADS) as uploader:
+        for key, image, prediction in engine.predict_stream(images):
+            print(f"Processing: {os.path.basename(key)}")
+            draw_boxes_and_save(image, key, [prediction], threshold=0.5, uploader=uploader)
+            if OUTPUT_MODE == "files":
+                save_image_per_box(image, key, [prediction], threshold=0.5, uploader=uploader)
+                save_cropped_boxes(image, key, [prediction], threshold=0.5, uploader=uploader)
+            else:
+                save_box_index(image, key, [prediction], threshold=0.5, uploader=uploader)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,117 @@
+"""Export a trained detector checkpoint to frozen TorchScript and/or ONNX for CPU inference.
+
+    python faster_rcnn/export_model.py faster_rcnn/models/fasterrcnn_resnet50_epoch_2.pth --num-classes 2 \\
+        --formats torchscript onnx --quantize dynamic --channels-last
+
+Artifacts are written next to the checkpoint (or to --output), e.g.
+fasterrcnn_resnet50_epoch_2.int8-dynamic.pt and .onnx. Quantization:
+  dynamic  INT8 weights for the fully connected box head (TorchScript and ONNX)
+  static   INT8 weights and activations, calibrated on --calibration-images (ONNX only)
+--min-size/--max-size bake the model's internal resize into the artifact
+(e.g. the tile size used with TILE_SIZE).
+"""
+import argparse
+import os
+import tempfile
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision.transforms import functional as F
+
+from backbones import BACKBONES, DEFAULT_BACKBONE
+from model_factory import build_model
+
+try:
+    from onnxruntime import quantization as ort_quantization
+except ImportError:  # optional: only needed to quantize ONNX exports
+    ort_quantization = None
+
+SUPPORTED_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def artifact_path(output, quantize, extension):
+    suffix = f".int8-{quantize}" if quantize != 'none' else ""
+    return f"{output}{suffix}.{extension}"
+
+
+def calibration_images(directory, limit=32):
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith(SUPPORTED_EXTS))[:limit]
+    for name in names:
+        yield F.to_tensor(Image.open(os.path.join(directory, name)).convert("RGB"))
+
+
+def export_torchscript(model, path, quantize='none', channels_last=False):
+    if quantize == 'static':
+        raise SystemExit("Static INT8 quantization is only supported for ONNX exports")
+    if quantize == 'dynamic':
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    scripted = torch.jit.freeze(torch.jit.script(model.eval()))
+    torch.jit.save(scripted, path)
+
+
+def export_onnx(model, path, quantize='none', calibration_dir=None):
+    if quantize != 'none' and ort_quantization is None:
+        raise SystemExit("Quantizing ONNX exports needs the 'onnxruntime' package")
+    if quantize == 'static' and not calibration_dir:
+        raise SystemExit("Static INT8 quantization needs --calibration-images")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32_path = path if quantize == 'none' else os.path.join(tmp, "fp32.onnx")
+        sample = [torch.rand(3, 480, 640)]
+        torch.onnx.export(
+            model, (sample,), fp32_path,
+            opset_version=17,
+            input_names=['image'],
+            output_names=['boxes', 'labels', 'scores'],
+            dynamic_axes={'image': {1: 'height', 2: 'width'}, 'boxes': {0: 'detections'},
+                          'labels': {0: 'detections'}, 'scores': {0: 'detections'}},
+            dynamo=False,
+        )
+        if quantize == 'dynamic':
+            ort_quantization.quantize_dynamic(fp32_path, path, weight_type=ort_quantization.QuantType.QInt8)
+        elif quantize == 'static':
+            images = ({'image': image.numpy().astype(np.float32)} for image in calibration_images(calibration_dir))
+
+            class Reader(ort_quantization.CalibrationDataReader):
+                def get_next(self):
+                    return next(images, None)
+
+            ort_quantization.quantize_static(fp32_path, path, Reader())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('checkpoint')
+    parser.add_argument('--backbone', choices=list(BACKBONES), default=DEFAULT_BACKBONE)
+    parser.add_argument('--num-classes', type=int, required=True)
+    parser.add_argument('--output', help="Artifact path without extension (default: next to the checkpoint)")
+    parser.add_argument('--formats', nargs='+', choices=['torchscript', 'onnx'], default=['torchscript', 'onnx'])
+    parser.add_argument('--quantize', choices=['none', 'dynamic', 'static'], default='none')
+    parser.add_argument('--calibration-images', help="Directory of validation images for static quantization")
+    parser.add_argument('--channels-last', action='store_true', help="TorchScript only")
+    parser.add_argument('--min-size', type=int, help="Override the model's internal resize (shorter side)")
+    parser.add_argument('--max-size', type=int, help="Override the model's internal resize (longer side)")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.checkpoint)[0]
+    model = build_model(args.num_classes, args.checkpoint, args.backbone)
+    if args.min_size:
+        model.transform.min_size = (args.min_size,)
+    if args.max_size:
+        model.transform.max_size = args.max_size
+
+    if 'torchscript' in args.formats:
+        path = artifact_path(output, args.quantize, 'pt')
+        export_torchscript(model, path, args.quantize, args.channels_last)
+        print(f"Saved TorchScript model: {path}")
+    if 'onnx' in args.formats:
+        path = artifact_path(output, args.quantize, 'onnx')
+        export_onnx(model, path, args.quantize, args.calibration_images)
+        print(f"Saved ONNX model: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Local, content-addressed cache of decoded training images.
+
+Pull dataset prefixes into the cache ahead of training (training also
+does this on startup):
+    python faster_rcnn/image_cache.py Dataset/train_new/stage1 Dataset/valid_new/stage1
+"""
+import argparse
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import boto3
+import numpy as np
+from PIL import Image
+
+SUPPORTED_EXTS = (".jpg", ".jpeg", ".png")
+
+# Longest side kept in the cache: Faster R-CNN resizes a 1920x1080 capture to 1333x750 anyway
+MAX_SIZE = 1333
+
+
+def list_images(s3, bucket_name, prefix):
+    """(key, ETag) of every image under a prefix; a single listing covers the ETag check of all of them."""
+    paginator = s3.get_paginator('list_objects_v2')
+    return [
+        (obj['Key'], obj['ETag'])
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix)
+        for obj in page.get('Contents', [])
+        if obj['Key'].lower().endswith(SUPPORTED_EXTS)
+    ]
+
+
+class ImageCache:
+    """Decoded, resized uint8 RGB images on local disk, one .npy file per S3 object version.
+
+    Files are named by the object's ETag, so a changed image in S3 gets
+    a new file and an unchanged one is never downloaded again. Reads are
+    memory-mapped: after the first epoch an image costs a page-cache
+    read, with no download or JPEG decode. The original size of every
+    image is kept in a manifest so boxes can be scaled to match.
+    """
+
+    def __init__(self, directory, max_size=MAX_SIZE):
+        self.directory = os.path.join(directory, str(max_size))
+        self.max_size = max_size
+        self._manifest_path = os.path.join(self.directory, "manifest.json")
+        self._lock = threading.Lock()
+        self.sizes = {}
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path) as f:
+                self.sizes = json.load(f)
+
+    def path(self, etag):
+        name = etag.strip('"')
+        return os.path.join(self.directory, name[:2], f"{name}.npy")
+
+    def __contains__(self, etag):
+        return etag in self.sizes and os.path.exists(self.path(etag))
+
+    def _store(self, etag, image_bytes):
+        image = Image.open(BytesIO(image_bytes)).convert("RGB")
+        original_size = image.size
+        if max(image.size) > self.max_size:
+            image.thumbnail((self.max_size, self.max_size), Image.BILINEAR)
+
+        path = self.path(etag)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.asarray(image, dtype=np.uint8))
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.sizes[etag] = list(original_size)
+
+    def sync(self, s3, bucket_name, objects, workers=8):
+        """Download and decode every (key, ETag) not in the cache yet; returns the number fetched."""
+        missing = [(key, etag) for key, etag in objects if etag not in self]
+
+        def fetch(item):
+            key, etag = item
+            response = s3.get_object(Bucket=bucket_name, Key=key, IfMatch=etag)
+            self._store(etag, response['Body'].read())
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(fetch, missing))
+            self._save_manifest()
+        return len(missing)
+
+    def _save_manifest(self):
+        # Merge with entries another cache instance may have written since this one was opened
+        sizes = {}
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path) as f:
+                sizes = json.load(f)
+        sizes.update(self.sizes)
+        self.sizes = sizes
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(sizes, f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def __getstate__(self):
+        # Locks cannot be pickled into DataLoader worker processes
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def read(self, etag):
+        """(memory-mapped HxWx3 uint8 array, scale from original to cached pixels) of a cached image."""
+        array = np.load(self.path(etag), mmap_mode='r')
+        return array, array.shape[1] / self.sizes[etag][0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('prefixes', nargs='+')
+    parser.add_argument('--bucket', default="rpi-upload-bucket")
+    parser.add_argument('--cache-dir', default=os.getenv("IMAGE_CACHE_DIR", "faster_rcnn/cache/images"))
+    parser.add_argument('--max-size', type=int, default=MAX_SIZE)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    s3 = boto3.client(
+        's3',
+        aws_access_key_id=os.getenv("aws_access_key_id"),
+        aws_secret_access_key=os.getenv("aws_secret_access_key"),
+        region_name='ap-southeast-1',
+        endpoint_url=os.getenv("S3_ENDPOINT_URL")
+    )
+    cache = ImageCache(args.cache_dir, args.max_size)
+    for prefix in args.prefixes:
+        objects = list_images(s3, args.bucket, prefix)
+        fetched = cache.sync(s3, args.bucket, objects, workers=args.workers)
+        print(f"{prefix}: {len(objects)} images, {fetched} downloaded, {len(objects) - fetched} already cached")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+from contextlib import contextmanager
+
+import torch
+from torchvision.ops import batched_nms
+from torchvision.transforms import functional as F
+
+# Peak inference memory of fasterrcnn_resnet50_fpn on CPU, per megapixel of input (measured)
+MB_PER_MEGAPIXEL = 650
+
+
+class InferenceEngine:
+    """Runs a torchvision detection model over many images in batched forward passes.
+
+    Images are grouped by size before batching: the model pads every image
+    in a batch to the largest one, so mixing sizes wastes compute. Each
+    group is split into batches of at most batch_size images, and
+    predictions come back per image, in input order, on the CPU.
+    """
+
+    def __init__(self, model, device, batch_size=4, num_threads=None):
+        self.model = model
+        self.device = device
+        self.batch_size = batch_size
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+    def _batches(self, images):
+        """Index lists of same-size images, at most batch_size long."""
+        buckets = {}
+        for i, image in enumerate(images):
+            buckets.setdefault(image.size, []).append(i)
+        for indices in buckets.values():
+            for start in range(0, len(indices), self.batch_size):
+                yield indices[start:start + self.batch_size]
+
+    @torch.inference_mode()
+    def predict(self, images):
+        """Predictions ({'boxes', 'labels', 'scores'}) for a list of PIL images."""
+        predictions = [None] * len(images)
+        for indices in self._batches(images):
+            tensors = [F.to_tensor(images[i]).to(self.device) for i in indices]
+            outputs = self.model(tensors)
+            for i, output in zip(indices, outputs):
+                predictions[i] = {k: v.cpu() for k, v in output.items()}
+        return predictions
+
+    def predict_stream(self, items, window=None):
+        """Yield (key, image, prediction) for an iterable of (key, image) pairs.
+
+        Up to `window` images (default 4 batches) are buffered so that
+        same-size images can share a batch; results for a window are yielded
+        once all of its batches have run.
+        """
+        window = window or self.batch_size * 4
+        buffer = []
+        for item in items:
+            buffer.append(item)
+            if len(buffer) >= window:
+                yield from self._flush(buffer)
+                buffer = []
+        if buffer:
+            yield from self._flush(buffer)
+
+    def _flush(self, buffer):
+        predictions = self.predict([image for _, image in buffer])
+        for (key, image), prediction in zip(buffer, predictions):
+            yield key, image, prediction
+
+
+def tile_origins(length, tile, overlap):
+    """Start offsets of tiles covering [0, length), with the last tile flush to the end; needs 0 <= overlap < tile."""
+    if length <= tile:
+        return [0]
+    stride = tile - overlap
+    origins = list(range(0, length - tile, stride))
+    return origins + [length - tile]
+
+
+class TiledInferenceEngine(InferenceEngine):
+    """Runs a detection model over overlapping full-resolution tiles and stitches the boxes back together.
+
+    Each image is cut into tile_size squares overlapping by `overlap`
+    pixels; the model's internal resize is pinned to tile_size so tiles
+    are seen at native resolution. Tiles of all images are batched
+    together, as many per forward pass as fit in max_batch_mb. Boxes are
+    shifted back to image coordinates; boxes cut by an inner tile edge are
+    dropped when they are small enough to appear whole in the neighbouring
+    tile, and remaining cross-tile duplicates are removed with per-class NMS.
+
+    An eager model's resize is only pinned for the duration of predict() and
+    restored after, so a model shared through load_model keeps its settings
+    for other callers; exported models need the tile size baked in
+    (export_model.py --min-size/--max-size).
+    """
+
+    def __init__(self, model, device, tile_size=640, overlap=128, max_batch_mb=2048,
+                 iou_threshold=0.5, num_threads=None):
+        if tile_size <= 0:
+            raise ValueError(f"tile_size must be positive, got {tile_size}")
+        if not 0 <= overlap < tile_size:
+            raise ValueError(f"overlap must be in [0, tile_size), got overlap={overlap} with tile_size={tile_size}")
+        batch_size = max(1, int(max_batch_mb / (MB_PER_MEGAPIXEL * tile_size * tile_size / 1e6)))
+        super().__init__(model, device, batch_size=batch_size, num_threads=num_threads)
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.iou_threshold = iou_threshold
+
+    @contextmanager
+    def _tile_resize(self):
+        """Pin the model's internal resize to tile_size, restoring its own sizes on exit."""
+        transform = getattr(self.model, 'transform', None)
+        if transform is None:
+            yield
+            return
+        sizes = transform.min_size, transform.max_size
+        transform.min_size, transform.max_size = (self.tile_size,), self.tile_size
+        try:
+            yield
+        finally:
+            transform.min_size, transform.max_size = sizes
+
+    def _tiles(self, image):
+        """(crop box, inner-edge flags (left, top, right, bottom)) of each tile of an image."""
+        width, height = min(self.tile_size, image.width), min(self.tile_size, image.height)
+        for y in tile_origins(image.height, self.tile_size, self.overlap):
+            for x in tile_origins(image.width, self.tile_size, self.overlap):
+                inner = (x > 0, y > 0, x + width < image.width, y + height < image.height)
+                yield (x, y, x + width, y + height), inner
+
+    def _keep(self, boxes, inner, width, height, margin=2):
+        """Mask of tile boxes not cut off by an inner tile edge (or too big to fit in the overlap)."""
+        small = ((boxes[:, 2] - boxes[:, 0]) < self.overlap) & ((boxes[:, 3] - boxes[:, 1]) < self.overlap)
+        cut = torch.zeros(len(boxes), dtype=torch.bool)
+        if inner[0]:
+            cut |= boxes[:, 0] <= margin
+        if inner[1]:
+            cut |= boxes[:, 1] <= margin
+        if inner[2]:
+            cut |= boxes[:, 2] >= width - margin
+        if inner[3]:
+            cut |= boxes[:, 3] >= height - margin
+        return ~(cut & small)
+
+    def predict(self, images):
+        tiles, placements = [], []
+        for n, image in enumerate(images):
+            for crop_box, inner in self._tiles(image):
+                tiles.append(image.crop(crop_box))
+                placements.append((n, crop_box, inner))
+
+        with self._tile_resize():
+            tile_predictions = super().predict(tiles)
+
+        parts = [[] for _ in images]
+        for (n, (x, y, x_max, y_max), inner), prediction in zip(placements, tile_predictions):
+            keep = self._keep(prediction['boxes'], inner, x_max - x, y_max - y)
+            part = {k: v[keep] for k, v in prediction.items()}
+            part['boxes'] = part['boxes'] + torch.tensor([x, y, x, y], dtype=part['boxes'].dtype)
+            parts[n].append(part)
+
+        predictions = []
+        for image_parts in parts:
+            merged = {k: torch.cat([part[k] for part in image_parts]) for k in ('boxes', 'labels', 'scores')}
+            keep = batched_nms(merged['boxes'], merged['scores'], merged['labels'], self.iou_threshold)
+            predictions.append({k: v[keep] for k, v in merged.items()})
+        return predictions
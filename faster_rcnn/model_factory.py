@@ -0,0 +1,56 @@
+import threading
+import time
+
+import torch
+
+from backbones import DEFAULT_BACKBONE
+from backbones import build_model as build_architecture
+
+# Models already loaded by this process, by (num_classes, checkpoint, backbone, device)
+_models = {}
+_lock = threading.Lock()
+
+# Cold-start seconds of every model this process built, by checkpoint
+load_times = {}
+
+
+def read_checkpoint(path):
+    """State dict of a checkpoint, memory-mapped rather than read into memory up front."""
+    return torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+
+
+def build_model(num_classes, checkpoint=None, backbone=DEFAULT_BACKBONE, pretrained=False):
+    """A new eval-mode detector, from a fine-tuned checkpoint or, without one, with random weights.
+
+    With a checkpoint the architecture is built with weights=None, so
+    nothing is downloaded only to be overwritten, and the memory-mapped
+    tensors are used as the parameters as-is. Without one, pretrained
+    downloads the COCO weights instead of leaving the weights random.
+    """
+    if checkpoint and pretrained:
+        raise ValueError("pretrained only applies when no checkpoint is given")
+    start = time.perf_counter()
+    model = build_architecture(num_classes, backbone, pretrained=pretrained)
+    if checkpoint:
+        model.load_state_dict(read_checkpoint(checkpoint), assign=True)
+    model.eval()
+    elapsed = time.perf_counter() - start
+    source = checkpoint or ("COCO weights" if pretrained else "random weights")
+    load_times[checkpoint or f"{backbone} ({source})"] = elapsed
+    print(f"Loaded {backbone} model from {source} in {elapsed:.2f}s")
+    return model
+
+
+def load_model(num_classes, checkpoint, backbone=DEFAULT_BACKBONE, device='cpu'):
+    """The detector for a checkpoint on a device, built on first use and shared for the rest of the process.
+
+    Changes made to the returned model are seen by every caller; use
+    build_model for a private copy.
+    """
+    key = (num_classes, checkpoint, backbone, str(device))
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            model = build_model(num_classes, checkpoint, backbone).to(device)
+            _models[key] = model
+    return model
@@ -1,15 +1,21 @@
 import json
+import time
+import numpy as np
 import torch
-import torchvision
-from torch.utils.data import DataLoader, Dataset
-from torchvision.models.detection import FasterRCNN_ResNet50_FPN_Weights
-from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
+from torch.utils.data import Dataset
 from torchvision.transforms import functional as F
 from torchmetrics.detection.mean_ap import MeanAveragePrecision
 from PIL import Image
 import os
 import boto3
 from io import BytesIO
+from backbones import DEFAULT_BACKBONE, build_model
+from checkpoints import RESUME, CheckpointManager
+from coco_index import CocoIndex
+from data_loading import create_data_loader
+from image_cache import ImageCache, list_images
+from training_options import (BF16_AUTOCAST, GRAD_ACCUMULATION_STEPS, TORCH_COMPILE, TRAINABLE_BACKBONE_LAYERS,
+                              autocast, compile_backbone, set_threads)
 
 # AWS S3 settings
 BUCKET_NAME = "rpi-upload-bucket"
@@ -17,13 +23,23 @@ TRAIN_PREFIX = "Dataset/train_new/stage1"
 VALID_PREFIX = "Dataset/valid_new/stage1"
 SUPPORTED_EXTS = (".jpg", ".jpeg", ".png")
 
-# Initialize S3 client
-s3 = boto3.client(
-    's3',
-    aws_access_key_id=os.getenv("aws_access_key_id"),
-    aws_secret_access_key=os.getenv("aws_secret_access_key"),
-    region_name='ap-southeast-1'
-)
+# Parsed annotation files, reused while the file's ETag in S3 is unchanged
+ANNOTATION_CACHE_DIR = os.getenv("ANNOTATION_CACHE_DIR", "faster_rcnn/cache/annotations")
+
+# Decoded images, downloaded once and memory-mapped every epoch (empty: read every image from S3)
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "faster_rcnn/cache/images")
+
+# Detector backbone: resnet50_fpn, mobilenet_v3_large_fpn or mobilenet_v3_large_320_fpn
+BACKBONE = os.getenv("BACKBONE", DEFAULT_BACKBONE)
+
+# S3 client factory; datasets create one client per process
+def create_s3_client():
+    return boto3.client(
+        's3',
+        aws_access_key_id=os.getenv("aws_access_key_id"),
+        aws_secret_access_key=os.getenv("aws_secret_access_key"),
+        region_name='ap-southeast-1'
+    )
 
 # Dataset class for loading images and annotations from S3
 class S3CocoDataset(Dataset):
@@ -33,7 +49,10 @@ class S3CocoDataset(Dataset):
         self.prefix = prefix
         self.transforms = transforms
         self.image_keys = []
-        self.annotations = {}
+        self.index = None
+        self.cache = None
+        self._client = None
+        self._client_pid = None
 
         # Load COCO-style annotations
         annotation_key = f"{prefix}/_annotations_coco.json"
@@ -42,12 +61,8 @@ class S3CocoDataset(Dataset):
 
         # List all image objects in the S3 prefix
         print(f"Listing images in S3 bucket: {bucket_name}, prefix: {prefix}")
-        response = s3.list_objects_v2(Bucket=self.bucket_name, Prefix=self.prefix)
-        if 'Contents' in response:
-            for obj in response['Contents']:
-                key = obj['Key']
-                if key.lower().endswith(SUPPORTED_EXTS):
-                    self.image_keys.append(key)
+        self.etags = dict(list_images(self.client(), self.bucket_name, self.prefix))
+        self.image_keys = list(self.etags)
         print(f"Found {len(self.image_keys)} images in {prefix}")
 
         # Filter out images with no valid boxes
@@ -57,30 +72,49 @@ class S3CocoDataset(Dataset):
         ]
         print(f"Filtered to {len(self.image_keys)} images with valid boxes in {prefix}")
 
+        # Fetch images new or changed since the last run; unchanged ETags are already on disk
+        if IMAGE_CACHE_DIR:
+            self.cache = ImageCache(IMAGE_CACHE_DIR)
+            fetched = self.cache.sync(self.client(), self.bucket_name, [(key, self.etags[key]) for key in self.image_keys])
+            print(f"Image cache: {fetched} downloaded, {len(self.image_keys) - fetched} up to date")
+
     def load_annotations_from_s3(self, key):
-        response = s3.get_object(Bucket=self.bucket_name, Key=key)
+        cache_path = os.path.join(ANNOTATION_CACHE_DIR, key.replace("/", "_") + ".npz")
+        if os.path.exists(cache_path):
+            etag = self.client().head_object(Bucket=self.bucket_name, Key=key)['ETag']
+            index = CocoIndex.load(cache_path)
+            if index.etag == etag:
+                self.index = index
+                print(f"Loaded annotation index for {len(index)} images from {cache_path}")
+                return
+
+        response = self.client().get_object(Bucket=self.bucket_name, Key=key)
         annotation_bytes = response['Body'].read()
         coco_data = json.loads(annotation_bytes)
 
-        # Parse COCO annotations
-        self.annotations = {img['file_name']: [] for img in coco_data['images']}
-        for ann in coco_data['annotations']:
-            image_id = ann['image_id']
-            image_file_name = next(img['file_name'] for img in coco_data['images'] if img['id'] == image_id)
-            self.annotations[image_file_name].append(ann)
-        print(f"Loaded annotations for {len(self.annotations)} images")
+        # Group annotations by image once, as NumPy boxes and labels
+        self.index = CocoIndex.from_coco(coco_data, single_class=True, etag=response['ETag'])
+        os.makedirs(ANNOTATION_CACHE_DIR, exist_ok=True)
+        self.index.save(cache_path)
+        print(f"Loaded annotations for {len(self.index)} images")
 
     def __len__(self):
         return len(self.image_keys)
 
     def __getitem__(self, idx):
-        # Load image from S3
+        # Load image from the local cache, or from S3 when caching is off
         image_key = self.image_keys[idx]
-        image = self.load_image_from_s3(image_key)
+        if self.cache is not None:
+            image, scale = self.cache.read(self.etags[image_key])
+            image = np.array(image)
+        else:
+            image, scale = self.load_image_from_s3(image_key), 1.0
 
-        # Load corresponding annotations
+        # Load corresponding annotations, scaled like the cached image
         file_name = os.path.basename(image_key)
         target = self.process_annotations(file_name)
+        if scale != 1.0:
+            target["boxes"] = target["boxes"] * scale
 
         # If no valid boxes, skip to next image (should not happen due to filtering)
         if target["boxes"].shape[0] == 0:
@@ -93,39 +127,28 @@ class S3CocoDataset(Dataset):
 
         return image, target
 
+    def client(self):
+        # boto3 clients are not fork-safe, so each DataLoader worker process creates its own
+        if self._client_pid != os.getpid():
+            self._client = create_s3_client()
+            self._client_pid = os.getpid()
+        return self._client
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_client'] = state['_client_pid'] = None
+        return state
+
     def load_image_from_s3(self, key):
-        print(f"Loading image from S3: {key}")
-        response = s3.get_object(Bucket=self.bucket_name, Key=key)
+        response = self.client().get_object(Bucket=self.bucket_name, Key=key)
         image_bytes = response['Body'].read()
         return Image.open(BytesIO(image_bytes)).convert("RGB")
 
     def process_annotations(self, file_name):
-        annotations = self.annotations.get(file_name, [])
-        boxes = []
-        labels = []
-
-        for ann in annotations:
-            bbox = ann['bbox']  # COCO format: [x, y, width, height]
-            x, y, w, h = bbox
-            if w > 0 and h > 0:  # Ensure valid bounding boxes
-                boxes.append([x, y, x + w, y + h])  # Convert to [x_min, y_min, x_max, y_max]
-                # Always label as microplastic (category_id = 1)
-                labels.append(1)
-
-        target = {
-            "boxes": torch.tensor(boxes, dtype=torch.float32),
-            "labels": torch.tensor(labels, dtype=torch.int64),
-        }
-        print(f"Processed annotations for {file_name}: {len(boxes)} boxes")
-        return target
+        return self.index.target(file_name)
 
     def _has_valid_boxes(self, file_name):
-        annotations = self.annotations.get(file_name, [])
-        for ann in annotations:
-            bbox = ann['bbox']
-            if bbox[2] > 0 and bbox[3] > 0:
-                return True
-        return False
+        return self.index.count(file_name) > 0
 
 # Define transformations
 class CocoTransform:
@@ -133,38 +156,50 @@ class CocoTransform:
         image = F.to_tensor(image)  # Convert PIL image to tensor
         return image, target
 
-# Load Faster R-CNN with ResNet-50 backbone
+# Load Faster R-CNN on the configured backbone, starting from COCO weights
 def get_model(num_classes):
-    print("Initializing Faster R-CNN model")
-    weights = FasterRCNN_ResNet50_FPN_Weights.DEFAULT
-    model = torchvision.models.detection.fasterrcnn_resnet50_fpn(weights=weights)
-    in_features = model.roi_heads.box_predictor.cls_score.in_features
-    model.roi_heads.box_predictor = FastRCNNPredictor(in_features, num_classes)
+    print(f"Initializing Faster R-CNN model ({BACKBONE}, {TRAINABLE_BACKBONE_LAYERS} trainable backbone layers)")
+    model = build_model(num_classes, BACKBONE, trainable_backbone_layers=TRAINABLE_BACKBONE_LAYERS)
+    if TORCH_COMPILE:
+        compile_backbone(model)
     return model
 
-def train_one_epoch(model, optimizer, data_loader, device, epoch):
+def train_one_epoch(model, optimizer, data_loader, device, epoch, start_batch=0, checkpoints=None):
     print(f"Starting training for epoch {epoch + 1}")
     model.train()
+    # Same shuffle order for the epoch on every run; a resumed epoch skips the batches already done
+    data_loader.sampler.set_epoch(epoch, start_batch * data_loader.batch_size)
+    num_batches = start_batch + len(data_loader)
     total_loss = 0
-    for batch_idx, (images, targets) in enumerate(data_loader):
+    samples = 0
+    start = time.perf_counter()
+    optimizer.zero_grad()
+    for batch_idx, (images, targets) in enumerate(data_loader, start=start_batch):
         # Move images and targets to the device
-        images = [img.to(device) for img in images]
-        targets = [{k: v.to(device) for k, v in t.items()} for t in targets]
+        images = [img.to(device, non_blocking=True) for img in images]
+        targets = [{k: v.to(device, non_blocking=True) for k, v in t.items()} for t in targets]
 
-        # Forward pass
-        loss_dict = model(images, targets)
+        # Forward pass, in bfloat16 where autocast allows it under BF16_AUTOCAST
+        with autocast(device, BF16_AUTOCAST):
+            loss_dict = model(images, targets)
         losses = sum(loss for loss in loss_dict.values())
         total_loss += losses.item()
+        samples += len(images)
 
-        # Backpropagation
-        optimizer.zero_grad()
-        losses.backward()
-        optimizer.step()
+        # Backpropagation, stepping once every GRAD_ACCUMULATION_STEPS batches
+        (losses / GRAD_ACCUMULATION_STEPS).backward()
+        if (batch_idx + 1) % GRAD_ACCUMULATION_STEPS == 0 or batch_idx + 1 == num_batches:
+            optimizer.step()
+            optimizer.zero_grad()
+            # Only saved between optimizer steps, so no partly accumulated gradients are lost
+            if checkpoints is not None:
+                checkpoints.save_periodically(epoch, batch_idx + 1)
 
         if (batch_idx + 1) % 10 == 0:
-            print(f"Batch [{batch_idx + 1}/{len(data_loader)}] Loss: {losses.item():.4f}")
+            print(f"Batch [{batch_idx + 1}/{num_batches}] Loss: {losses.item():.4f}")
 
-    print(f"Epoch [{epoch + 1}] Average Loss: {total_loss / len(data_loader):.4f}")
+    print(f"Epoch [{epoch + 1}] Average Loss: {total_loss / max(1, len(data_loader)):.4f}")
+    print(f"Epoch [{epoch + 1}] Throughput: {samples / (time.perf_counter() - start):.2f} images/sec")
 
 @torch.no_grad()
 def evaluate_model_with_map(model, data_loader, device):
@@ -173,7 +208,7 @@ def evaluate_model_with_map(model, data_loader, device):
     metric = MeanAveragePrecision()
 
     for images, targets in data_loader:
-        images = [img.to(device) for img in images]
+        images = [img.to(device, non_blocking=True) for img in images]
         outputs = model(images)
 
         preds = []
@@ -199,8 +234,11 @@ def evaluate_model_with_map(model, data_loader, device):
     print("Evaluation Results (mAP):")
     for k, v in results.items():
         print(f"{k}: {v:.4f}")
+    return results
 
 def main():
+    set_threads()
+
     print("Loading datasets from S3")
     train_dataset = S3CocoDataset(
         bucket_name=BUCKET_NAME,
@@ -215,8 +253,8 @@ def main():
     )
 
     print("Creating data loaders")
-    train_loader = DataLoader(train_dataset, batch_size=4, shuffle=True, collate_fn=lambda x: tuple(zip(*x)))
-    val_loader = DataLoader(val_dataset, batch_size=4, shuffle=False, collate_fn=lambda x: tuple(zip(*x)))
+    train_loader = create_data_loader(train_dataset, batch_size=4, shuffle=True)
+    val_loader = create_data_loader(val_dataset, batch_size=4, shuffle=False)
 
     print("Initializing model")
     num_classes = 2  # Background + Microplastics
@@ -231,20 +269,26 @@ def main():
     optimizer = torch.optim.SGD(params, lr=0.005, momentum=0.9, weight_decay=0.0005)
     lr_scheduler = torch.optim.lr_scheduler.StepLR(optimizer, step_size=3, gamma=0.1)
 
-    # Training loop
     num_epochs = 3  # Adjust as needed
-    for epoch in range(num_epochs):
+
+    # Full training state is saved as training goes, so an interrupted run carries on where it stopped
+    checkpoints = CheckpointManager(1, BACKBONE, model, optimizer, lr_scheduler)
+    start_epoch, start_batch = checkpoints.resume(num_epochs) if RESUME else (0, 0)
+
+    # Training loop
+    for epoch in range(start_epoch, num_epochs):
+        if checkpoints.should_stop():
+            print(f"Early stopping: no mAP improvement for {checkpoints.patience} epochs, "
+                  f"best epoch {checkpoints.best_epoch}")
+            break
         print(f"Processing Epoch {epoch + 1}...")
-        train_one_epoch(model, optimizer, train_loader, device, epoch)
+        train_one_epoch(model, optimizer, train_loader, device, epoch, start_batch, checkpoints)
+        start_batch = 0
         lr_scheduler.step()
 
-        # Save the model's state dictionary after every epoch
-        os.makedirs("faster_rcnn/models", exist_ok=True)
-        model_path = f"faster_rcnn/models/fasterrcnn_resnet50_epoch_{epoch + 1}.pth"
-        torch.save(model.state_dict(), model_path)
-        print(f"Model saved: {model_path}")
-
-        evaluate_model_with_map(model, val_loader, device)
+        # Keep the epoch's weights if its validation mAP ranks among the best
+        results = evaluate_model_with_map(model, val_loader, device)
+        checkpoints.end_epoch(epoch, float(results["map"]))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
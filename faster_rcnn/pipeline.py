@@ -0,0 +1,78 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def prefetch(keys, load, workers=4, depth=8):
+    """Yield (key, load(key)) in order, loading up to `depth` keys ahead on a thread pool.
+
+    At most `depth` loads are in flight or waiting to be consumed, so a
+    slow consumer (the model) holds back the downloads instead of letting
+    decoded images pile up in memory.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch') as executor:
+        pending = deque()
+        keys = iter(keys)
+        for key in keys:
+            pending.append((key, executor.submit(load, key)))
+            if len(pending) >= depth:
+                break
+        while pending:
+            key, future = pending.popleft()
+            result = future.result()
+            next_key = next(keys, None)
+            if next_key is not None:
+                pending.append((next_key, executor.submit(load, next_key)))
+            yield key, result
+
+
+class Uploader:
+    """Uploads file objects to S3 on a thread pool, with at most max_pending uploads queued.
+
+    submit() blocks once max_pending uploads are outstanding, which keeps
+    the model stage from running arbitrarily far ahead of the network.
+    Use as a context manager: leaving it waits for every upload and
+    re-raises the first failure, unless the block itself raised (upload
+    failures are then only printed).
+    """
+
+    def __init__(self, s3, bucket_name, workers=4, max_pending=32):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def submit(self, fileobj, key):
+        self._slots.acquire()
+        future = self._executor.submit(self._upload, fileobj, key)
+        with self._lock:
+            self._futures.append(future)
+
+    def _upload(self, fileobj, key):
+        try:
+            self.s3.upload_fileobj(fileobj, self.bucket_name, key)
+        finally:
+            self._slots.release()
+
+    def _drain(self):
+        """Wait for every queued upload and return the exceptions of those that failed."""
+        self._executor.shutdown(wait=True)
+        return [f.exception() for f in self._futures if f.exception() is not None]
+
+    def close(self):
+        errors = self._drain()
+        if errors:
+            raise errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        # The block is already raising: report upload failures without replacing its exception
+        for error in self._drain():
+            print(f"Upload failed: {error}")
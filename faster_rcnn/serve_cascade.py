@@ -0,0 +1,102 @@
+"""SageMaker serving handler for the cascade endpoint used by rpi/capture.py (CASCADE_ENDPOINT).
+
+Deploy with this directory as the source_dir and serve_cascade.py as the
+entry point; model.tar.gz holds the stage-1 and stage-2 checkpoints under
+their training names (e.g. fasterrcnn_resnet50_best.pth and
+fasterrcnn_resnet50_best_stage2.pth). A request is the capture payload
+{"image_url": ..., "sample_id": ...}; the response is the Cascade result
+(box_count, percent_PE/PP/PS, boxes) plus annotated_image_url, the
+annotated image uploaded next to the detect_cascade.py outputs.
+"""
+import json
+import os
+from io import BytesIO
+from urllib.parse import urlparse
+
+import boto3
+import torch
+from PIL import Image
+
+from annotate import encode
+from backbones import DEFAULT_BACKBONE, default_checkpoint
+from cascade import Cascade, draw_result
+from model_factory import load_model
+
+OUTPUT_PREFIX = "Dataset/output/cascade"
+REGION = "ap-southeast-1"
+
+# Models, from the model directory unless given as paths
+BACKBONE = os.getenv("BACKBONE", DEFAULT_BACKBONE)
+STAGE1_CHECKPOINT = os.getenv("STAGE1_CHECKPOINT")
+STAGE2_CHECKPOINT = os.getenv("STAGE2_CHECKPOINT")
+SHARED_BACKBONE = os.getenv("SHARED_BACKBONE", "0") == "1"
+
+# Inference settings
+DETECT_THRESHOLD = float(os.getenv("DETECT_THRESHOLD", 0.5))
+CLASSIFY_THRESHOLD = float(os.getenv("CLASSIFY_THRESHOLD", 0.5))
+
+# Annotated image encoding
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "png")
+OUTPUT_QUALITY = int(os.getenv("OUTPUT_QUALITY", 90))
+
+# Initialize S3 client (the endpoint's execution role provides credentials)
+s3 = boto3.client('s3', region_name=REGION, endpoint_url=os.getenv("S3_ENDPOINT_URL"))
+
+
+def parse_s3_url(url):
+    """(bucket, key) of a https://{bucket}.s3.{region}.amazonaws.com/{key} URL, as capture.py builds them."""
+    parsed = urlparse(url)
+    if parsed.scheme == "s3":
+        return parsed.netloc, parsed.path.lstrip("/")
+    bucket = parsed.netloc.split(".s3.", 1)[0]
+    if bucket == parsed.netloc:
+        raise ValueError(f"Not an S3 object URL: {url}")
+    return bucket, parsed.path.lstrip("/")
+
+
+def object_url(bucket, key):
+    return f"https://{bucket}.s3.{REGION}.amazonaws.com/{key}"
+
+
+def model_fn(model_dir):
+    device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
+    stage1 = STAGE1_CHECKPOINT or default_checkpoint(1, BACKBONE, model_dir)
+    stage2 = STAGE2_CHECKPOINT or default_checkpoint(2, BACKBONE, model_dir)
+    return Cascade(
+        load_model(2, stage1, BACKBONE, device),
+        load_model(4, stage2, BACKBONE, device),
+        device,
+        batch_size=1,
+        detect_threshold=DETECT_THRESHOLD,
+        classify_threshold=CLASSIFY_THRESHOLD,
+        shared_backbone=SHARED_BACKBONE,
+    )
+
+
+def input_fn(request_body, request_content_type):
+    if request_content_type != 'application/json':
+        raise ValueError(f"Unsupported content type: {request_content_type}")
+    payload = json.loads(request_body)
+    bucket, key = parse_s3_url(payload["image_url"])
+    response = s3.get_object(Bucket=bucket, Key=key)
+    image = Image.open(BytesIO(response['Body'].read())).convert("RGB")
+    return payload, bucket, key, image
+
+
+def predict_fn(input_data, model):
+    payload, bucket, key, image = input_data
+    result = model(image)
+
+    base_name = os.path.splitext(os.path.basename(key))[0]
+    buffer, extension = encode(draw_result(image, result), OUTPUT_FORMAT, OUTPUT_QUALITY)
+    s3_output_key = f"{OUTPUT_PREFIX}/annotated/{base_name}.{extension}"
+    s3.upload_fileobj(buffer, bucket, s3_output_key)
+    print(f"Sample {payload.get('sample_id')}: {result['box_count']} boxes, annotated image at {s3_output_key}")
+
+    result["annotated_image_url"] = object_url(bucket, s3_output_key)
+    result["sample_id"] = payload.get("sample_id")
+    return result
+
+
+def output_fn(prediction, accept='application/json'):
+    return json.dumps(prediction)
@@ -0,0 +1,39 @@
+"""Throughput settings shared by the training scripts, mainly for CPU-only training boxes.
+
+Measure them on synthetic data with benchmark_training.py before a long run.
+"""
+import os
+
+import torch
+
+TRAIN_THREADS = int(os.getenv("TRAIN_THREADS", 0)) or None  # Intra-op CPU threads (default: PyTorch's choice)
+TRAIN_INTEROP_THREADS = int(os.getenv("TRAIN_INTEROP_THREADS", 0)) or None  # Inter-op CPU threads
+BF16_AUTOCAST = os.getenv("BF16_AUTOCAST", "0") == "1"  # bfloat16 forward pass; fastest on CPUs with AVX-512 BF16/AMX
+# Backbone stages fine-tuned, counted from the top (ResNet-50: 0-5, MobileNetV3: 0-6); fewer is faster
+TRAINABLE_BACKBONE_LAYERS = int(os.getenv("TRAINABLE_BACKBONE_LAYERS", 3))
+GRAD_ACCUMULATION_STEPS = int(os.getenv("GRAD_ACCUMULATION_STEPS", 1))  # Batches per optimizer step
+TORCH_COMPILE = os.getenv("TORCH_COMPILE", "0") == "1"  # Compile the backbone; the first batches pay for it
+
+
+def set_threads(num_threads=TRAIN_THREADS, interop_threads=TRAIN_INTEROP_THREADS):
+    """Apply thread counts; must run before the first parallel op, as inter-op threads cannot change later."""
+    if interop_threads:
+        torch.set_num_interop_threads(interop_threads)
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+
+def autocast(device, enabled=BF16_AUTOCAST):
+    """bfloat16 autocast for the forward pass (a no-op context when disabled)."""
+    return torch.autocast(device.type, dtype=torch.bfloat16, enabled=enabled)
+
+
+def compile_backbone(model):
+    """Compile the backbone + FPN in place; the detection heads are left eager.
+
+    The RPN and ROI heads are data-dependent Python (proposal counts,
+    NMS) and break the graph on every batch. Compiling in place keeps
+    state_dict keys unchanged, so checkpoints stay loadable without it.
+    """
+    model.backbone.compile(dynamic=True)
+    return model
@@ -0,0 +1,49 @@
+import hashlib
+from functools import wraps
+
+from flask import make_response, request
+
+
+def conditional(get_snapshot, max_age=30):
+    """Decorate a view with ETag/Last-Modified validation against the dataset version.
+
+    The ETag combines the snapshot version with the request's path, query
+    string and body, so every distinct request has its own validator. A
+    request whose If-None-Match matches (or, without one, whose
+    If-Modified-Since is not older than the data) gets an empty 304 without
+    the view running; otherwise the view's response is tagged and marked cacheable
+    for max_age seconds (clients revalidate after that). Both carry the same
+    ETag, Cache-Control and Vary headers.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            snapshot = get_snapshot()
+            request_key = hashlib.sha1(
+                request.full_path.encode('utf-8') + b'\0' + request.get_data()
+            ).hexdigest()[:16]
+            etag = f"{snapshot.version}-{request_key}"
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                # Second precision, as sent in Last-Modified
+                modified_at = snapshot.modified_at.replace(microsecond=0)
+                not_modified = bool(request.if_modified_since) and request.if_modified_since >= modified_at
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            response.last_modified = snapshot.modified_at
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+            response.cache_control.must_revalidate = True
+            # Set on 304s too: the 200 may have been compressed by compress_response
+            response.vary.add('Accept-Encoding')
+            return response
+        return wrapper
+    return decorator
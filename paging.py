@@ -0,0 +1,96 @@
+import numpy as np
+
+# Sortable fields of /detailed_data and the sample cache column behind each
+SORT_COLUMNS = {
+    'datetime': 'datetime',
+    'density': 'density',
+    'latitude': 'lat',
+    'longitude': 'lon',
+}
+
+
+def encode_cursor(value, sample_id):
+    """URL-safe cursor for the row with this sort value and sampleID."""
+    return f"{value!r}_{sample_id}"
+
+
+def decode_cursor(cursor):
+    """(sort value, sampleID) of a cursor; raises ValueError for a malformed one."""
+    value, sample_id = cursor.rsplit('_', 1)
+    return float(value), int(sample_id)
+
+
+class KeysetPager:
+    """Keyset pagination over the samples of one date range, ordered by (sort field, sampleID).
+
+    Sorted by datetime, the range is already in order: the sample cache
+    keeps its rows sorted by (datetime, sampleID). Other fields are
+    ordered once per request. A page is then located with two binary
+    searches from a cursor (the sort value and sampleID of the row just
+    before or after it) and costs only per_page rows to render. Numeric
+    page jumps are plain offsets into the same order.
+    """
+
+    def __init__(self, snapshot, in_range, sort_by='datetime', sort_order='desc', per_page=15):
+        self.per_page = per_page
+        self.descending = sort_order == 'desc'
+        column = snapshot[SORT_COLUMNS.get(sort_by, 'datetime')][in_range]
+        if np.issubdtype(column.dtype, np.datetime64):
+            column = column.astype(np.int64)
+        self.sample_ids = snapshot['sample_id'][in_range]
+        self.keys = column.astype(np.float64)
+
+        # Ascending (key, sampleID) order; descending pages read it back to front
+        if SORT_COLUMNS.get(sort_by, 'datetime') == 'datetime':
+            self.ascending = np.arange(len(self.keys))
+        else:
+            self.ascending = np.lexsort((self.sample_ids, self.keys))
+        self.asc_keys = self.keys[self.ascending]
+        self.asc_ids = self.sample_ids[self.ascending]
+
+    def __len__(self):
+        return len(self.ascending)
+
+    @property
+    def total_pages(self):
+        return (len(self) + self.per_page - 1) // self.per_page
+
+    def _position(self, cursor, inclusive):
+        """Rows ordered before the cursor row (also counting the row itself if inclusive)."""
+        value, sample_id = decode_cursor(cursor)
+        lo = np.searchsorted(self.asc_keys, value, side='left')
+        hi = np.searchsorted(self.asc_keys, value, side='right')
+        ties = self.asc_ids[lo:hi]
+        if self.descending:
+            side = 'left' if inclusive else 'right'
+            return len(self) - int(lo + np.searchsorted(ties, sample_id, side=side))
+        side = 'right' if inclusive else 'left'
+        return int(lo + np.searchsorted(ties, sample_id, side=side))
+
+    def _ordered(self, start, stop):
+        """Slice [start, stop) of the requested order, as indices into the range."""
+        if self.descending:
+            n = len(self)
+            return self.ascending[n - stop:n - start][::-1]
+        return self.ascending[start:stop]
+
+    def page(self, page=1, after=None, before=None):
+        """(row indices into the range, page number, prev cursor, next cursor)."""
+        if after:
+            start = self._position(after, inclusive=True)
+        elif before:
+            start = max(0, self._position(before, inclusive=False) - self.per_page)
+        else:
+            page = max(1, min(page, self.total_pages))
+            start = (page - 1) * self.per_page
+        stop = min(start + self.per_page, len(self))
+        rows = self._ordered(start, stop)
+
+        page = start // self.per_page + 1
+        prev_cursor = next_cursor = None
+        if len(rows):
+            if start > 0:
+                prev_cursor = encode_cursor(self.keys[rows[0]].item(), self.sample_ids[rows[0]].item())
+            if stop < len(self):
+                next_cursor = encode_cursor(self.keys[rows[-1]].item(), self.sample_ids[rows[-1]].item())
+        return rows, page, prev_cursor, next_cursor
@@ -0,0 +1,122 @@
+"""Compact response encodings and compression for the data endpoints.
+
+Columnar JSON sends one array per field instead of one object per row:
+
+    {"count": 2, "columns": {"lat": [14.1, 14.2], "date": ["2025-05-01 ...", ...]}}
+
+The binary form (application/octet-stream, little-endian) is:
+
+    bytes 0-3   magic b"MPC1"
+    bytes 4-7   uint32 length of the JSON header
+    header      UTF-8 JSON, space-padded to a multiple of 8 bytes
+    body        the column buffers, each starting at header["columns"][i]["offset"]
+
+Each column entry has name, dtype (float32, uint32 or int32), offset and
+length. Datetimes are uint32 seconds since 1970-01-01 (naive local time,
+as stored). String columns are dictionary encoded: the column holds
+uint32 indices into its "dictionary" list, so repeated URLs are sent once.
+In the browser each buffer maps straight onto a Float32Array/Uint32Array.
+"""
+import gzip
+import json
+import struct
+
+import numpy as np
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # optional: fall back to gzip only
+    brotli = None
+
+BINARY_MAGIC = b"MPC1"
+BINARY_MIMETYPE = "application/octet-stream"
+
+COMPRESSIBLE_MIMETYPES = ("application/json", BINARY_MIMETYPE, "text/html", "text/css", "text/javascript")
+MIN_COMPRESS_SIZE = 1024
+
+
+def _json_column(column):
+    if np.issubdtype(column.dtype, np.datetime64):
+        return [s.replace('T', ' ') for s in np.datetime_as_string(column, unit='s').tolist()]
+    return column.tolist()
+
+
+def columnar_json(columns):
+    """Response body for format=columnar: {"count": n, "columns": {name: [...]}}."""
+    count = len(next(iter(columns.values()))) if columns else 0
+    return {"count": count, "columns": {name: _json_column(col) for name, col in columns.items()}}
+
+
+def _binary_column(column):
+    """(little-endian buffer, dtype name, dictionary or None) for one column."""
+    if np.issubdtype(column.dtype, np.datetime64):
+        seconds = column.astype('datetime64[s]').astype(np.int64)
+        return seconds.astype('<u4'), 'uint32', None
+    if column.dtype == object or column.dtype.kind in 'US':
+        # Missing values (None) are sent as '', as the other formats leave them empty
+        strings = np.array(['' if value is None else value for value in column.tolist()], dtype=str)
+        dictionary, codes = np.unique(strings, return_inverse=True)
+        return codes.astype('<u4'), 'uint32', dictionary.tolist()
+    if np.issubdtype(column.dtype, np.integer):
+        return column.astype('<i4'), 'int32', None
+    return column.astype('<f4'), 'float32', None
+
+
+def pack_columns(columns):
+    """Encode named NumPy columns in the binary layout described above."""
+    buffers, entries, offset = [], [], 0
+    for name, column in columns.items():
+        buffer, dtype, dictionary = _binary_column(np.asarray(column))
+        entry = {"name": name, "dtype": dtype, "offset": offset, "length": len(buffer)}
+        if dictionary is not None:
+            entry["dictionary"] = dictionary
+        entries.append(entry)
+        buffers.append(buffer.tobytes())
+        offset += buffer.nbytes
+
+    count = len(next(iter(columns.values()))) if columns else 0
+    header = json.dumps({"count": count, "columns": entries}, separators=(',', ':')).encode('utf-8')
+    # Pad so the body starts 8-byte aligned; every column is 4-byte wide, so all offsets stay aligned
+    header += b' ' * (-(len(BINARY_MAGIC) + 4 + len(header)) % 8)
+    return BINARY_MAGIC + struct.pack('<I', len(header)) + header + b''.join(buffers)
+
+
+def encode_columns(columns, fmt):
+    """(body bytes, mimetype) of columns in the columnar ('columnar') or binary ('binary') format."""
+    if fmt == 'binary':
+        return pack_columns(columns), BINARY_MIMETYPE
+    return json.dumps(columnar_json(columns), separators=(',', ':')).encode('utf-8'), 'application/json'
+
+
+def columns_response(columns, fmt):
+    """Flask response for a columnar ('columnar') or binary ('binary') request."""
+    body, mimetype = encode_columns(columns, fmt)
+    return Response(body, mimetype=mimetype)
+
+
+def compress_response(response, accept_encoding, min_size=MIN_COMPRESS_SIZE):
+    """Brotli- or gzip-encode a response body when the client accepts it and it is worth it."""
+    if (response.direct_passthrough
+            or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+
+    accepted = {token.split(';')[0].strip().lower() for token in accept_encoding.split(',')}
+    if brotli is not None and 'br' in accepted:
+        response.set_data(brotli.compress(body, quality=5))
+        response.headers['Content-Encoding'] = 'br'
+    elif 'gzip' in accepted:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+
+    response.headers['Content-Length'] = len(response.get_data())
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+try:
+    import redis
+except ImportError:  # optional: only needed for the redis backend
+    redis = None
+
+
+class MemoryBackend:
+    """Bounded in-process LRU with a per-entry TTL."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=256, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Redis (or any protocol-compatible server) with a per-entry TTL.
+
+    Eviction is left to the server; run it with maxmemory-policy allkeys-lru
+    to get LRU behaviour. The number of entries is not reported: counting
+    the prefix would SCAN the whole keyspace, and expiry and eviction
+    would make a client-kept counter drift.
+    """
+
+    name = 'redis'
+
+    def __init__(self, url='redis://localhost:6379/0', ttl=300, prefix='microplastics:'):
+        if redis is None:
+            raise RuntimeError("The redis result cache backend needs the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+
+
+class ResultCache:
+    """Cache of serialized query results, keyed on the dataset version and normalized parameters.
+
+    Keys embed the current dataset version, so a new sample (which bumps
+    the version) makes every older entry unreachable; they then age out via
+    TTL/LRU instead of being deleted one by one.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def get_or_compute(self, name, version, params, compute):
+        """Cached bytes for (name, params) at a dataset version, calling compute() -> bytes on a miss."""
+        key = f"{name}:{version}:{json.dumps(params, sort_keys=True, separators=(',', ':'))}"
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits[name] += 1
+            return value
+
+        self.misses[name] += 1
+        value = compute()
+        self.backend.set(key, value)
+        return value
+
+    def stats(self):
+        names = sorted(set(self.hits) | set(self.misses))
+        total_hits = sum(self.hits.values())
+        total_lookups = total_hits + sum(self.misses.values())
+        stats = {
+            'backend': self.backend.name,
+            'hits': total_hits,
+            'misses': total_lookups - total_hits,
+            'hit_rate': total_hits / total_lookups if total_lookups else 0,
+            'by_endpoint': {name: {'hits': self.hits[name], 'misses': self.misses[name]} for name in names},
+        }
+        # Only the memory backend can count its entries cheaply
+        if isinstance(self.backend, MemoryBackend):
+            stats['entries'] = len(self.backend)
+        return stats
+
+
+def create_result_cache(backend='memory', redis_url=None, ttl=300, max_entries=256):
+    if backend == 'redis':
+        return ResultCache(RedisBackend(redis_url or 'redis://localhost:6379/0', ttl=ttl))
+    return ResultCache(MemoryBackend(max_entries=max_entries, ttl=ttl))
@@ -0,0 +1,168 @@
+"""Daily/weekly density rollups for the dashboard chart.
+
+Rows are maintained at ingest by rpi/rollup.py. This module reads them for
+the web app and can (re)build them from the full sample history:
+
+    python rollups.py create     # create the MicroplasticRollups table
+    python rollups.py rebuild    # recompute every rollup row from MicroplasticData
+
+Set DYNAMODB_ENDPOINT_URL to run against DynamoDB Local.
+"""
+import argparse
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import boto3
+
+from data_access import scan_items
+
+ROLLUP_TABLE_NAME = 'MicroplasticRollups'
+POLYMERS = ('PE', 'PP', 'PS')
+
+# Write counter bumped by rpi/capture.py on every new sample, and by a rebuild
+DATA_VERSION_KEY = {"period": "meta", "periodStart": "dataVersion"}
+
+
+def read_rollups(rollup_table, mode='daily'):
+    """Rollup rows for one period type ('daily' or 'weekly'), oldest first."""
+    client = rollup_table.meta.client
+    kwargs = {
+        'TableName': rollup_table.name,
+        'KeyConditionExpression': "#period = :period",
+        'ExpressionAttributeNames': {"#period": "period"},
+        'ExpressionAttributeValues': {":period": mode}
+    }
+    rows = []
+    while True:
+        response = client.query(**kwargs)
+        rows.extend(response.get('Items', []))
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        kwargs['ExclusiveStartKey'] = last_key
+    return rows
+
+
+def read_data_version(rollup_table):
+    """Current ingest write counter (0 before the first bump)."""
+    item = rollup_table.get_item(Key=DATA_VERSION_KEY).get('Item') or {}
+    return int(item.get('writeCount', 0))
+
+
+def bump_data_version(rollup_table):
+    """Count one more write, so version-keyed caches (ETags, cached results) are invalidated."""
+    rollup_table.update_item(
+        Key=DATA_VERSION_KEY,
+        UpdateExpression="ADD writeCount :one",
+        ExpressionAttributeValues={":one": 1}
+    )
+
+
+def rollup_summary(row):
+    """Chart-ready summary of one rollup row."""
+    count = int(row['sampleCount'])
+    summary = {
+        'date': row['periodStart'],
+        'average_density': float(row['densitySum']) / count if count else 0,
+        'sample_count': count,
+        'min_density': float(row.get('densityMin', 0)),
+        'max_density': float(row.get('densityMax', 0)),
+    }
+    for polymer in POLYMERS:
+        summary[f'average_percent_{polymer}'] = float(row.get(f'percent{polymer}Sum', 0)) / count if count else 0
+    return summary
+
+
+def get_tables():
+    dynamodb = boto3.resource(
+        'dynamodb',
+        region_name='ap-southeast-1',
+        aws_access_key_id=os.getenv('aws_access_key_id'),
+        aws_secret_access_key=os.getenv('aws_secret_access_key'),
+        endpoint_url=os.getenv('DYNAMODB_ENDPOINT_URL')
+    )
+    return dynamodb, dynamodb.Table('MicroplasticData'), dynamodb.Table(ROLLUP_TABLE_NAME)
+
+
+def create_table(dynamodb):
+    table = dynamodb.create_table(
+        TableName=ROLLUP_TABLE_NAME,
+        KeySchema=[
+            {'AttributeName': 'period', 'KeyType': 'HASH'},
+            {'AttributeName': 'periodStart', 'KeyType': 'RANGE'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'period', 'AttributeType': 'S'},
+            {'AttributeName': 'periodStart', 'AttributeType': 'S'}
+        ],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    table.wait_until_exists()
+    print(f"Created {ROLLUP_TABLE_NAME}")
+
+
+def compute_rollups(items):
+    """Aggregate sample items into {(period, periodStart): row} the way rpi/rollup.py does at ingest."""
+    rows = defaultdict(lambda: {'sampleCount': 0, 'densitySum': Decimal(0),
+                                **{f'percent{p}Sum': Decimal(0) for p in POLYMERS}})
+    for item in items:
+        if item.get('density') is None or 'datetime' not in item:
+            continue
+        try:
+            day = datetime.strptime(item['datetime'][:10], "%Y-%m-%d")
+        except ValueError:
+            continue
+        density = Decimal(str(item['density']))
+        monday = day - timedelta(days=day.weekday())
+        for key in (("daily", day.strftime("%Y-%m-%d")), ("weekly", monday.strftime("%Y-%m-%d"))):
+            row = rows[key]
+            row['sampleCount'] += 1
+            row['densitySum'] += density
+            row['densityMin'] = min(row.get('densityMin', density), density)
+            row['densityMax'] = max(row.get('densityMax', density), density)
+            for polymer in POLYMERS:
+                row[f'percent{polymer}Sum'] += Decimal(str(item.get(f'percent_{polymer}') or 0))
+    return rows
+
+
+def rebuild(table, rollup_table, segments=4):
+    """Overwrite the rollup table with aggregates recomputed from every sample.
+
+    Pause ingest while this runs: a sample written mid-rebuild can be
+    counted twice or not at all.
+    """
+    rows = compute_rollups(scan_items(table, segments=segments))
+
+    stale = [
+        (row['period'], row['periodStart'])
+        for row in scan_items(rollup_table, ProjectionExpression="#period, periodStart",
+                              ExpressionAttributeNames={"#period": "period"})
+        if row['period'] != DATA_VERSION_KEY['period'] and (row['period'], row['periodStart']) not in rows
+    ]
+    with rollup_table.batch_writer() as batch:
+        for period, period_start in stale:
+            batch.delete_item(Key={'period': period, 'periodStart': period_start})
+        for (period, period_start), row in rows.items():
+            batch.put_item(Item={'period': period, 'periodStart': period_start, **row})
+    # Clients holding ETags for the old rollups must not keep getting 304s
+    bump_data_version(rollup_table)
+    print(f"Rebuilt {len(rows)} rollup rows, removed {len(stale)} stale rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['create', 'rebuild'])
+    parser.add_argument('--segments', type=int, default=4)
+    args = parser.parse_args()
+
+    dynamodb, table, rollup_table = get_tables()
+    if args.command == 'create':
+        create_table(dynamodb)
+    else:
+        rebuild(table, rollup_table, segments=args.segments)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import boto3
 import tempfile
 from decimal import Decimal
 from get_location import get_location
+from rollup import ROLLUP_TABLE_NAME, bump_data_version, update_rollups
 from flask import Flask
 import json
 
@@ -31,6 +32,11 @@ dynamodb = boto3.resource(
     aws_secret_access_key=os.getenv("aws_secret_access_key")
 )
 table = dynamodb.Table('MicroplasticData')
+rollup_table = dynamodb.Table(ROLLUP_TABLE_NAME)
+
+# Endpoint running detection and polymer classification in one call (served by faster_rcnn/serve_cascade.py).
+# When unset, the separate detect-microplastics and classify-microplastics endpoints are used.
+CASCADE_ENDPOINT = os.getenv("CASCADE_ENDPOINT")
 
 # Initialize SageMaker
 runtime = boto3.client(
@@ -40,6 +46,29 @@ runtime = boto3.client(
     aws_secret_access_key=os.getenv("aws_secret_access_key")
 )
 
+# On-device detection with a lightweight backbone (local_detector.py). The endpoints are used
+# when no local checkpoint is set, or once local inference is slower than the latency budget.
+LOCAL_STAGE1_CHECKPOINT = os.getenv("LOCAL_STAGE1_CHECKPOINT")
+LOCAL_STAGE2_CHECKPOINT = os.getenv("LOCAL_STAGE2_CHECKPOINT")  # Optional: classify polymers on the Pi too
+LOCAL_BACKBONE = os.getenv("LOCAL_BACKBONE", "mobilenet_v3_large_320_fpn")
+LOCAL_LATENCY_BUDGET = float(os.getenv("LOCAL_LATENCY_BUDGET", 10))  # Seconds per sample
+
+# Annotated images of samples detected on the Pi
+S3_LOCAL_ANNOTATED_PREFIX = "Dataset/output/local/annotated"
+
+local_detector = None
+if LOCAL_STAGE1_CHECKPOINT:
+    try:
+        from local_detector import LocalDetector, draw_boxes
+        local_detector = LocalDetector(
+            LOCAL_STAGE1_CHECKPOINT,
+            backbone=LOCAL_BACKBONE,
+            stage2_checkpoint=LOCAL_STAGE2_CHECKPOINT,
+            latency_budget=LOCAL_LATENCY_BUDGET,
+        )
+    except Exception as e:
+        print(f"Error loading local detector, using the inference endpoints: {e}")
+
 def capture_image_and_upload():
     # Initialize the camera
     picam2 = Picamera2()
@@ -67,6 +96,31 @@ def capture_image_and_upload():
             with open(tmpfile.name, "rb") as data:
                 s3.put_object(Bucket=BUCKET_NAME, Key=s3_key, Body=data, ContentType="image/jpeg")
         print("Image uploaded successfully!")
+
+        local_result = None
+        if local_detector and local_detector.within_budget:
+            try:
+                local_result = local_detector.detect(tmpfile.name)
+                boxes = local_result.pop("boxes")
+                print(f"Local detection result: {local_result}")
+                if not local_detector.within_budget:
+                    print("Local detection is over its latency budget; using the inference endpoints from now on")
+            except Exception as e:
+                # The image is already in S3: fall back to the endpoints rather than abort the capture
+                print(f"Error running local detection, using the inference endpoint: {e}")
+                local_result = None
+
+        if local_result is not None:
+            # Upload the annotated image the endpoints would otherwise produce
+            annotated_key = f"{S3_LOCAL_ANNOTATED_PREFIX}/{os.path.splitext(filename)[0]}_annotated.jpg"
+            try:
+                s3.upload_fileobj(draw_boxes(tmpfile.name, boxes), BUCKET_NAME, annotated_key,
+                                  ExtraArgs={"ContentType": "image/jpeg"})
+                local_result["annotated_image_url"] = (
+                    f"https://{BUCKET_NAME}.s3.ap-southeast-1.amazonaws.com/{annotated_key}")
+                print(f"Uploaded annotated image to S3: {annotated_key}")
+            except Exception as e:
+                print(f"Error uploading annotated image: {e}")
         os.remove(tmpfile.name)
 
         # Generate the S3 image URL
@@ -95,18 +149,21 @@ def capture_image_and_upload():
             "image_url": image_url,
             "sample_id": str(new_sample_id)
         }
-        print(f"Calling inference endpoint with: {payload}")
-        try:
-            response = runtime.invoke_endpoint(
-                EndpointName='detect-microplastics',
-                ContentType='application/json',
-                Body=json.dumps(payload)
-            )
-            inference_result_stage1 = json.loads(response['Body'].read())
-            print(f"Inference result: {inference_result_stage1}")
-        except Exception as e:
-            print(f"Error calling inference endpoint: {e}")
-            inference_result_stage1 = None
+        if local_result is not None:
+            inference_result_stage1 = local_result
+        else:
+            print(f"Calling inference endpoint with: {payload}")
+            try:
+                response = runtime.invoke_endpoint(
+                    EndpointName=CASCADE_ENDPOINT or 'detect-microplastics',
+                    ContentType='application/json',
+                    Body=json.dumps(payload)
+                )
+                inference_result_stage1 = json.loads(response['Body'].read())
+                print(f"Inference result: {inference_result_stage1}")
+            except Exception as e:
+                print(f"Error calling inference endpoint: {e}")
+                inference_result_stage1 = None
 
         # Get latitude and longitude from GPS
         location = get_location()
@@ -124,9 +181,11 @@ def capture_image_and_upload():
             "sampleID": new_sample_id,
             "imageURL": image_url,
             "datetime": timestamp,
+            "dateBucket": timestamp[:7],  # YYYY-MM partition key of the DateBucketIndex GSI
             "latitude": latitude,
             "longitude": longitude,
         }
+        box_count = None
         if inference_result_stage1:
             annotated_url = inference_result_stage1.get("annotated_image_url")
             box_count = inference_result_stage1.get("box_count")
@@ -140,7 +199,12 @@ def capture_image_and_upload():
                     item["density"] = None
 
         # Only classify if at least one box is detected
-        if box_count and box_count > 0:
+        if box_count and "percent_PE" in inference_result_stage1:
+            # The cascade endpoint or the local classifier already classified every detected particle
+            item["percent_PS"] = inference_result_stage1.get("percent_PS")
+            item["percent_PP"] = inference_result_stage1.get("percent_PP")
+            item["percent_PE"] = inference_result_stage1.get("percent_PE")
+        elif box_count and box_count > 0:
             print(f"Calling classify-microplastics endpoint with: {payload}")
             try:
                 classify_response = runtime.invoke_endpoint(
@@ -164,6 +228,20 @@ def capture_image_and_upload():
         table.put_item(Item=item)
         print(f"Image URL inserted into DynamoDB with sampleID {new_sample_id}!")
 
+        # Keep the daily/weekly rollups used by the dashboard chart in step
+        if item.get("density") is not None:
+            try:
+                update_rollups(rollup_table, timestamp, item["density"], item)
+                print("Updated daily and weekly rollups")
+            except Exception as e:
+                print(f"Error updating rollups: {e}")
+
+        # Tell the dashboard its cached results are out of date
+        try:
+            bump_data_version(rollup_table)
+        except Exception as e:
+            print(f"Error bumping data version: {e}")
+
     finally:
         picam2.stop()
         picam2.close()
@@ -0,0 +1,91 @@
+import time
+from io import BytesIO
+
+import torch
+import torchvision
+from PIL import Image, ImageDraw
+from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
+from torchvision.transforms import functional as F
+
+# Faster R-CNN builders by backbone name, as in faster_rcnn/backbones.py
+BUILDERS = {
+    'resnet50_fpn': torchvision.models.detection.fasterrcnn_resnet50_fpn,
+    'mobilenet_v3_large_fpn': torchvision.models.detection.fasterrcnn_mobilenet_v3_large_fpn,
+    'mobilenet_v3_large_320_fpn': torchvision.models.detection.fasterrcnn_mobilenet_v3_large_320_fpn,
+}
+
+# Stage-2 labels
+POLYMERS = {1: "PE", 2: "PP", 3: "PS"}
+
+
+def load_model(checkpoint, backbone, num_classes):
+    model = BUILDERS[backbone](weights=None, weights_backbone=None)
+    in_features = model.roi_heads.box_predictor.cls_score.in_features
+    model.roi_heads.box_predictor = FastRCNNPredictor(in_features, num_classes)
+    # Memory-mapped, so the Pi does not hold a second copy of the weights while loading
+    model.load_state_dict(torch.load(checkpoint, map_location='cpu', mmap=True, weights_only=True), assign=True)
+    return model.eval()
+
+
+class LocalDetector:
+    """Runs the trained detectors on the Pi's CPU instead of the SageMaker endpoints.
+
+    detect() returns the same fields as the endpoints: box_count and, when
+    a stage-2 checkpoint is given, percent_PE/PP/PS, plus the detected
+    boxes; the caller uploads draw_boxes() of the image in place of the
+    endpoints' annotated_image_url. Latency is measured at start-up on a
+    blank capture-sized frame and tracked as a moving average afterwards;
+    once it exceeds latency_budget seconds, within_budget turns False and
+    the caller should use the endpoints.
+    """
+
+    def __init__(self, stage1_checkpoint, backbone='mobilenet_v3_large_320_fpn', stage2_checkpoint=None,
+                 threshold=0.5, latency_budget=None, num_threads=None, frame_size=(1920, 1080)):
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.detector = load_model(stage1_checkpoint, backbone, 2)
+        self.classifier = load_model(stage2_checkpoint, backbone, 4) if stage2_checkpoint else None
+        self.threshold = threshold
+        self.latency_budget = latency_budget
+        self.latency = None
+        self._run(Image.new("RGB", frame_size))
+        print(f"Local detection takes {self.latency:.2f}s per sample ({backbone})")
+
+    @property
+    def within_budget(self):
+        return self.latency_budget is None or self.latency <= self.latency_budget
+
+    @torch.inference_mode()
+    def _run(self, image):
+        start = time.perf_counter()
+        tensor = F.to_tensor(image)
+        prediction = self.detector([tensor])[0]
+        boxes = prediction["boxes"][prediction["scores"] >= self.threshold]
+        result = {"box_count": len(boxes), "boxes": [[round(v, 1) for v in box] for box in boxes.tolist()]}
+
+        if self.classifier is not None:
+            prediction = self.classifier([tensor])[0]
+            labels = prediction["labels"][prediction["scores"] >= self.threshold].tolist()
+            for label, name in POLYMERS.items():
+                result[f"percent_{name}"] = round(100.0 * labels.count(label) / len(labels), 2) if labels else 0.0
+
+        elapsed = time.perf_counter() - start
+        self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+        result["latency"] = round(elapsed, 3)
+        return result
+
+    def detect(self, path):
+        """Endpoint-style result dict for the image file at path."""
+        return self._run(Image.open(path).convert("RGB"))
+
+
+def draw_boxes(path, boxes, quality=90):
+    """JPEG of the image at path with detected boxes outlined, in a BytesIO ready to upload."""
+    image = Image.open(path).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for box in boxes:
+        draw.rectangle(box, outline="red", width=3)
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    buffer.seek(0)
+    return buffer
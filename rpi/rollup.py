@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+# Rollup table layout (shared with rollups.py in the web app):
+#   period      (HASH)  "daily" or "weekly"
+#   periodStart (RANGE) "YYYY-MM-DD" of the day, or of the Monday of the week
+ROLLUP_TABLE_NAME = 'MicroplasticRollups'
+POLYMERS = ('PE', 'PP', 'PS')
+
+# Write counter the web app folds into its dataset version to invalidate caches
+DATA_VERSION_KEY = {"period": "meta", "periodStart": "dataVersion"}
+
+
+def period_starts(timestamp):
+    """(period, periodStart) keys a 'YYYY-MM-DD HH:MM:SS' timestamp rolls up into."""
+    day = datetime.strptime(timestamp[:10], "%Y-%m-%d")
+    monday = day - timedelta(days=day.weekday())
+    return [("daily", day.strftime("%Y-%m-%d")), ("weekly", monday.strftime("%Y-%m-%d"))]
+
+
+def _to_decimal(value):
+    return Decimal(str(value if value is not None else 0))
+
+
+def _set_if(rollup_table, key, attribute, value, comparison):
+    """SET attribute = value if it is missing or value compares better; losing the race is fine."""
+    try:
+        rollup_table.update_item(
+            Key=key,
+            UpdateExpression=f"SET {attribute} = :value",
+            ConditionExpression=f"attribute_not_exists({attribute}) OR {attribute} {comparison} :value",
+            ExpressionAttributeValues={":value": value}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+
+def update_rollups(rollup_table, timestamp, density, percents):
+    """Fold one sample into its daily and weekly rollup rows.
+
+    Sums and counts use DynamoDB ADD, so concurrent writers never lose
+    updates; min/max are conditional SETs that only move outwards.
+    """
+    density = _to_decimal(density)
+    values = {":one": 1, ":density": density}
+    add_terms = ["sampleCount :one", "densitySum :density"]
+    for polymer in POLYMERS:
+        values[f":pct{polymer}"] = _to_decimal(percents.get(f"percent_{polymer}"))
+        add_terms.append(f"percent{polymer}Sum :pct{polymer}")
+
+    for period, period_start in period_starts(timestamp):
+        key = {"period": period, "periodStart": period_start}
+        rollup_table.update_item(
+            Key=key,
+            UpdateExpression="ADD " + ", ".join(add_terms),
+            ExpressionAttributeValues=values
+        )
+        _set_if(rollup_table, key, "densityMin", density, ">")
+        _set_if(rollup_table, key, "densityMax", density, "<")
+
+
+def bump_data_version(rollup_table):
+    """Count one more write to the samples table."""
+    rollup_table.update_item(
+        Key=DATA_VERSION_KEY,
+        UpdateExpression="ADD writeCount :one",
+        ExpressionAttributeValues={":one": 1}
+    )
@@ -0,0 +1,274 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from data_access import scan_items, query_date_range
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Numeric columns kept as float64 arrays, keyed by the DynamoDB attribute they come from
+NUMERIC_COLUMNS = {
+    'lat': 'latitude',
+    'lon': 'longitude',
+    'density': 'density',
+    'percent_PE': 'percent_PE',
+    'percent_PP': 'percent_PP',
+    'percent_PS': 'percent_PS',
+}
+
+# Columns with cumulative sums, so range totals need only two binary searches
+PREFIX_COLUMNS = ('density', 'percent_PE', 'percent_PP', 'percent_PS')
+
+# Per-sample strings that are only needed when rendering individual samples
+OBJECT_COLUMNS = {
+    'image_url': 'imageURL',
+    'annotated_url': 'annotatedImageURL',
+}
+
+
+def _to_float(value, default=0.0):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return default
+
+
+def _empty_columns():
+    columns = {
+        'datetime': np.empty(0, dtype='datetime64[s]'),
+        'sample_id': np.empty(0, dtype=np.int64),
+    }
+    for name in NUMERIC_COLUMNS:
+        columns[name] = np.empty(0, dtype=np.float64)
+    for name in OBJECT_COLUMNS:
+        columns[name] = np.empty(0, dtype=object)
+    return columns
+
+
+def _items_to_columns(items):
+    """Convert DynamoDB items to column arrays, skipping rows without a usable datetime."""
+    rows = []
+    for item in items:
+        try:
+            dt = datetime.strptime(item['datetime'], DATETIME_FORMAT)
+            sample_id = int(item['sampleID'])
+        except (KeyError, ValueError, TypeError):
+            continue
+        rows.append((dt, sample_id, item))
+
+    columns = _empty_columns()
+    if not rows:
+        return columns
+    columns['datetime'] = np.array([dt for dt, _, _ in rows], dtype='datetime64[s]')
+    columns['sample_id'] = np.array([sid for _, sid, _ in rows], dtype=np.int64)
+    for name, attr in NUMERIC_COLUMNS.items():
+        columns[name] = np.array([_to_float(item.get(attr)) for _, _, item in rows], dtype=np.float64)
+    for name, attr in OBJECT_COLUMNS.items():
+        column = np.empty(len(rows), dtype=object)
+        column[:] = [item.get(attr, '') for _, _, item in rows]
+        columns[name] = column
+    return columns
+
+
+def parse_datetime(value):
+    """Request date ('YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD') -> datetime, ValueError if it is neither."""
+    for fmt in (DATETIME_FORMAT, '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except (ValueError, TypeError):
+            pass
+    raise ValueError(f"Invalid date {value!r}, expected YYYY-MM-DD HH:MM:SS")
+
+
+def prefix_sums(column, start=0.0):
+    """Cumulative sums of a column with a leading `start`, so sum(column[i:j]) == p[j] - p[i]."""
+    prefix = np.empty(len(column) + 1, dtype=np.float64)
+    prefix[0] = start
+    np.cumsum(column, out=prefix[1:])
+    prefix[1:] += start
+    return prefix
+
+
+def format_datetimes(dts):
+    """datetime64 array -> list of 'YYYY-MM-DD HH:MM:SS' strings as stored in DynamoDB."""
+    return [s.replace('T', ' ') for s in np.datetime_as_string(dts, unit='s').tolist()]
+
+
+def period_starts(dts, mode='daily'):
+    """Day (or Monday of the week, for mode='weekly') each datetime falls in."""
+    days = dts.astype('datetime64[D]')
+    if mode == 'weekly':
+        # 1970-01-01 was a Thursday, so (days + 3) % 7 is the weekday with Monday = 0
+        days = days - (days.astype(np.int64) + 3) % 7
+    return days
+
+
+class SampleSnapshot:
+    """Immutable column view of the samples table, sorted by (datetime, sampleID).
+
+    version identifies the data held (sample count, newest datetime,
+    highest sampleID and the ingest write counter, when one is read);
+    modified_at is the wall-clock time it last changed. prefix holds
+    prefix_sums of PREFIX_COLUMNS for full snapshots (None after take()).
+    """
+
+    def __init__(self, columns, refreshed_at, version='empty', modified_at=None, prefix=None):
+        self.columns = columns
+        self.refreshed_at = refreshed_at
+        self.version = version
+        self.modified_at = modified_at or datetime.now(timezone.utc)
+        self.prefix = prefix
+
+    def __len__(self):
+        return len(self.columns['datetime'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def range_slice(self, min_date, max_date):
+        """Index slice of samples with min_date <= datetime <= max_date (strings or datetimes)."""
+        dts = self.columns['datetime']
+        lo = np.searchsorted(dts, np.datetime64(min_date, 's'), side='left')
+        hi = np.searchsorted(dts, np.datetime64(max_date, 's'), side='right')
+        return slice(int(lo), int(max(lo, hi)))
+
+    def range_stats(self, min_date, max_date):
+        """(count, {column: sum}) over a date range in O(log n), from the prefix sums."""
+        in_range = self.range_slice(min_date, max_date)
+        count = in_range.stop - in_range.start
+        if self.prefix is None:
+            return count, {name: float(self.columns[name][in_range].sum()) for name in PREFIX_COLUMNS}
+        return count, {
+            name: float(prefix[in_range.stop] - prefix[in_range.start])
+            for name, prefix in self.prefix.items()
+        }
+
+    def take(self, index):
+        """New snapshot holding only the rows selected by a slice or index array."""
+        return SampleSnapshot({name: col[index] for name, col in self.columns.items()},
+                              self.refreshed_at, self.version, self.modified_at)
+
+
+class SampleCache:
+    """In-process, column-oriented copy of the samples table.
+
+    The first refresh loads everything; later refreshes only fetch items
+    whose datetime is at or after the newest one already held, through the
+    date index when index_name is given (falling back to a filtered scan if
+    the query fails). Readers get an immutable SampleSnapshot, so a
+    background refresh never blocks them. read_write_count, if given, is
+    called on every refresh and its value becomes part of the version.
+    """
+
+    def __init__(self, table, segments=1, max_staleness=60, index_name=None, read_write_count=None):
+        self.table = table
+        self.segments = segments
+        self.index_name = index_name
+        self.read_write_count = read_write_count
+        self._write_count = None
+        self.max_staleness = max_staleness
+        self._snapshot = SampleSnapshot(_empty_columns(), float('-inf'))
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _fetch(self, since):
+        if since is None:
+            return scan_items(self.table, segments=self.segments)
+        if self.index_name:
+            # Query up to tomorrow so a clock ahead of the server's is still covered
+            until = (datetime.now() + timedelta(days=1)).strftime(DATETIME_FORMAT)
+            try:
+                return list(query_date_range(self.table, since, until, index_name=self.index_name))
+            except Exception as e:
+                print(f"Date index query failed, falling back to scan: {e}")
+        return scan_items(
+            self.table,
+            segments=self.segments,
+            FilterExpression="#dt >= :since",
+            ExpressionAttributeNames={"#dt": "datetime"},
+            ExpressionAttributeValues={":since": since}
+        )
+
+    def refresh(self):
+        """Fetch samples newer than the last seen datetime and merge them in."""
+        with self._refresh_lock:
+            current = self._snapshot
+            since = None
+            if len(current):
+                since = current['datetime'][-1].astype(datetime).strftime(DATETIME_FORMAT)
+
+            # Keep the last known count if reading it fails, so the version does not flap
+            if self.read_write_count is not None:
+                try:
+                    self._write_count = self.read_write_count()
+                except Exception as e:
+                    print(f"Reading the write counter failed: {e}")
+            write_count = self._write_count
+
+            fetched = _items_to_columns(self._fetch(since))
+            # Items sharing the last seen datetime come back again; drop the ones we hold
+            is_new = ~np.isin(fetched['sample_id'], current['sample_id'])
+            new_rows = {name: col[is_new] for name, col in fetched.items()}
+            new_order = np.lexsort((new_rows['sample_id'], new_rows['datetime']))
+            new_rows = {name: col[new_order] for name, col in new_rows.items()}
+            appends = (current.prefix is not None and len(new_rows['datetime'])
+                       and (not len(current) or (new_rows['datetime'][0], new_rows['sample_id'][0])
+                            > (current['datetime'][-1], current['sample_id'][-1])))
+
+            if appends:
+                # The usual case: new samples are newer than everything held, so
+                # columns and prefix sums are extended instead of rebuilt
+                merged = {name: np.concatenate([current[name], new_rows[name]]) for name in current.columns}
+                prefix = {
+                    name: np.concatenate([current.prefix[name][:-1],
+                                          prefix_sums(new_rows[name], current.prefix[name][-1])])
+                    for name in PREFIX_COLUMNS
+                }
+            elif len(new_rows['datetime']) or current.prefix is None:
+                merged = {name: np.concatenate([current[name], new_rows[name]]) for name in current.columns}
+                order = np.lexsort((merged['sample_id'], merged['datetime']))
+                merged = {name: col[order] for name, col in merged.items()}
+                prefix = {name: prefix_sums(merged[name]) for name in PREFIX_COLUMNS}
+            else:
+                merged, prefix = current.columns, current.prefix
+
+            version = current.version
+            modified_at = current.modified_at
+            if len(merged['datetime']):
+                version = f"{len(merged['datetime'])}-{merged['datetime'][-1]}-{merged['sample_id'].max()}"
+                if write_count is not None:
+                    version += f"-w{write_count}"
+            if version != current.version:
+                modified_at = datetime.now(timezone.utc)
+
+            self._snapshot = SampleSnapshot(merged, time.monotonic(), version, modified_at, prefix)
+            return self._snapshot
+
+    def snapshot(self):
+        """Current snapshot, refreshed synchronously if older than max_staleness seconds."""
+        snapshot = self._snapshot
+        if time.monotonic() - snapshot.refreshed_at > self.max_staleness:
+            snapshot = self.refresh()
+        return snapshot
+
+    def start(self, interval=30):
+        """Refresh in a daemon thread every `interval` seconds."""
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Sample cache refresh failed: {e}")
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=run, name='sample-cache-refresh', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
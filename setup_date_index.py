@@ -0,0 +1,119 @@
+"""Create the DateBucketIndex GSI on MicroplasticData and backfill dateBucket on existing items.
+
+Usage:
+    python setup_date_index.py create      # add the index (no-op if it already exists)
+    python setup_date_index.py backfill    # set dateBucket on items written before the index
+    python setup_date_index.py all         # both, waiting for the index to become ACTIVE
+
+Set DYNAMODB_ENDPOINT_URL to run against DynamoDB Local.
+"""
+import argparse
+import os
+import time
+
+import boto3
+
+from data_access import DATE_BUCKET_ATTRIBUTE, DATE_INDEX_NAME, date_bucket, scan_items
+
+TABLE_NAME = 'MicroplasticData'
+
+
+def get_table(table_name=TABLE_NAME):
+    dynamodb = boto3.resource(
+        'dynamodb',
+        region_name='ap-southeast-1',
+        aws_access_key_id=os.getenv('aws_access_key_id'),
+        aws_secret_access_key=os.getenv('aws_secret_access_key'),
+        endpoint_url=os.getenv('DYNAMODB_ENDPOINT_URL')
+    )
+    return dynamodb.Table(table_name)
+
+
+def index_status(table):
+    table.reload()
+    for index in table.global_secondary_indexes or []:
+        if index['IndexName'] == DATE_INDEX_NAME:
+            return index['IndexStatus']
+    return None
+
+
+def create_index(table):
+    if index_status(table) is not None:
+        print(f"{DATE_INDEX_NAME} already exists on {table.name}")
+        return
+
+    index = {
+        'IndexName': DATE_INDEX_NAME,
+        'KeySchema': [
+            {'AttributeName': DATE_BUCKET_ATTRIBUTE, 'KeyType': 'HASH'},
+            {'AttributeName': 'datetime', 'KeyType': 'RANGE'}
+        ],
+        'Projection': {'ProjectionType': 'ALL'}
+    }
+    # Provisioned tables need throughput on the index as well
+    billing = (table.billing_mode_summary or {}).get('BillingMode', 'PROVISIONED')
+    if billing == 'PROVISIONED':
+        throughput = table.provisioned_throughput
+        index['ProvisionedThroughput'] = {
+            'ReadCapacityUnits': throughput['ReadCapacityUnits'],
+            'WriteCapacityUnits': throughput['WriteCapacityUnits']
+        }
+
+    table.update(
+        AttributeDefinitions=[
+            {'AttributeName': DATE_BUCKET_ATTRIBUTE, 'AttributeType': 'S'},
+            {'AttributeName': 'datetime', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexUpdates=[{'Create': index}]
+    )
+    print(f"Creating {DATE_INDEX_NAME} on {table.name}")
+
+
+def wait_for_index(table, poll_seconds=10):
+    while (status := index_status(table)) != 'ACTIVE':
+        print(f"{DATE_INDEX_NAME} status: {status}, waiting...")
+        time.sleep(poll_seconds)
+    print(f"{DATE_INDEX_NAME} is ACTIVE")
+
+
+def backfill(table, segments=4):
+    """Set dateBucket on every item that has a datetime but no bucket yet."""
+    items = scan_items(
+        table,
+        segments=segments,
+        ProjectionExpression="sampleID, #dt",
+        FilterExpression="attribute_exists(#dt) AND attribute_not_exists(#bucket)",
+        ExpressionAttributeNames={"#dt": "datetime", "#bucket": DATE_BUCKET_ATTRIBUTE}
+    )
+    updated = 0
+    for item in items:
+        table.update_item(
+            Key={'sampleID': item['sampleID']},
+            UpdateExpression="SET #bucket = :bucket",
+            ExpressionAttributeNames={"#bucket": DATE_BUCKET_ATTRIBUTE},
+            ExpressionAttributeValues={":bucket": date_bucket(item['datetime'])}
+        )
+        updated += 1
+        if updated % 1000 == 0:
+            print(f"Backfilled {updated} items")
+    print(f"Backfill complete: {updated} items updated")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['create', 'backfill', 'all'])
+    parser.add_argument('--table', default=TABLE_NAME)
+    parser.add_argument('--segments', type=int, default=4)
+    args = parser.parse_args()
+
+    table = get_table(args.table)
+    if args.command in ('create', 'all'):
+        create_index(table)
+    if args.command == 'all':
+        wait_for_index(table)
+    if args.command in ('backfill', 'all'):
+        backfill(table, segments=args.segments)
+
+
+if __name__ == "__main__":
+    main()
@@ -37,16 +37,17 @@ function setLoading(isLoading) {
     loader.style.display = isLoading ? 'flex' : 'none';
 }
 
-// Fetch data from server
+// Fetch data from server as parallel arrays ({ date: [...], average_density: [...], ... })
 async function fetchData(timeframe) {
     setLoading(true);
     try {
-        const res = await fetch(`/timeseries_data?mode=${timeframe}`);
+        const res = await fetch(`/timeseries_data?mode=${timeframe}&format=columnar`);
         if (!res.ok) throw new Error('Failed to fetch data');
-        return await res.json();
+        const body = await res.json();
+        return body.count ? body.columns : null;
     } catch (error) {
         console.error('Error fetching data:', error);
-        return [];
+        return null;
     } finally {
         setLoading(false);
     }
@@ -61,12 +62,12 @@ function openDetailedData(date, mode) {
 // Initialize and render chart
 async function renderChart() {
     const data = await fetchData(currentTimeframe);
-    if (!data || data.length === 0) return;
+    if (!data) return;
     
     const ctx = document.getElementById('densityChart').getContext('2d');
-    const labels = data.map(d => formatDate(d.date, currentTimeframe));
-    const densities = data.map(d => d.average_density);
-    const dates = data.map(d => d.date); // Store original dates for click handling
+    const labels = data.date.map(date => formatDate(date, currentTimeframe));
+    const densities = data.average_density;
+    const dates = data.date.map(date => date.slice(0, 10)); // Store original dates for click handling
     
     // Destroy previous chart instance if exists
     if (chart) chart.destroy();
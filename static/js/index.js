@@ -66,6 +66,7 @@ const TileToggleControl = L.Control.extend({
 map.addControl(new TileToggleControl());
 
 let markers = [];
+let clusterMarkers = [];
 
 // Helper function to interpolate between two colors
 function interpolateColor(color1, color2, factor) {
@@ -127,6 +128,43 @@ function getDensityColor(density) {
     return colorStops[0].color;
 }
 
+// Draw server-side clusters as labelled circles; clicking one zooms to its samples
+function addClusters(clusterData) {
+    clusterMarkers.forEach(marker => map.removeLayer(marker));
+    clusterMarkers = [];
+
+    clusterData.forEach(cluster => {
+        const size = Math.min(24 + Math.log10(cluster.count) * 12, 56);
+        const icon = L.divIcon({
+            className: 'cluster-marker',
+            html: `<div style="width:${size}px;height:${size}px;line-height:${size}px;border-radius:50%;` +
+                  `background:${getDensityColor(cluster.density)};opacity:0.85;border:2px solid #fff;` +
+                  `color:#fff;font-weight:bold;text-align:center;box-shadow:0 1px 4px rgba(0,0,0,0.4);">` +
+                  `${cluster.count}</div>`,
+            iconSize: [size, size],
+            iconAnchor: [size / 2, size / 2]
+        });
+
+        const marker = L.marker([cluster.lat, cluster.lon], { icon: icon })
+            .bindTooltip(`
+                <b>${cluster.count} samples</b><br>
+                <b>Avg. Density:</b> ${cluster.density.toFixed(2)} pcs/cm³<br>
+                PS ${cluster.percentPS.toFixed(1)}% · PP ${cluster.percentPP.toFixed(1)}% · PE ${cluster.percentPE.toFixed(1)}%
+            `);
+        marker.on('click', () => {
+            const [southWest, northEast] = cluster.bounds;
+            if (southWest[0] === northEast[0] && southWest[1] === northEast[1]) {
+                map.setView(southWest, map.getMaxZoom());
+            } else {
+                map.fitBounds(cluster.bounds, { padding: [20, 20] });
+            }
+        });
+
+        marker.addTo(map);
+        clusterMarkers.push(marker);
+    });
+}
+
 // Function to add markers dynamically
 function addMarkers(markerData) {
     // Clear existing markers
@@ -304,29 +342,65 @@ function addMarkers(markerData) {
 
 let currentFetchController = null;
 let latestMaxDate = null; // Store the latest max date globally
+let currentRange = {}; // Date range of the last dashboard request ({} = whole dataset)
 
-// Function to fetch markers with current controller
-function fetchMarkers(minDate, maxDate) {
+// Fetch markers, sidebar stats and the dataset's date bounds in one request.
+// Leave minDate/maxDate out to get the whole dataset. Only the current
+// viewport is requested; the server clusters samples that would overlap.
+function fetchDashboard(minDate, maxDate) {
     if (currentFetchController) {
         currentFetchController.abort();
     }
     currentFetchController = new AbortController();
 
-    return fetch('/filter_markers', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ min_date: minDate, max_date: maxDate }),
+    currentRange = minDate && maxDate ? { min_date: minDate, max_date: maxDate } : {};
+    const viewport = map.getBounds();
+    // A GET so the browser can revalidate with the ETag instead of refetching unchanged data
+    const params = new URLSearchParams({
+        ...currentRange,
+        bbox: [viewport.getSouth(), viewport.getWest(), viewport.getNorth(), viewport.getEast()].join(','),
+        zoom: map.getZoom()
+    });
+    return fetch(`/dashboard?${params}`, {
         signal: currentFetchController.signal
     })
     .then(response => response.json())
     .then(data => {
-        addMarkers(data);
+        renderDashboard(data);
         return data;
     });
 }
 
-// Function to initialize the slider with dynamic date range
-function initializeSlider(minDate, maxDate) {
+// Draw markers and update the sidebar from a /dashboard response
+function renderDashboard(data) {
+    addMarkers(data.markers || []);
+    addClusters(data.clusters || []);
+    updateSidebarStats(data);
+}
+
+// Re-request the visible area for the current date range
+function refetchViewport() {
+    fetchDashboard(currentRange.min_date, currentRange.max_date).catch(err => {
+        if (err.name !== 'AbortError') {
+            console.error('Error fetching dashboard data:', err);
+        }
+    });
+}
+
+// Refetch whenever the map moves. Only registered once the slider is set up, so a pan
+// during page load cannot abort the request that supplies the slider's date bounds.
+// requestedBounds is the viewport of that first request, if its data was drawn.
+function watchMapMoves(requestedBounds) {
+    map.on('moveend', refetchViewport);
+    if (requestedBounds && !map.getBounds().equals(requestedBounds)) {
+        // The map moved while the first request was in flight
+        refetchViewport();
+    }
+}
+
+// Function to initialize the slider with dynamic date range.
+// initialData is the already-rendered /dashboard response for the full range, if any.
+function initializeSlider(minDate, maxDate, initialData) {
     // Helper to pad numbers to two digits
     const pad = n => n < 10 ? '0' + n : n;
 
@@ -369,9 +443,11 @@ function initializeSlider(minDate, maxDate) {
             const minDate = formatDate(ui.values[0], false);
             const maxDate = formatDate(ui.values[1], true);
             
-            // Update markers and sidebar immediately after slider stops
-            fetchMarkers(minDate, maxDate).then(() => {
-                updateSidebarStats(minDate, maxDate);
+            // Update markers and sidebar with a single request
+            fetchDashboard(minDate, maxDate).catch(err => {
+                if (err.name !== 'AbortError') {
+                    console.error('Error fetching dashboard data:', err);
+                }
             });
         }
     });
@@ -382,57 +458,30 @@ function initializeSlider(minDate, maxDate) {
         formatDisplayDate(initialValues[0]) + " - " + formatDisplayDate(initialValues[1])
     );
 
-    // On initial load
-    const initialMinDate = formatDate(initialValues[0], false);
-    const initialMaxDate = formatDate(initialValues[1], true);
-    
-    // Fetch initial markers and update sidebar
-    fetchMarkers(initialMinDate, initialMaxDate).then(() => {
-        updateSidebarStats(initialMinDate, initialMaxDate);
-    });
+    // The full-range data is already drawn when it came with the date bounds
+    if (!initialData) {
+        fetchDashboard(formatDate(initialValues[0], false), formatDate(initialValues[1], true))
+            .catch(err => console.error('Error fetching dashboard data:', err));
+    }
 }
 
 // Initialize the application
 $(function () {
-    // Helper to pad numbers to two digits
-    const pad = n => n < 10 ? '0' + n : n;
-
-    // Format date as YYYY-MM-DD HH:MM:SS in UTC+8, with option for end of day
-    const formatDate = (timestamp, isMax = false) => {
-        const date = new Date((timestamp + 8 * 3600) * 1000); // shift to UTC+8
-        const time = isMax ? '23:59:59' : '00:00:00';
-        return `${date.getUTCFullYear()}-${pad(date.getUTCMonth() + 1)}-${pad(date.getUTCDate())} ${time}`;
-    };
-
-    // Format date as YYYY-MM-DD in UTC+8 for display
-    const formatDisplayDate = timestamp => {
-        const date = new Date((timestamp + 8 * 3600) * 1000);
-        return `${date.getUTCFullYear()}-${pad(date.getUTCMonth() + 1)}-${pad(date.getUTCDate())}`;
-    };
-
-    // Function to fetch date range and store the max date
-    function fetchDateRange() {
-        return fetch('/date_range')
-            .then(response => response.json())
-            .then(data => {
-                if (data.min_date && data.max_date) {
-                    // Store the max date for the "Last Updated" section
-                    latestMaxDate = data.max_date;
-                    return data;
-                }
-                throw new Error('Invalid date range data');
-            });
-    }
-
-    // Fetch the date range from the server, initialize the slider, and update the last updated display
-    fetchDateRange()
+    // One request returns the date bounds for the slider along with the full-range markers and stats
+    const requestedBounds = map.getBounds();
+    fetchDashboard()
         .then(data => {
-            initializeSlider(data.min_date, data.max_date);
-            // Update the last updated display with the stored max date
+            if (!data.min_date || !data.max_date) {
+                throw new Error('Invalid date range data');
+            }
+            // Store the max date for the "Last Updated" section
+            latestMaxDate = data.max_date;
+            initializeSlider(data.min_date, data.max_date, data);
             updateLastUpdated();
+            watchMapMoves(requestedBounds);
         })
         .catch(error => {
-            console.error('Error fetching date range:', error);
+            console.error('Error fetching dashboard data:', error);
             // Fallback to default dates on error
             const defaultMinDate = '2025-04-01T00:00:00+08:00';
             const defaultMaxDate = new Date();
@@ -440,6 +489,7 @@ $(function () {
             latestMaxDate = defaultMaxDate.toISOString().replace('T', ' ').split('.')[0];
             initializeSlider(defaultMinDate, latestMaxDate);
             updateLastUpdated();
+            watchMapMoves();
         });
 });
 
@@ -451,92 +501,23 @@ function updateLastUpdated() {
         const dateOnly = latestMaxDate.split(' ')[0];
         lastUpdatedElement.textContent = `Last Updated: ${dateOnly}`;
     } else {
-        // If we don't have the max date yet, fetch it
-        fetchDateRange()
-            .then(() => {
-                if (latestMaxDate) {
-                    const dateOnly = latestMaxDate.split(' ')[0];
-                    lastUpdatedElement.textContent = `Last Updated: ${dateOnly}`;
-                } else {
-                    lastUpdatedElement.textContent = 'Last Updated: Data unavailable';
-                }
-            })
-            .catch(err => {
-                console.error('Error fetching date range:', err);
-                lastUpdatedElement.textContent = 'Last Updated: Error fetching data';
-            });
+        lastUpdatedElement.textContent = 'Last Updated: Data unavailable';
     }
 }
 
-// Fetch total samples from DynamoDB with date range filter and update the sidebar
-function updateTotalSamples(minDate, maxDate) {
-    fetch('/total_samples', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ min_date: minDate, max_date: maxDate })
-    })
-    .then(response => response.json())
-    .then(data => {
-        const totalSamplesElement = document.getElementById('sidebar-sample-count');
-        if (data && data.total_samples) {
-            totalSamplesElement.textContent = data.total_samples;
-        } else {
-            totalSamplesElement.textContent = '0';
-        }
-    })
-    .catch(err => {
-        console.error('Error fetching total samples:', err);
-        const totalSamplesElement = document.getElementById('sidebar-sample-count');
-        totalSamplesElement.textContent = 'Error fetching data';
-    });
-}
-
-// Fetch average density from DynamoDB with date range filter and update the sidebar
-function updateAverageDensity(minDate, maxDate) {
-    fetch('/average_density', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ min_date: minDate, max_date: maxDate })
-    })
-    .then(response => response.json())
-    .then(data => {
-        const avgDensityElement = document.getElementById('sidebar-average-density');
-        if (data && typeof data.average_density === 'number') {
-            avgDensityElement.textContent = data.average_density.toFixed(2);
-        } else {
-            avgDensityElement.textContent = '0';
-        }
-    })
-    .catch(err => {
-        console.error('Error fetching average density:', err);
-        const avgDensityElement = document.getElementById('sidebar-average-density');
-        avgDensityElement.textContent = 'Error';
-    });
-}
-
-// Update both total samples and average density when slider changes or on load
-function updateSidebarStats(minDate, maxDate) {
-    updateTotalSamples(minDate, maxDate);
-    updateAverageDensity(minDate, maxDate);
-}
+// Update total samples and average density in the sidebar from a /dashboard response
+function updateSidebarStats(data) {
+    const totalSamplesElement = document.getElementById('sidebar-sample-count');
+    if (data && data.total_samples) {
+        totalSamplesElement.textContent = data.total_samples;
+    } else {
+        totalSamplesElement.textContent = '0';
+    }
 
-// Call updateLastUpdated and updateSidebarStats on page load
-document.addEventListener('DOMContentLoaded', () => {
-    updateLastUpdated();
-    
-    // Get the initial slider values
-    const slider = $("#slider-range");
-    if (slider.length) {
-        const values = slider.slider("values");
-        const formatDate = timestamp => {
-            const date = new Date((timestamp + 8 * 3600) * 1000);
-            const pad = n => n < 10 ? '0' + n : n;
-            return `${date.getUTCFullYear()}-${pad(date.getUTCMonth() + 1)}-${pad(date.getUTCDate())} ` + 
-                   (timestamp === slider.slider("option", "max") ? '23:59:59' : '00:00:00');
-        };
-        
-        const minDate = formatDate(values[0]);
-        const maxDate = formatDate(values[1]);
-        updateSidebarStats(minDate, maxDate);
+    const avgDensityElement = document.getElementById('sidebar-average-density');
+    if (data && typeof data.average_density === 'number') {
+        avgDensityElement.textContent = data.average_density.toFixed(2);
+    } else {
+        avgDensityElement.textContent = '0';
     }
-});
+}
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app modules live at the repo root; the detection scripts import their siblings by bare name
+sys.path[:0] = [ROOT, os.path.join(ROOT, "faster_rcnn")]
+
+
+@pytest.fixture
+def aws_credentials(monkeypatch):
+    """Fake credentials so boto3 clients created under moto never reach real AWS."""
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SECURITY_TOKEN", "AWS_SESSION_TOKEN"):
+        monkeypatch.setenv(name, "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "ap-southeast-1")
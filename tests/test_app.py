@@ -0,0 +1,104 @@
+from decimal import Decimal
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from result_cache import create_result_cache
+from rollups import ROLLUP_TABLE_NAME
+from sample_cache import SampleSnapshot, _empty_columns
+
+# Two groups of samples a few hundred metres apart, and one far away
+SAMPLES = [
+    {"sampleID": i, "datetime": f"2025-06-{1 + i % 5:02d} 10:00:{i:02d}",
+     "latitude": Decimal(str(lat)), "longitude": Decimal(str(lon)), "density": i,
+     "percent_PE": 50, "percent_PP": 30, "percent_PS": 20}
+    for i, (lat, lon) in enumerate([(14.600, 121.000)] * 4 + [(14.603, 121.003)] * 3 + [(10.0, 123.0)])
+]
+
+
+@pytest.fixture
+def client(aws_credentials, monkeypatch):
+    with mock_aws():
+        dynamodb = boto3.resource("dynamodb", region_name="ap-southeast-1")
+        table = dynamodb.create_table(
+            TableName="MicroplasticData",
+            KeySchema=[{"AttributeName": "sampleID", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "sampleID", "AttributeType": "N"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        dynamodb.create_table(
+            TableName=ROLLUP_TABLE_NAME,
+            KeySchema=[{"AttributeName": "period", "KeyType": "HASH"},
+                       {"AttributeName": "periodStart", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "period", "AttributeType": "S"},
+                                  {"AttributeName": "periodStart", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        for sample in SAMPLES:
+            table.put_item(Item=sample)
+
+        import app as app_module
+        # Refresh synchronously instead of from the background thread the import starts
+        app_module.sample_cache.stop()
+        app_module.sample_cache._thread.join()
+        monkeypatch.setattr(app_module.sample_cache, "_snapshot", SampleSnapshot(_empty_columns(), float("-inf")))
+        monkeypatch.setattr(app_module, "result_cache", create_result_cache())
+        app_module.sample_cache.refresh()
+        yield app_module.app.test_client()
+
+
+def test_range_routes_use_the_sample_cache(client):
+    body = {"min_date": "2025-06-02 00:00:00", "max_date": "2025-06-03 23:59:59"}
+
+    assert client.post("/total_samples", json=body).get_json() == {"total_samples": 4}
+    assert client.post("/average_density", json=body).get_json() == {"average_density": (1 + 2 + 6 + 7) / 4}
+    markers = client.post("/filter_markers", json=body).get_json()
+    assert sorted(marker["density"] for marker in markers) == [1, 2, 6, 7]
+
+
+@pytest.mark.parametrize("route", ["/total_samples", "/average_density", "/filter_markers"])
+@pytest.mark.parametrize("body", [
+    {"min_date": "June", "max_date": "2025-06-30 23:59:59"},
+    {"min_date": "2025-13-01", "max_date": "2025-06-30 23:59:59"},
+    {"min_date": "2025-06-01 00:00:00"},
+])
+def test_invalid_dates_are_rejected(client, route, body):
+    response = client.post(route, json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_dashboard_rejects_invalid_dates(client):
+    assert client.get("/dashboard?min_date=June&max_date=2025-06-30").status_code == 400
+
+
+def test_dashboard_clusters_the_viewport(client):
+    data = client.get("/dashboard?bbox=14.5,120.9,14.7,121.1&zoom=10").get_json()
+
+    # The seven nearby samples share one grid cell at zoom 10; the far one is outside the viewport
+    assert data["markers"] == []
+    assert [cluster["count"] for cluster in data["clusters"]] == [7]
+    assert data["total_samples"] == len(SAMPLES)
+    assert data["min_date"] == "2025-06-01 10:00:00"
+
+    # At the deepest zoom every sample in the viewport is sent individually
+    data = client.get("/dashboard?bbox=14.5,120.9,14.7,121.1&zoom=22").get_json()
+    assert (len(data["markers"]), data["clusters"]) == (7, [])
+
+
+@pytest.mark.parametrize("query", [
+    "bbox=14,121,15&zoom=10",
+    "bbox=14,121,15,122,1&zoom=10",
+    "bbox=14,west,15,122&zoom=10",
+    "bbox=15,121,14,122&zoom=10",
+    "bbox=14,121,15,122&zoom=near",
+])
+def test_dashboard_rejects_invalid_viewports(client, query):
+    response = client.get(f"/dashboard?{query}")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_dashboard_rejects_invalid_posted_viewport(client):
+    assert client.post("/dashboard", json={"bbox": [14, 121, None, 122], "zoom": 10}).status_code == 400
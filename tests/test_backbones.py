@@ -0,0 +1,36 @@
+import pytest
+from torch import nn
+from torchvision.ops import FrozenBatchNorm2d
+
+from backbones import build_model
+
+
+def trainable_stages(model):
+    return sorted({name.split('.')[0] for name, p in model.backbone.body.named_parameters() if p.requires_grad})
+
+
+@pytest.mark.parametrize("layers, stages", [
+    (0, []),
+    (3, ['layer2', 'layer3', 'layer4']),
+    (5, ['conv1', 'layer1', 'layer2', 'layer3', 'layer4']),
+])
+def test_untrained_model_gets_the_pretrained_layout(layers, stages):
+    model = build_model(2, 'resnet50_fpn', pretrained=False, trainable_backbone_layers=layers)
+
+    assert trainable_stages(model) == stages
+    norms = [m for m in model.backbone.body.modules() if isinstance(m, (nn.BatchNorm2d, FrozenBatchNorm2d))]
+    assert norms and all(isinstance(m, FrozenBatchNorm2d) for m in norms)
+    assert all(p.requires_grad for p in model.backbone.fpn.parameters())
+
+
+def test_mobilenet_freezes_blocks_below_the_trainable_stages():
+    model = build_model(2, 'mobilenet_v3_large_fpn', pretrained=False, trainable_backbone_layers=0)
+    assert trainable_stages(model) == []
+    model = build_model(2, 'mobilenet_v3_large_fpn', pretrained=False, trainable_backbone_layers=6)
+    blocks = [name for name, block in model.backbone.body.named_children() if list(block.parameters())]
+    assert trainable_stages(model) == sorted(blocks)
+
+
+def test_without_trainable_layers_everything_trains():
+    model = build_model(2, 'resnet50_fpn', pretrained=False)
+    assert all(p.requires_grad for p in model.parameters())
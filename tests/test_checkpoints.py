@@ -0,0 +1,101 @@
+import os
+
+import torch
+
+from backbones import best_checkpoint_path, checkpoint_path
+from checkpoints import CheckpointManager
+from data_loading import EpochSampler
+
+
+def manager(directory, keep=2, patience=2, seed=0):
+    torch.manual_seed(seed)
+    model = torch.nn.Linear(3, 2)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1, momentum=0.9)
+    scheduler = torch.optim.lr_scheduler.StepLR(optimizer, step_size=1, gamma=0.5)
+    return CheckpointManager(1, "resnet50_fpn", model, optimizer, scheduler, keep=keep, patience=patience,
+                             every=2, directory=str(directory))
+
+
+def train_step(checkpoints):
+    loss = checkpoints.model(torch.ones(1, 3)).sum()
+    checkpoints.optimizer.zero_grad()
+    loss.backward()
+    checkpoints.optimizer.step()
+
+
+def epoch_files(directory):
+    return sorted(int(name.split("_")[3].split(".")[0]) for name in os.listdir(directory) if "_epoch_" in name)
+
+
+def test_resume_restores_the_training_state(tmp_path):
+    run = manager(tmp_path)
+    train_step(run)
+    run.scheduler.step()
+    run.end_epoch(0, 0.5)
+    train_step(run)
+    run.save_periodically(1, 2)
+    expected_random = torch.rand(3)
+
+    resumed = manager(tmp_path, seed=1)
+    assert resumed.resume(num_epochs=5) == (1, 2)
+
+    assert torch.equal(resumed.model.weight, run.model.weight)
+    assert resumed.optimizer.state_dict()["state"][0]["momentum_buffer"].tolist() == \
+        run.optimizer.state_dict()["state"][0]["momentum_buffer"].tolist()
+    assert resumed.scheduler.get_last_lr() == run.scheduler.get_last_lr()
+    assert (resumed.best_epoch, resumed.best_score, resumed.scores) == (1, 0.5, {1: 0.5})
+    assert torch.equal(torch.rand(3), expected_random)  # the RNG carries on where the run left off
+
+
+def test_without_a_state_file_training_starts_over(tmp_path):
+    assert manager(tmp_path).resume(num_epochs=5) == (0, 0)
+
+
+def test_only_the_best_k_epochs_are_kept(tmp_path):
+    run = manager(tmp_path, keep=2, patience=0)
+    for epoch, score in enumerate([0.3, 0.6, 0.4, 0.5]):
+        run.end_epoch(epoch, score)
+
+    assert epoch_files(tmp_path) == [2, 4]
+    assert run.scores == {2: 0.6, 4: 0.5}
+    assert os.path.exists(best_checkpoint_path(1, "resnet50_fpn", str(tmp_path)))
+    assert run.best_epoch == 2
+
+
+def test_patience_stops_training_and_a_finished_run_is_not_resumed(tmp_path):
+    run = manager(tmp_path, patience=2)
+    run.end_epoch(0, 0.5)
+    run.end_epoch(1, 0.4)
+    assert not run.should_stop()
+    run.end_epoch(2, 0.5)  # no better than the best: still stale
+    assert run.should_stop()
+
+    assert manager(tmp_path, patience=2).resume(num_epochs=10) == (0, 0)
+    assert os.path.exists(os.path.join(tmp_path, "training", "stage1_resnet50_fpn.finished.pth"))
+    assert not os.path.exists(checkpoint_path(1, 2, "resnet50_fpn", str(tmp_path)))
+
+
+def test_epoch_sampler_reshuffles_every_epoch_and_resumes_mid_epoch():
+    sampler = EpochSampler(20, seed=7)
+    first = list(sampler)
+    sampler.set_epoch(1)
+    second = list(sampler)
+
+    assert sorted(first) == sorted(second) == list(range(20))
+    assert first != second
+    assert list(EpochSampler(20, seed=7)) == first  # the order depends only on seed and epoch
+
+    sampler.set_epoch(1, start=8)
+    assert list(sampler) == second[8:]
+    assert len(sampler) == 12
+
+
+def test_best_alias_tracks_the_best_weights(tmp_path):
+    run = manager(tmp_path, keep=1, patience=0)
+    run.end_epoch(0, 0.5)
+    best_weights = run.model.weight.detach().clone()
+    train_step(run)
+    run.end_epoch(1, 0.2)
+
+    saved = torch.load(best_checkpoint_path(1, "resnet50_fpn", str(tmp_path)), weights_only=True)
+    assert torch.equal(saved["weight"], best_weights)
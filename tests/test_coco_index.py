@@ -0,0 +1,52 @@
+from coco_index import CocoIndex
+
+COCO = {
+    "images": [
+        {"id": 10, "file_name": "a.jpg"},
+        {"id": 20, "file_name": "empty.jpg"},
+        {"id": 30, "file_name": "b.jpg"},
+    ],
+    "annotations": [
+        {"image_id": 30, "bbox": [5, 5, 10, 20], "category_id": 3},
+        {"image_id": 10, "bbox": [0, 0, 4, 4], "category_id": 1},
+        {"image_id": 10, "bbox": [10, 20, 30, 40], "category_id": 2},
+        {"image_id": 10, "bbox": [1, 1, 0, 5], "category_id": 2},  # zero width: dropped
+        {"image_id": 99, "bbox": [1, 1, 5, 5], "category_id": 1},  # unknown image: dropped
+    ],
+}
+
+
+def test_targets_are_grouped_by_image():
+    index = CocoIndex.from_coco(COCO)
+
+    assert len(index) == 3
+    target = index.target("a.jpg")
+    assert target["boxes"].tolist() == [[0, 0, 4, 4], [10, 20, 40, 60]]  # xywh -> xyxy, in file order
+    assert target["labels"].tolist() == [1, 2]
+    assert index.target("b.jpg")["labels"].tolist() == [3]
+    assert [index.count(name) for name in ("a.jpg", "empty.jpg", "b.jpg", "missing.jpg")] == [2, 0, 1, 0]
+
+
+def test_image_without_annotations_has_an_empty_target():
+    target = CocoIndex.from_coco(COCO).target("empty.jpg")
+    assert tuple(target["boxes"].shape) == (0, 4)
+    assert target["labels"].tolist() == []
+
+
+def test_single_class_labels_every_box_1():
+    index = CocoIndex.from_coco(COCO, single_class=True)
+    assert index.target("a.jpg")["labels"].tolist() == [1, 1]
+    assert index.target("b.jpg")["labels"].tolist() == [1]
+
+
+def test_round_trips_through_the_npz_cache(tmp_path):
+    index = CocoIndex.from_coco(COCO, etag='"abc"')
+    index.save(tmp_path / "index.npz")
+
+    loaded = CocoIndex.load(tmp_path / "index.npz")
+
+    assert loaded.file_names == index.file_names
+    assert loaded.etag == '"abc"'
+    for name in index.file_names:
+        assert loaded.target(name)["boxes"].tolist() == index.target(name)["boxes"].tolist()
+        assert loaded.target(name)["labels"].tolist() == index.target(name)["labels"].tolist()
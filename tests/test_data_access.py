@@ -0,0 +1,97 @@
+from collections import Counter
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from data_access import (DATE_BUCKET_ATTRIBUTE, DATE_INDEX_NAME, date_buckets, query_date_range,
+                         scan_date_range, scan_items)
+
+# Spread over three months, so date-range reads cross month buckets
+SAMPLES = [
+    {"sampleID": i, "datetime": f"2025-{5 + i % 3:02d}-{1 + i % 28:02d} 12:00:{i % 60:02d}", "density": i}
+    for i in range(60)
+]
+
+
+@pytest.fixture
+def table(aws_credentials):
+    with mock_aws():
+        dynamodb = boto3.resource("dynamodb", region_name="ap-southeast-1")
+        table = dynamodb.create_table(
+            TableName="MicroplasticData",
+            KeySchema=[{"AttributeName": "sampleID", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": "sampleID", "AttributeType": "N"},
+                {"AttributeName": DATE_BUCKET_ATTRIBUTE, "AttributeType": "S"},
+                {"AttributeName": "datetime", "AttributeType": "S"},
+            ],
+            GlobalSecondaryIndexes=[{
+                "IndexName": DATE_INDEX_NAME,
+                "KeySchema": [
+                    {"AttributeName": DATE_BUCKET_ATTRIBUTE, "KeyType": "HASH"},
+                    {"AttributeName": "datetime", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            }],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        with table.batch_writer() as batch:
+            for sample in SAMPLES:
+                batch.put_item(Item=dict(sample, **{DATE_BUCKET_ATTRIBUTE: sample["datetime"][:7]}))
+        yield table
+
+
+def ids(items):
+    return Counter(int(item["sampleID"]) for item in items)
+
+
+def count_calls(table, operation):
+    calls = []
+    table.meta.client.meta.events.register(f"before-call.dynamodb.{operation}", lambda **kwargs: calls.append(1))
+    return calls
+
+
+def test_scan_follows_every_page(table):
+    calls = count_calls(table, "Scan")
+    items = list(scan_items(table, Limit=7))
+
+    assert ids(items) == Counter(range(60))
+    assert len(calls) >= 60 // 7  # one request per page, not just the first
+
+
+@pytest.mark.parametrize("segments", [2, 4])
+def test_parallel_segments_merge_to_the_full_table(table, segments):
+    calls = count_calls(table, "Scan")
+    items = list(scan_items(table, segments=segments, max_workers=segments, Limit=5))
+
+    assert ids(items) == Counter(range(60))  # every item exactly once
+    assert len(calls) >= 60 // 5  # every segment paged through, not just its first page
+
+
+def test_scan_date_range_filters_across_pages_and_segments(table):
+    expected = Counter(s["sampleID"] for s in SAMPLES if "2025-06-01" <= s["datetime"] <= "2025-06-30 23:59:59")
+    items = list(scan_date_range(table, "2025-06-01", "2025-06-30 23:59:59", segments=3, Limit=4))
+
+    assert ids(items) == expected
+
+
+def test_query_date_range_merges_month_buckets(table):
+    expected = Counter(s["sampleID"] for s in SAMPLES if "2025-05-15" <= s["datetime"] <= "2025-07-10")
+    calls = count_calls(table, "Query")
+    items = list(query_date_range(table, "2025-05-15", "2025-07-10", Limit=3))
+
+    assert ids(items) == expected
+    assert len(calls) > len(date_buckets("2025-05-15", "2025-07-10"))  # buckets paged past their first page
+
+
+def test_segment_errors_reach_the_caller(table):
+    missing = boto3.resource("dynamodb", region_name="ap-southeast-1").Table("NoSuchTable")
+    with pytest.raises(ClientError) as error:
+        list(scan_items(missing, segments=3))
+    assert error.value.response["Error"]["Code"] == "ResourceNotFoundException"
+
+
+def test_date_buckets_span_year_end():
+    assert date_buckets("2024-11-20", "2025-02-01 08:00:00") == ["2024-11", "2024-12", "2025-01", "2025-02"]
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask, jsonify
+
+from http_cache import conditional
+
+MODIFIED_AT = datetime(2025, 6, 1, 10, 0, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def served():
+    """(test client, state) of an app whose /data view is validated against state.snapshot."""
+    state = SimpleNamespace(snapshot=SimpleNamespace(version="v1", modified_at=MODIFIED_AT), calls=0)
+    app = Flask(__name__)
+
+    @app.route("/data")
+    @conditional(lambda: state.snapshot, max_age=30)
+    def data():
+        state.calls += 1
+        return jsonify({"version": state.snapshot.version})
+
+    @app.route("/missing")
+    @conditional(lambda: state.snapshot)
+    def missing():
+        return jsonify({"error": "not found"}), 404
+
+    return app.test_client(), state
+
+
+def assert_cache_headers(response):
+    assert response.cache_control.public
+    assert response.cache_control.max_age == 30
+    assert response.cache_control.must_revalidate
+    assert "Accept-Encoding" in response.vary
+
+
+def test_first_request_is_tagged(served):
+    client, state = served
+    response = client.get("/data")
+
+    assert response.status_code == 200
+    etag, weak = response.get_etag()
+    assert weak and etag.startswith("v1-")
+    assert response.last_modified == MODIFIED_AT
+    assert_cache_headers(response)
+
+
+@pytest.mark.parametrize("header", ['W/"{etag}"', '"{etag}"', '"other", W/"{etag}"', "*"])
+def test_matching_if_none_match_gets_304(served, header):
+    client, state = served
+    etag, _ = client.get("/data").get_etag()
+
+    response = client.get("/data", headers={"If-None-Match": header.format(etag=etag)})
+
+    assert response.status_code == 304
+    assert response.get_data() == b""
+    assert response.get_etag() == (etag, True)
+    assert_cache_headers(response)
+    assert state.calls == 1  # the view did not run again
+
+
+def test_new_version_gets_200_with_new_etag(served):
+    client, state = served
+    etag, _ = client.get("/data").get_etag()
+    state.snapshot = SimpleNamespace(version="v2", modified_at=MODIFIED_AT + timedelta(minutes=5))
+
+    response = client.get("/data", headers={"If-None-Match": f'W/"{etag}"'})
+
+    assert response.status_code == 200
+    assert response.get_json() == {"version": "v2"}
+    new_etag, _ = response.get_etag()
+    assert new_etag != etag and new_etag.startswith("v2-")
+
+
+def test_etag_depends_on_the_query_string(served):
+    client, _ = served
+    etag, _ = client.get("/data").get_etag()
+    assert client.get("/data", query_string={"format": "binary"},
+                      headers={"If-None-Match": f'W/"{etag}"'}).status_code == 200
+
+
+def test_if_modified_since(served):
+    client, _ = served
+    assert client.get("/data", headers={"If-Modified-Since": "Sun, 01 Jun 2025 10:00:00 GMT"}).status_code == 304
+    assert client.get("/data", headers={"If-Modified-Since": "Sun, 01 Jun 2025 09:59:59 GMT"}).status_code == 200
+
+
+def test_error_responses_are_not_tagged(served):
+    client, _ = served
+    response = client.get("/missing")
+    assert response.status_code == 404
+    assert response.get_etag() == (None, None)
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from inference import TiledInferenceEngine, tile_origins
+
+
+class SquareDetector:
+    """Fake detector: one box (label c + 1) around the lit pixels of each colour channel c of a tile."""
+
+    def __init__(self):
+        self.transform = SimpleNamespace(min_size=(800,), max_size=1333)
+        self.sizes_seen = []
+
+    def __call__(self, tensors):
+        self.sizes_seen.append((self.transform.min_size, self.transform.max_size))
+        outputs = []
+        for tensor in tensors:
+            boxes, labels = [], []
+            for channel in range(tensor.shape[0]):
+                ys, xs = torch.nonzero(tensor[channel] > 0.5, as_tuple=True)
+                if len(xs):
+                    boxes.append([xs.min(), ys.min(), xs.max() + 1, ys.max() + 1])
+                    labels.append(channel + 1)
+            outputs.append({
+                'boxes': torch.tensor(boxes, dtype=torch.float32).reshape(-1, 4),
+                'labels': torch.tensor(labels, dtype=torch.int64),
+                'scores': torch.ones(len(labels)),
+            })
+        return outputs
+
+
+def test_tiles_cover_the_image_flush_to_the_end():
+    assert tile_origins(200, 128, 64) == [0, 64, 72]
+    assert tile_origins(100, 128, 64) == [0]
+
+
+def test_tiled_boxes_are_mapped_back_and_deduplicated():
+    pixels = np.zeros((100, 200, 3), dtype=np.uint8)
+    pixels[40:60, 90:110, 0] = 255  # inside all three tiles
+    pixels[10:30, 120:140, 1] = 255  # cut by the first tile's right edge, whole in the other two
+    model = SquareDetector()
+    engine = TiledInferenceEngine(model, 'cpu', tile_size=128, overlap=64)
+
+    prediction, = engine.predict([Image.fromarray(pixels)])
+
+    order = prediction['labels'].argsort()
+    assert prediction['labels'][order].tolist() == [1, 2]
+    assert prediction['boxes'][order].tolist() == [[90, 40, 110, 60], [120, 10, 140, 30]]
+
+
+def test_model_resize_is_only_pinned_while_predicting():
+    model = SquareDetector()
+    engine = TiledInferenceEngine(model, 'cpu', tile_size=128, overlap=32)
+    assert (model.transform.min_size, model.transform.max_size) == ((800,), 1333)
+
+    engine.predict([Image.new('RGB', (300, 200))])
+
+    assert set(model.sizes_seen) == {((128,), 128)}
+    assert (model.transform.min_size, model.transform.max_size) == ((800,), 1333)
+
+
+@pytest.mark.parametrize("tile_size, overlap", [(0, 0), (128, 128), (128, -1)])
+def test_invalid_tiling_is_rejected(tile_size, overlap):
+    with pytest.raises(ValueError):
+        TiledInferenceEngine(SquareDetector(), 'cpu', tile_size=tile_size, overlap=overlap)
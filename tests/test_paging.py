@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from paging import KeysetPager, decode_cursor
+from sample_cache import SampleSnapshot
+
+
+def snapshot(count=50, seed=0):
+    rng = np.random.default_rng(seed)
+    # Few distinct datetimes, so many rows tie on the sort value
+    datetimes = np.datetime64("2025-06-02T08:00:00") + rng.integers(0, 10, count).astype("timedelta64[m]")
+    sample_ids = rng.permutation(count) + 1
+    order = np.lexsort((sample_ids, datetimes))  # the sample cache's (datetime, sampleID) order
+    return SampleSnapshot({
+        "datetime": datetimes[order].astype("datetime64[s]"),
+        "sample_id": sample_ids[order],
+        "density": rng.uniform(0, 5, count)[order],
+        "lat": rng.uniform(14, 15, count)[order],
+        "lon": rng.uniform(121, 122, count)[order],
+    }, refreshed_at=0)
+
+
+def walk(pager):
+    """Row indices of every page, following next cursors from the first page."""
+    rows, _, _, cursor = pager.page(1)
+    seen = list(rows)
+    while cursor:
+        rows, _, _, cursor = pager.page(after=cursor)
+        seen.extend(rows)
+    return seen
+
+
+@pytest.mark.parametrize("sort_order", ["asc", "desc"])
+def test_datetime_pages_follow_the_cache_order(sort_order):
+    snap = snapshot()
+    in_range = slice(5, 45)
+    pager = KeysetPager(snap, in_range, "datetime", sort_order, per_page=7)
+
+    keys = snap["datetime"][in_range].astype(np.int64)
+    expected = np.lexsort((snap["sample_id"][in_range], keys))
+    if sort_order == "desc":
+        expected = expected[::-1]
+    assert walk(pager) == expected.tolist()
+
+
+def test_before_cursor_returns_the_previous_page():
+    pager = KeysetPager(snapshot(), slice(None), "density", "desc", per_page=6)
+    first, _, _, next_cursor = pager.page(1)
+    second, page, prev_cursor, _ = pager.page(after=next_cursor)
+    assert page == 2
+    assert pager.page(before=prev_cursor)[0].tolist() == first.tolist()
+    assert len(second) == 6
+
+
+@pytest.mark.parametrize("cursor", ["", "abc", "1.5_x", "nounderscore", "_3"])
+def test_malformed_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,126 @@
+import random
+import threading
+import time
+from io import BytesIO
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from pipeline import Uploader, prefetch
+
+BUCKET = "rpi-upload-bucket"
+
+
+@pytest.fixture
+def s3(aws_credentials):
+    with mock_aws():
+        client = boto3.client("s3", region_name="ap-southeast-1")
+        client.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": "ap-southeast-1"})
+        yield client
+
+
+def put_objects(s3, count):
+    keys = [f"Dataset/samples/stage_1/image_{i:03d}.jpg" for i in range(count)]
+    for i, key in enumerate(keys):
+        s3.put_object(Bucket=BUCKET, Key=key, Body=str(i).encode())
+    return keys
+
+
+def test_prefetch_yields_in_key_order(s3):
+    keys = put_objects(s3, 20)
+
+    def load(key):
+        time.sleep(random.uniform(0, 0.01))  # finish out of order
+        return s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+    results = list(prefetch(keys, load, workers=4, depth=6))
+
+    assert [key for key, _ in results] == keys
+    assert [body for _, body in results] == [str(i).encode() for i in range(20)]
+
+
+def test_prefetch_keeps_at_most_depth_loads_ahead(s3):
+    keys = put_objects(s3, 12)
+    started = []
+
+    def load(key):
+        started.append(key)
+        return s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+    stream = prefetch(keys, load, workers=4, depth=3)
+    next(stream)
+    time.sleep(0.1)
+    assert len(started) <= 4  # the consumed key plus `depth` in flight
+    assert len(list(stream)) == 11
+
+
+def test_prefetch_raises_the_load_error_in_order(s3):
+    keys = put_objects(s3, 5)
+    keys.insert(3, "Dataset/samples/stage_1/missing.jpg")
+
+    def load(key):
+        return s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+    stream = prefetch(keys, load, workers=4, depth=4)
+    assert [key for key, _ in (next(stream) for _ in range(3))] == keys[:3]
+    with pytest.raises(ClientError) as error:
+        next(stream)
+    assert error.value.response["Error"]["Code"] == "NoSuchKey"
+
+
+def test_uploader_flushes_every_upload_on_close(s3):
+    with Uploader(s3, BUCKET, workers=4, max_pending=2) as uploader:
+        for i in range(10):
+            uploader.submit(BytesIO(f"crop {i}".encode()), f"Dataset/output/stage_1/cropped_boxes/crop_{i}.png")
+
+    for i in range(10):
+        body = s3.get_object(Bucket=BUCKET, Key=f"Dataset/output/stage_1/cropped_boxes/crop_{i}.png")["Body"]
+        assert body.read() == f"crop {i}".encode()
+
+
+def test_uploader_bounds_pending_uploads(s3):
+    release = threading.Event()
+    in_flight = []
+    upload_fileobj = s3.upload_fileobj
+
+    def slow_upload(fileobj, bucket, key):
+        in_flight.append(key)
+        release.wait(5)
+        upload_fileobj(fileobj, bucket, key)
+
+    s3.upload_fileobj = slow_upload
+    uploader = Uploader(s3, BUCKET, workers=4, max_pending=2)
+    submitter = threading.Thread(
+        target=lambda: [uploader.submit(BytesIO(b"x"), f"key_{i}") for i in range(4)]
+    )
+    submitter.start()
+    time.sleep(0.1)
+    assert submitter.is_alive()  # blocked on the third submit
+    assert len(in_flight) == 2
+    release.set()
+    submitter.join(5)
+    uploader.close()
+    assert sorted(obj["Key"] for obj in s3.list_objects_v2(Bucket=BUCKET)["Contents"]) == [f"key_{i}" for i in range(4)]
+
+
+def test_uploader_raises_the_first_failure_on_close(s3):
+    uploader = Uploader(s3, "no-such-bucket", workers=2)
+    uploader.submit(BytesIO(b"x"), "Dataset/output/stage_1/annotated_all/a.png")
+    with pytest.raises(ClientError):
+        uploader.close()
+
+
+def test_uploader_context_raises_upload_failures_on_clean_exit(s3):
+    with pytest.raises(ClientError):
+        with Uploader(s3, "no-such-bucket") as uploader:
+            uploader.submit(BytesIO(b"x"), "a.png")
+
+
+def test_uploader_context_keeps_the_body_exception(s3, capsys):
+    with pytest.raises(RuntimeError, match="inference failed"):
+        with Uploader(s3, "no-such-bucket") as uploader:
+            uploader.submit(BytesIO(b"x"), "a.png")
+            raise RuntimeError("inference failed")
+    assert "Upload failed" in capsys.readouterr().out
@@ -0,0 +1,64 @@
+import json
+import struct
+
+import numpy as np
+
+from response_formats import BINARY_MAGIC, columnar_json, pack_columns
+
+
+def unpack_columns(body):
+    """Decode pack_columns' layout the way the browser does: {name: array or list of strings}."""
+    assert body[:4] == BINARY_MAGIC
+    header_length, = struct.unpack('<I', body[4:8])
+    header = json.loads(body[8:8 + header_length])
+    data = body[8 + header_length:]
+    columns = {}
+    for entry in header["columns"]:
+        values = np.frombuffer(data, dtype='<' + {'uint32': 'u4', 'int32': 'i4', 'float32': 'f4'}[entry["dtype"]],
+                               count=entry["length"], offset=entry["offset"])
+        if "dictionary" in entry:
+            values = [entry["dictionary"][code] for code in values]
+        columns[entry["name"]] = values
+    return header["count"], columns
+
+
+def object_column(values):
+    column = np.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def test_binary_round_trip():
+    columns = {
+        "lat": np.array([14.5, 14.25, 10.0]),
+        "sample_id": np.array([3, 1, 2], dtype=np.int64),
+        "date": np.array(["2025-06-01T10:00:00", "2025-06-02T11:30:00", "1970-01-01T00:00:00"],
+                         dtype="datetime64[s]"),
+        "image": object_column(["s3://a.png", "", "s3://a.png"]),
+        "annotatedimageurl": object_column([None, "s3://b.png", None]),
+    }
+
+    count, decoded = unpack_columns(pack_columns(columns))
+
+    assert count == 3
+    assert decoded["lat"].tolist() == [14.5, 14.25, 10.0]
+    assert decoded["sample_id"].tolist() == [3, 1, 2]
+    assert decoded["date"].tolist() == columns["date"].astype(np.int64).tolist()
+    assert decoded["image"] == ["s3://a.png", "", "s3://a.png"]
+    # Missing URLs come back empty, never as the string "None"
+    assert decoded["annotatedimageurl"] == ["", "s3://b.png", ""]
+
+
+def test_binary_round_trip_of_empty_columns():
+    columns = {"lat": np.empty(0), "image": object_column([])}
+
+    count, decoded = unpack_columns(pack_columns(columns))
+
+    assert count == 0
+    assert decoded["lat"].tolist() == []
+    assert decoded["image"] == []
+
+
+def test_columnar_json_formats_datetimes_as_stored():
+    columns = {"date": np.array(["2025-06-01T10:00:00"], dtype="datetime64[s]"), "density": np.array([1.5])}
+    assert columnar_json(columns) == {"count": 1, "columns": {"date": ["2025-06-01 10:00:00"], "density": [1.5]}}
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import result_cache
+from result_cache import MemoryBackend, RedisBackend, ResultCache
+
+
+class FakeRedis:
+    """Stands in for redis.Redis; any keyspace scan fails the test."""
+
+    @classmethod
+    def from_url(cls, url):
+        return cls()
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def scan_iter(self, *args, **kwargs):
+        raise AssertionError("stats() must not scan the keyspace")
+
+
+def test_results_are_cached_per_version():
+    cache = ResultCache(MemoryBackend(max_entries=8))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return b"result"
+
+    assert cache.get_or_compute("markers", "v1", {"a": 1}, compute) == b"result"
+    assert cache.get_or_compute("markers", "v1", {"a": 1}, compute) == b"result"
+    assert cache.get_or_compute("markers", "v2", {"a": 1}, compute) == b"result"
+    assert len(calls) == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 2)
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", b"1")
+    backend.set("b", b"2")
+    backend.get("a")
+    backend.set("c", b"3")
+    assert (backend.get("a"), backend.get("b"), backend.get("c")) == (b"1", None, b"3")
+
+
+def test_redis_stats_do_not_count_entries(monkeypatch):
+    monkeypatch.setattr(result_cache, "redis", SimpleNamespace(Redis=FakeRedis))
+    cache = ResultCache(RedisBackend())
+    cache.get_or_compute("markers", "v1", {}, lambda: b"result")
+    stats = cache.stats()
+    assert stats["backend"] == "redis"
+    assert "entries" not in stats
@@ -0,0 +1,43 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from rollups import ROLLUP_TABLE_NAME, read_data_version, read_rollups, rebuild
+
+
+@pytest.fixture
+def tables(aws_credentials):
+    with mock_aws():
+        dynamodb = boto3.resource("dynamodb", region_name="ap-southeast-1")
+        table = dynamodb.create_table(
+            TableName="MicroplasticData",
+            KeySchema=[{"AttributeName": "sampleID", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "sampleID", "AttributeType": "N"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        rollup_table = dynamodb.create_table(
+            TableName=ROLLUP_TABLE_NAME,
+            KeySchema=[{"AttributeName": "period", "KeyType": "HASH"},
+                       {"AttributeName": "periodStart", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "period", "AttributeType": "S"},
+                                  {"AttributeName": "periodStart", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield table, rollup_table
+
+
+def test_rebuild_recomputes_rows_and_bumps_the_data_version(tables):
+    table, rollup_table = tables
+    table.put_item(Item={"sampleID": 1, "datetime": "2025-06-02 10:00:00", "density": 2})
+    table.put_item(Item={"sampleID": 2, "datetime": "2025-06-02 11:00:00", "density": 4})
+    table.put_item(Item={"sampleID": 3, "datetime": "2025-06-04 09:00:00", "density": 6})
+    rollup_table.put_item(Item={"period": "daily", "periodStart": "2025-01-01", "sampleCount": 1, "densitySum": 1})
+
+    before = read_data_version(rollup_table)
+    rebuild(table, rollup_table, segments=2)
+
+    assert read_data_version(rollup_table) == before + 1
+    daily = {row["periodStart"]: row for row in read_rollups(rollup_table, "daily")}
+    assert sorted(daily) == ["2025-06-02", "2025-06-04"]  # the stale row is gone
+    assert int(daily["2025-06-02"]["sampleCount"]) == 2
+    assert [row["periodStart"] for row in read_rollups(rollup_table, "weekly")] == ["2025-06-02"]
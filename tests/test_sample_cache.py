@@ -0,0 +1,75 @@
+import boto3
+import numpy as np
+import pytest
+from moto import mock_aws
+
+from sample_cache import PREFIX_COLUMNS, SampleCache, parse_datetime
+
+
+@pytest.fixture
+def table(aws_credentials):
+    with mock_aws():
+        dynamodb = boto3.resource("dynamodb", region_name="ap-southeast-1")
+        table = dynamodb.create_table(
+            TableName="MicroplasticData",
+            KeySchema=[{"AttributeName": "sampleID", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "sampleID", "AttributeType": "N"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        for i in range(10):
+            put(table, i + 1, f"2025-06-01 10:{i:02d}:00")
+        yield table
+
+
+def put(table, sample_id, dt):
+    table.put_item(Item={"sampleID": sample_id, "datetime": dt, "density": sample_id,
+                         "percent_PE": 2 * sample_id, "percent_PP": 1, "percent_PS": 0})
+
+
+def assert_matches_full_reload(table, snapshot):
+    reloaded = SampleCache(table).refresh()
+    for name in ("datetime", "sample_id", "density"):
+        assert snapshot[name].tolist() == reloaded[name].tolist()
+    for name in PREFIX_COLUMNS:
+        np.testing.assert_allclose(snapshot.prefix[name], reloaded.prefix[name])
+
+
+def test_newer_samples_are_appended(table):
+    cache = SampleCache(table)
+    first = cache.refresh()
+    put(table, 11, "2025-06-01 11:00:00")
+    put(table, 12, "2025-06-02 09:00:00")
+
+    snapshot = cache.refresh()
+
+    assert snapshot["sample_id"].tolist() == list(range(1, 13))
+    # The held prefix sums are extended, not recomputed
+    assert snapshot.prefix["density"][:len(first) + 1].tolist() == first.prefix["density"].tolist()
+    assert snapshot.version != first.version
+    assert_matches_full_reload(table, snapshot)
+
+
+def test_samples_sharing_the_last_datetime_are_merged_in_order(table):
+    cache = SampleCache(table)
+    cache.refresh()
+    # Same datetime as sample 10 but a lower ID, so it sorts before the last held row
+    put(table, 0, "2025-06-01 10:09:00")
+    put(table, 13, "2025-06-01 10:09:00")
+
+    snapshot = cache.refresh()
+
+    assert snapshot["sample_id"][-4:].tolist() == [9, 0, 10, 13]
+    assert_matches_full_reload(table, snapshot)
+
+
+def test_range_stats_match_the_columns(table):
+    snapshot = SampleCache(table).refresh()
+    count, sums = snapshot.range_stats(parse_datetime("2025-06-01 10:02:00"), parse_datetime("2025-06-01 10:05:00"))
+    assert count == 4
+    assert sums["density"] == 3 + 4 + 5 + 6
+
+
+@pytest.mark.parametrize("value", ["June", "2025-13-01", "2025-06-01T10:00:00", "", None])
+def test_parse_datetime_rejects_malformed_dates(value):
+    with pytest.raises(ValueError):
+        parse_datetime(value)